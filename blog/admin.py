@@ -5,8 +5,18 @@ It includes custom admin configurations for the `Post` and `Comment` models
 to enhance the user experience for site administrators.
 
 The following customizations are applied:
-    - `PostAdmin`: Configures the display and filters for blog posts.
+    - `PostAdmin`: Configures the display and filters for blog posts, and
+      adds a streaming export of the blog content at
+      `admin/blog/post/export/`.
     - `CommentAdmin`: Configures the display and filters for comments.
+    - `AuthorAdmin`, `TagAdmin`: Make authors and tags searchable, for the
+      autocomplete widgets of posts.
+
+Posts and comments are shown in the large-table mode of `blog.admin_tools`
+(approximate counts, keyset pagination and input filters) unless the
+`BLOG_ADMIN_LARGE_TABLES` setting is disabled. Related objects are loaded
+with the list (`list_select_related`) and picked with autocomplete widgets,
+so neither the lists nor the forms load whole tables.
 
 Additionally, the `Author`, `Tag`, `Post`, and `Comment` models are registered
 with the Django admin site to make them accessible and manageable through the
@@ -14,10 +24,79 @@ admin interface.
 """
 
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
+
+from . import dump
+from .admin_tools import InputFilter, LargeTableAdminMixin
 from .models import Post, Author, Tag, Comment
 
 
-class PostAdmin(admin.ModelAdmin):
+class AuthorEmailFilter(InputFilter):
+    """
+    Filters posts by the e-mail address of their author.
+    """
+
+    title = "author e-mail"
+    parameter_name = "author_email"
+    lookup = "author__e_mail"
+
+
+class TagCaptionFilter(InputFilter):
+    """
+    Filters posts by the caption of one of their tags.
+    """
+
+    title = "tag"
+    parameter_name = "tag_caption"
+    lookup = "tag__caption"
+
+
+class DateFromFilter(InputFilter):
+    """
+    Filters posts updated on or after a date.
+    """
+
+    title = "date from"
+    parameter_name = "date_from"
+    lookup = "date__gte"
+    input_type = "date"
+
+
+class DateUntilFilter(InputFilter):
+    """
+    Filters posts updated on or before a date.
+    """
+
+    title = "date until"
+    parameter_name = "date_until"
+    lookup = "date__lte"
+    input_type = "date"
+
+
+class PostSlugFilter(InputFilter):
+    """
+    Filters comments by the slug of their post.
+    """
+
+    title = "post slug"
+    parameter_name = "post_slug"
+    lookup = "post__slug"
+
+
+class CommenterFilter(InputFilter):
+    """
+    Filters comments by the name of their author.
+    """
+
+    title = "user name"
+    parameter_name = "commenter"
+    lookup = "user_name"
+
+
+class PostAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin configuration for the Post model.
 
@@ -25,14 +104,76 @@ class PostAdmin(admin.ModelAdmin):
     It prepopulates the slug field from the title and provides filtering
     options by author, date, and tags. It also defines how the posts are
     displayed in the list view (title, date, and author).
+
+    In large-table mode the list is paged by `(date, id)` like the post
+    list of the site, and filtered by typed-in author e-mail, tag caption
+    and date range.
     """
 
     prepopulated_fields = {"slug": ("title",)}
     list_filter = ("author", "date", "tag")
+    large_list_filter = (
+        AuthorEmailFilter,
+        TagCaptionFilter,
+        DateFromFilter,
+        DateUntilFilter,
+    )
     list_display = ("title", "date", "author")
+    list_select_related = ("author",)
+    list_defer = ("content", "content_html")
+    keyset_keys = ("date", "id")
+    search_fields = ("=slug", "^title")
+    autocomplete_fields = ("author", "tag")
+
+    def get_urls(self):
+        """
+        Adds the export view to the post admin URLs.
+        """
+        export = path(
+            "export/",
+            self.admin_site.admin_view(self.export_view),
+            name="blog_post_export",
+        )
+        return [export, *super().get_urls()]
+
+    def export_view(self, request):
+        """
+        Streams all blog content as an NDJSON or CSV download.
+
+        The `format` query parameter selects `ndjson` (the default) or
+        `csv`, and `gzip=1` compresses the download on the fly. The content
+        is produced while it is sent (see `blog.dump`), so memory use stays
+        flat however large the blog is.
+
+        The download holds the e-mail addresses of authors and commenters,
+        so the user must be allowed to view every exported model, not just
+        posts.
+
+        Raises:
+            PermissionDenied: If the user may not view posts, authors, tags
+            or comments.
+        """
+        registry = self.admin_site._registry  # pylint: disable=protected-access
+        if not all(
+            registry[model].has_view_permission(request)
+            for model in (Post, Author, Tag, Comment)
+        ):
+            raise PermissionDenied
+        fmt = "csv" if request.GET.get("format") == "csv" else "ndjson"
+        compress = request.GET.get("gzip") == "1"
+
+        chunks = dump.encode_records(dump.export_records(), fmt, compress=compress)
+        content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+        filename = f"blog-{timezone.now():%Y%m%d}.{fmt}"
+        if compress:
+            content_type = "application/gzip"
+            filename += ".gz"
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin configuration for the Comment model.
 
@@ -40,14 +181,51 @@ class CommentAdmin(admin.ModelAdmin):
     It defines how comments are displayed in the list view (user name and
     associated post), and allows filtering comments by user name and
     associated post.
+
+    In large-table mode the list is paged by ID and filtered by typed-in
+    user name and post slug; the large text columns of comments and their
+    posts are not loaded.
     """
 
     list_display = ("user_name", "post")
     list_filter = ("user_name", "post")
+    large_list_filter = (CommenterFilter, PostSlugFilter)
+    list_select_related = ("post",)
+    list_defer = (
+        "comment_html",
+        "post__content",
+        "post__content_html",
+        "post__excerpt",
+    )
+    autocomplete_fields = ("post",)
+
+
+class AuthorAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Author model.
+
+    Authors are searchable, so posts can pick their author with an
+    autocomplete widget.
+    """
+
+    list_display = ("first_name", "last_name", "e_mail")
+    search_fields = ("^last_name", "^first_name", "e_mail")
+
+
+class TagAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Tag model.
+
+    Tags are searchable, so posts can pick their tags with an autocomplete
+    widget, and are listed with their stored post counts.
+    """
+
+    list_display = ("caption", "post_count")
+    search_fields = ("^caption",)
 
 
 # Register the models with the admin interface
 admin.site.register(Post, PostAdmin)
-admin.site.register(Author)
-admin.site.register(Tag)
+admin.site.register(Author, AuthorAdmin)
+admin.site.register(Tag, TagAdmin)
 admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,306 @@
+"""
+This module provides the large-table mode of the blog admin.
+
+Django's changelist was designed for small tables: it counts the whole
+table (twice when filtered), pages with `LIMIT ... OFFSET ...` and fills
+`list_filter` sidebars with every distinct value of a field. On tables
+with millions of posts or comments each of these becomes slow. With the
+`BLOG_ADMIN_LARGE_TABLES` setting enabled (the default), admin classes
+using `LargeTableAdminMixin` instead:
+
+    - Count approximately (`EstimatedCountPaginator`): unfiltered lists on
+      PostgreSQL use the planner's row estimate, other lists are counted up
+      to a limit; the second, unfiltered count is disabled.
+    - Page with keyset cursors (`KeysetChangeList`) while the list is in its
+      default order, so every page is one indexed range query.
+    - Filter with text inputs (`InputFilter`) rather than choice lists.
+    - Defer large text columns the list does not show (`list_defer`).
+
+Classes:
+    - `EstimatedCountPaginator`: A paginator with approximate counts.
+    - `KeysetChangeList`: A changelist paginated with keyset cursors.
+    - `InputFilter`: A list filter matching a typed-in value.
+    - `LargeTableAdminMixin`: Switches a model admin to large-table mode.
+
+Functions:
+    - `large_tables_enabled`: Returns whether large-table mode is on.
+"""
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .pagination import InvalidCursor, KeysetPaginator
+
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+
+
+def large_tables_enabled():
+    """
+    Returns True if the admin runs in large-table mode.
+    """
+    return getattr(settings, "BLOG_ADMIN_LARGE_TABLES", True)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator whose count is approximate for large lists.
+
+    Unfiltered lists on PostgreSQL are counted with the planner's estimate
+    from `pg_class.reltuples` when it exceeds `count_limit`. Other lists
+    are counted exactly up to `count_limit` rows, with a `COUNT(*)` over a
+    limited subquery, so counting a filtered list never scans more rows
+    than that.
+
+    Attributes:
+        count_limit (int): The number of rows counted exactly.
+        approximate (bool): Whether the count is an estimate or reached the
+        limit; set once `count` is computed.
+    """
+
+    count_limit = 10000
+    approximate = False
+
+    def estimate(self):
+        """
+        Returns the planner's row estimate of the list's table, or None.
+
+        Only unfiltered lists on PostgreSQL are estimated; the estimate is
+        unavailable before the table was first analyzed.
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql" or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],  # pylint: disable=protected-access
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+
+    @cached_property
+    def count(self):
+        """
+        Returns the (approximate) number of objects in the list.
+        """
+        estimate = self.estimate()
+        if estimate is not None and estimate > self.count_limit:
+            self.approximate = True
+            return estimate
+        count = self.object_list.order_by()[: self.count_limit].count()
+        self.approximate = count == self.count_limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    A changelist paginated with keyset cursors.
+
+    While the list is shown in its default order (no column is sorted by)
+    it is ordered by the model admin's `keyset_keys`, newest first, and
+    paged with the `after` and `before` cursors of
+    `blog.pagination.KeysetPaginator`. Sorting by a column falls back to
+    Django's numbered pages.
+
+    Attributes:
+        keyset_page (KeysetPage | None): The current page in keyset mode.
+        approximate_count (bool): Whether `result_count` is approximate.
+    """
+
+    keyset_page = None
+    approximate_count = False
+
+    def get_filters_params(self, params=None):
+        """
+        Returns the filter parameters, without the page cursors.
+        """
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        """
+        Returns a query string for the list, starting again from the first
+        page unless a cursor is given in `new_params`.
+        """
+        new_params = {AFTER_VAR: None, BEFORE_VAR: None, **(new_params or {})}
+        return super().get_query_string(new_params, remove)
+
+    def get_queryset(self, request):
+        """
+        Returns the list's queryset, without the columns in `list_defer`.
+        """
+        queryset = super().get_queryset(request)
+        if self.model_admin.list_defer:
+            queryset = queryset.defer(*self.model_admin.list_defer)
+        return queryset
+
+    def get_results(self, request):
+        """
+        Selects the objects of the current page.
+
+        Raises:
+            IncorrectLookupParameters: If a cursor is malformed.
+        """
+        if ORDER_VAR in self.params:
+            super().get_results(request)
+            return
+
+        paginator = KeysetPaginator(
+            self.queryset, self.list_per_page, keys=self.model_admin.keyset_keys
+        )
+        try:
+            page = paginator.page(
+                after=self.params.get(AFTER_VAR), before=self.params.get(BEFORE_VAR)
+            )
+        except InvalidCursor as exc:
+            raise IncorrectLookupParameters(exc) from exc
+
+        counter = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.keyset_page = page
+        self.paginator = paginator
+        self.result_list = page.object_list
+        self.result_count = counter.count
+        self.approximate_count = getattr(counter, "approximate", False)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+
+    def next_page_query(self):
+        """
+        Returns the query string of the page with older objects.
+        """
+        return self.get_query_string({AFTER_VAR: self.keyset_page.next_cursor})
+
+    def previous_page_query(self):
+        """
+        Returns the query string of the page with newer objects.
+        """
+        return self.get_query_string({BEFORE_VAR: self.keyset_page.previous_cursor})
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    A list filter matching a typed-in value instead of offering choices.
+
+    Choice filters load every distinct value (or every related object) into
+    the sidebar; an input filter costs nothing until it is used. Subclasses
+    set `title`, `parameter_name` and the ORM `lookup` the value is
+    matched with.
+
+    Attributes:
+        lookup (str): The ORM lookup filtered by, e.g. `"author__e_mail"`.
+        input_type (str): The type of the HTML input, e.g. `"date"`.
+    """
+
+    template = "admin/blog/input_filter.html"
+    lookup = None
+    input_type = "text"
+
+    def lookups(self, request, model_admin):
+        """
+        Returns a single placeholder choice, so that the filter is shown.
+        """
+        return (("", ""),)
+
+    def choices(self, changelist):
+        """
+        Yields the "All" choice, with the other active filters as the hidden
+        fields of the input's form.
+        """
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "hidden_params": [
+                (key, value)
+                for key, value in changelist.params.items()
+                if key not in (self.parameter_name, AFTER_VAR, BEFORE_VAR)
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        """
+        Filters the queryset by the typed-in value.
+
+        Raises:
+            IncorrectLookupParameters: If the value does not fit the field.
+        """
+        value = (self.value() or "").strip()
+        if not value:
+            return None
+        try:
+            return queryset.filter(**{self.lookup: value})
+        except (ValueError, ValidationError) as exc:
+            raise IncorrectLookupParameters(exc) from exc
+
+
+class LargeTableAdminMixin:
+    """
+    Switches a model admin to large-table mode.
+
+    In large-table mode the admin counts approximately, pages with keyset
+    cursors and uses `large_list_filter` instead of `list_filter`. With the
+    `BLOG_ADMIN_LARGE_TABLES` setting disabled the admin behaves as usual.
+
+    Attributes:
+        keyset_keys (tuple): The fields ordering the list, newest first; the
+        last must be unique.
+        large_list_filter (tuple): The list filters used in large-table mode.
+        list_defer (tuple): Fields not loaded for the list.
+    """
+
+    change_list_template = "admin/blog/keyset_change_list.html"
+    keyset_keys = ("id",)
+    large_list_filter = ()
+    list_defer = ()
+
+    @property
+    def show_full_result_count(self):
+        """
+        Counts the unfiltered list too, unless in large-table mode.
+        """
+        return not large_tables_enabled()
+
+    def get_list_filter(self, request):
+        """
+        Returns the list filters of the current mode.
+        """
+        if large_tables_enabled():
+            return self.large_list_filter
+        return super().get_list_filter(request)
+
+    def get_changelist(self, request, **kwargs):
+        """
+        Returns the keyset changelist in large-table mode.
+        """
+        if large_tables_enabled():
+            return KeysetChangeList
+        return super().get_changelist(request, **kwargs)
+
+    def get_paginator(
+        self, request, queryset, per_page, orphans=0, allow_empty_first_page=True
+    ):
+        # pylint: disable=too-many-arguments
+        """
+        Returns a paginator with approximate counts in large-table mode.
+        """
+        if large_tables_enabled():
+            return EstimatedCountPaginator(
+                queryset, per_page, orphans, allow_empty_first_page
+            )
+        return super().get_paginator(
+            request, queryset, per_page, orphans, allow_empty_first_page
+        )
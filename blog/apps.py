@@ -16,6 +16,8 @@ class BlogConfig(AppConfig):
     - The default auto field type for models in this app, which is set to
       'django.db.models.BigAutoField'. This ensures that primary keys
       use a 64-bit integer field by default.
+    - The signal receivers in `blog.signals`, which are connected in
+      `ready()`.
 
     Attributes:
         default_auto_field (str): The default field type for auto-incrementing
@@ -26,3 +28,10 @@ class BlogConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "blog"
+
+    def ready(self):
+        """
+        Connects the blog's signal receivers once the app registry is ready.
+        """
+        # pylint: disable=import-outside-toplevel,unused-import
+        from . import signals  # noqa: F401
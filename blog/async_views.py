@@ -0,0 +1,306 @@
+"""
+This module contains asynchronous versions of the 'blog' application's views.
+
+Under ASGI a synchronous view occupies a thread of the `sync_to_async`
+thread pool for the whole request, which caps concurrency at the pool size.
+The views below are native coroutines that use the async ORM (`aget`,
+`async for`, `asave`) and load and save the visitor's read-later store with
+its asynchronous methods. Everything a template needs is loaded
+before rendering, so no query is issued from inside the template.
+
+The views mirror `blog.views` and keep the same names, templates and
+behaviour. `blog.urls` routes to them when the `BLOG_ASYNC_VIEWS` setting is
+enabled, which `my_site.asgi` does by default.
+
+Views:
+    - `StartingPageView`: The three most recent posts.
+    - `PostsView`: The keyset-paginated list of all posts.
+    - `PostDetailView`: A single post with its comments and comment form.
+    - `ReadLaterView`: The posts stored for later, and storing them.
+"""
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+from django.views import View
+
+from . import fragment_cache, object_cache, page_cache, read_later, view_counts
+from .forms import CommentForm
+from .models import Post
+from .pagination import InvalidCursor, KeysetPaginator
+from .views import PostDetailView as SyncPostDetailView
+from .views import PostsView as SyncPostsView
+from .views import ReadLaterView as SyncReadLaterView
+
+
+class StartingPageView(View):
+    """
+    Asynchronous view rendering the starting page with the latest posts.
+
+    Methods:
+        get: Renders the three most recent and the three most read posts.
+    """
+
+    async def get(self, request):
+        """
+        Handles GET requests to render the starting page.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The rendered starting page.
+        """
+        posts = await object_cache.alatest_posts(3)
+        context = {
+            "posts": posts,
+            "post_cards": await fragment_cache.arender_cards(posts),
+            "most_read_cards": await fragment_cache.arender_cards(
+                await object_cache.amost_read(3)
+            ),
+        }
+        return render(request, "blog/index.html", context)
+
+
+class PostsView(View):
+    """
+    Asynchronous view rendering the keyset-paginated list of all posts.
+
+    Attributes:
+        paginate_by (int): The number of posts shown on each page.
+        replica_reads (bool): GET requests read from the read replicas.
+
+    Methods:
+        get: Renders one page of posts.
+    """
+
+    paginate_by = SyncPostsView.paginate_by
+    replica_reads = True
+
+    async def get(self, request):
+        """
+        Handles GET requests to render a page of posts.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The rendered page of posts.
+
+        Raises:
+            Http404: If the cursor in the query string is malformed.
+        """
+        paginator = KeysetPaginator(
+            Post.objects.for_cards(),  # pylint: disable=no-member
+            self.paginate_by,
+            keys=("date", "id"),
+        )
+        try:
+            page = await paginator.apage(
+                after=request.GET.get("after"),
+                before=request.GET.get("before"),
+            )
+        except InvalidCursor as exc:
+            raise Http404("Invalid page cursor.") from exc
+
+        context = {
+            "all_posts": page.object_list,
+            "post_cards": await fragment_cache.arender_cards(page.object_list),
+            "page_obj": page,
+            "paginator": paginator,
+            "is_paginated": page.has_other_pages(),
+        }
+        return render(request, "blog/all-posts.html", context)
+
+
+class PostDetailView(View):
+    """
+    Asynchronous view for displaying a single post and accepting comments.
+
+    Shares the rendered-page cache with the synchronous view, so cached
+    pages are served with a single cache read.
+
+    Attributes:
+        comments_per_page (int): The number of comments rendered inline.
+
+    Methods:
+        is_stored_post: Checks if the post is stored for later.
+        render_post: Renders the page for a post with per-session
+        placeholders.
+        get_post: Loads a post with everything its template needs.
+        respond: Fills in the per-session parts of a rendered page.
+        get: Renders the post detail page.
+        post: Handles form submission for adding a new comment.
+    """
+
+    comments_per_page = SyncPostDetailView.comments_per_page
+
+    async def is_stored_post(self, request, post_id):
+        """
+        Checks if the post is stored for later.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            post_id (int): The ID of the post to check.
+
+        Returns:
+            bool: True if the post is stored for later, otherwise False.
+        """
+        store = read_later.get_store(request)
+        await store.aload()
+        return store.contains(post_id)
+
+    async def render_post(self, post, comment_form):
+        """
+        Renders the post detail page for `post` with per-session placeholders.
+
+        Args:
+            post (Post): The post to render, with its author selected and its
+            renditions prefetched.
+            comment_form (CommentForm): The (possibly bound) comment form.
+
+        Returns:
+            str: The rendered page with per-session placeholders.
+        """
+        comments = await KeysetPaginator(
+            post.comments.all(), self.comments_per_page, keys=("id",)
+        ).apage()
+        context = {
+            "post": post,
+            "post_tags": await sync_to_async(object_cache.post_tags)(
+                post.id, sync=True
+            ),
+            "comment_form": comment_form,
+            "comments": comments,
+        }
+        return page_cache.render_page(context)
+
+    async def get_post(self, slug):
+        """
+        Returns the post with `slug` and everything its template needs.
+
+        Raises:
+            Http404: If no post has the slug.
+        """
+        try:
+            return await object_cache.aget_post(slug, sync=True)
+        except Post.DoesNotExist as exc:  # pylint: disable=no-member
+            raise Http404("No post matches the given slug.") from exc
+
+    async def respond(self, request, body, post_id):
+        """
+        Fills the per-session parts of `body` and wraps it in a response.
+        """
+        body = page_cache.fill_session_parts(
+            body, request, post_id, await self.is_stored_post(request, post_id)
+        )
+        return HttpResponse(body)
+
+    async def get(self, request, slug):
+        """
+        Handles GET requests to render a post detail page.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            slug (str): The slug of the post to retrieve.
+
+        Returns:
+            HttpResponse: The rendered post detail page.
+        """
+        entry = await page_cache.aget_page(slug)
+        if entry is None:
+            post = await self.get_post(slug)
+            body = await self.render_post(post, CommentForm())
+            entry = await page_cache.aset_page(slug, post.id, body)
+
+        if request.method == "GET":
+            view_counts.record(entry["post_id"])
+        return await self.respond(request, entry["body"], entry["post_id"])
+
+    async def post(self, request, slug):
+        """
+        Handles POST requests to submit a new comment on a post.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            slug (str): The slug of the post to add the comment to.
+
+        Returns:
+            HttpResponse: A redirect to the post detail page after saving the
+            comment, or the page with the form errors.
+        """
+        comment_form = CommentForm(request.POST)
+        post = await self.get_post(slug)
+
+        if comment_form.is_valid():
+            comment = comment_form.save(commit=False)
+            comment.post = post
+            await comment.asave()
+
+            return HttpResponseRedirect(reverse("post-detail-page", args=[slug]))
+
+        body = await self.render_post(post, comment_form)
+        return await self.respond(request, body, post.id)
+
+
+class ReadLaterView(View):
+    """
+    Asynchronous view for showing and changing the posts stored for later.
+
+    Attributes:
+        replica_reads (bool): GET requests read from the read replicas.
+
+    Methods:
+        get: Renders a list of saved posts.
+        post: Adds or removes a post from the saved posts list.
+    """
+
+    replica_reads = True
+
+    async def get(self, request):
+        """
+        Handles GET requests to display a list of stored posts.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The rendered stored posts page.
+        """
+        store = read_later.get_store(request)
+        await store.aload()
+        stored_posts = store.ids()
+
+        posts = []
+        if stored_posts:
+            queryset = Post.objects.for_cards().filter(  # pylint: disable=no-member
+                id__in=stored_posts
+            )
+            posts = [post async for post in queryset]
+
+        context = {"posts": posts, "has_posts": bool(posts)}
+        return render(request, "blog/stored-posts.html", context)
+
+    async def post(self, request):
+        """
+        Handles POST requests to save or remove posts from the saved list.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponseRedirect: Redirects to the home page after updating
+            the read-later list.
+        """
+        store = read_later.get_store(request)
+        await store.aload()
+        try:
+            store.toggle(int(request.POST["post_id"]))
+        except read_later.ReadLaterFull:
+            messages.warning(request, SyncReadLaterView.full_message)
+
+        response = HttpResponseRedirect("/")
+        await store.asave(response)
+        return response
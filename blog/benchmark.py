@@ -0,0 +1,402 @@
+"""
+This module implements the synthetic data generator and the scenario
+benchmarks of the blog.
+
+`seed_data` fills the database with reproducible authors, tags, posts and
+comments: the same seed and sizes always produce the same rows. Rows are
+written with `bulk_create` in batches, so seeding a million rows keeps
+memory use flat. Generated rows are recognisable by their `bench-` prefix
+and can be removed again with `clear_data`.
+
+`run_benchmarks` requests each page of the site in turn through Django's
+test client, in-process and without a web server, and records per request
+the latency and the number of SQL queries. After the timed requests one
+more request runs under `tracemalloc` to measure the peak memory it
+allocates. The results are returned as a JSON-serialisable dict, so runs can
+be saved and compared.
+
+Both are wrapped by the `seed_blog` and `benchmark` management commands.
+
+Functions:
+    - `seed_data`: Generates reproducible blog data.
+    - `clear_data`: Removes generated blog data.
+    - `percentile`: Returns a percentile of a list of numbers.
+    - `summarize`: Summarises the measurements of one scenario.
+    - `run_benchmarks`: Runs the scenario benchmarks.
+"""
+
+import datetime
+import platform
+import random
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import object_cache, tagging
+from .models import Author, Comment, Post, Tag
+from .pagination import KeysetPaginator
+
+PREFIX = "bench"
+SCENARIOS = (
+    "starting-page",
+    "posts-page",
+    "posts-page-deep",
+    "post-detail-page",
+    "post-comment",
+    "read-later",
+    "read-later-toggle",
+)
+
+WORDS = (
+    "django python cache query index template storage async cursor page "
+    "post comment author tag render stream batch worker latency memory "
+    "database replica signal model view request response server static "
+    "image search feed export import metric profile thread process"
+).split()
+
+
+def _sentence(rng, words):
+    """
+    Returns a capitalised sentence of `words` random words.
+    """
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + "."
+
+
+def _paragraphs(rng, count):
+    """
+    Returns `count` paragraphs of random sentences.
+    """
+    return "\n\n".join(
+        " ".join(_sentence(rng, rng.randint(6, 14)) for _ in range(5))
+        for _ in range(count)
+    )
+
+
+def seed_data(
+    posts=1000, authors=None, tags=None, comments_per_post=3, seed=0, batch_size=1000
+):
+    # pylint: disable=too-many-arguments,too-many-locals
+    """
+    Generates reproducible authors, tags, posts and comments.
+
+    Each post gets one to three tags and on average `comments_per_post`
+    comments. Posts are written with `bulk_create`, which bypasses
+    `Post.save()` and its signal receivers, so their HTML and the tag post
+    counts are computed here and the search index must be rebuilt
+    afterwards (the `seed_blog` command does).
+
+    Args:
+        posts (int): The number of posts.
+        authors (int): The number of authors; defaults to one per 100 posts.
+        tags (int): The number of tags; defaults to one per 20 posts, at
+        least 5.
+        comments_per_post (int): The average number of comments per post.
+        seed (int): The seed of the random generator.
+        batch_size (int): The number of posts written per batch.
+
+    Returns:
+        dict: The number of rows created per model.
+    """
+    rng = random.Random(seed)
+    authors = authors or max(1, posts // 100)
+    tags = tags or max(5, posts // 20)
+    prefix = f"{PREFIX}-{seed}"
+    counts = {"authors": authors, "tags": tags, "posts": 0, "comments": 0}
+
+    with transaction.atomic():
+        author_objs = Author.objects.bulk_create(  # pylint: disable=no-member
+            Author(
+                first_name=rng.choice(WORDS).capitalize(),
+                last_name=f"{rng.choice(WORDS).capitalize()}{i}",
+                e_mail=f"author{i}@{prefix}.example.com",
+            )
+            for i in range(authors)
+        )
+        tag_objs = Tag.objects.bulk_create(  # pylint: disable=no-member
+            Tag(caption=f"{prefix}-{i}"[:20]) for i in range(tags)
+        )
+
+    tag_through = Post.tag.through
+    for start in range(0, posts, batch_size):
+        stop = min(start + batch_size, posts)
+        with transaction.atomic():
+            post_objs = [
+                Post(
+                    title=_sentence(rng, rng.randint(3, 8))[:-1],
+                    excerpt=_sentence(rng, rng.randint(10, 25)),
+                    image=f"posts/{prefix}-{i % 50}.jpg",
+                    slug=f"{prefix}-post-{i}",
+                    content=_paragraphs(rng, rng.randint(2, 6)),
+                    author=rng.choice(author_objs),
+                )
+                for i in range(start, stop)
+            ]
+            for post in post_objs:
+                post.render_html()
+            post_objs = Post.objects.bulk_create(post_objs)  # pylint: disable=no-member
+            tag_through.objects.bulk_create(
+                tag_through(post_id=post.pk, tag_id=tag.pk)
+                for post in post_objs
+                for tag in rng.sample(tag_objs, rng.randint(1, min(3, len(tag_objs))))
+            )
+            comments = [
+                Comment(
+                    user_name=rng.choice(WORDS).capitalize(),
+                    user_email=f"reader{rng.randrange(10000)}@{prefix}.example.com",
+                    comment_text=_sentence(rng, rng.randint(5, 30)),
+                    post=post,
+                )
+                for post in post_objs
+                for _ in range(rng.randint(0, 2 * comments_per_post))
+            ]
+            for comment in comments:
+                comment.render_html()
+            Comment.objects.bulk_create(  # pylint: disable=no-member
+                comments, batch_size=batch_size
+            )
+        counts["posts"] += len(post_objs)
+        counts["comments"] += len(comments)
+    tagging.recount(tag.pk for tag in tag_objs)
+    object_cache.invalidate()
+    return counts
+
+
+def clear_data():
+    """
+    Removes all generated blog data, whatever seed it was generated with.
+
+    Returns:
+        int: The total number of deleted rows.
+    """
+    # pylint: disable=no-member
+    deleted = 0
+    for queryset in (
+        Post.objects.filter(slug__startswith=f"{PREFIX}-"),
+        Tag.objects.filter(caption__startswith=f"{PREFIX}-"),
+        Author.objects.filter(e_mail__contains=f"@{PREFIX}-"),
+    ):
+        deleted += queryset.delete()[0]
+    return deleted
+
+
+def percentile(values, pct):
+    """
+    Returns the `pct` percentile of `values`, interpolating linearly between
+    the closest ranks.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(latencies, elapsed, query_counts, errors, peak_memory):
+    """
+    Summarises the measurements of one scenario.
+
+    Args:
+        latencies (list): The latency of each request, in seconds.
+        elapsed (float): The wall time of all requests, in seconds.
+        query_counts (list): The number of SQL queries of each request.
+        errors (int): The number of responses with an error status.
+        peak_memory (int): The peak memory allocated by one request, in
+        bytes.
+
+    Returns:
+        dict: The summary, with latencies in milliseconds.
+    """
+
+    def ms(seconds):
+        return round(seconds * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "latency_ms": {
+            "min": ms(min(latencies)),
+            "mean": ms(sum(latencies) / len(latencies)),
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(max(latencies)),
+        },
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "queries": {
+            "mean": round(sum(query_counts) / len(query_counts), 2),
+            "max": max(query_counts),
+        },
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def _sample_posts(rng, count):
+    """
+    Returns up to `count` random posts without scanning the post table.
+    """
+    bounds = Post.objects.order_by("id").values_list(  # pylint: disable=no-member
+        "id", flat=True
+    )
+    first, last = bounds.first(), bounds.last()
+    if first is None:
+        return []
+    ids = {rng.randint(first, last) for _ in range(count * 2)}
+    sample = Post.objects.filter(id__in=ids)  # pylint: disable=no-member
+    return list(sample.only("id", "slug", "date")[:count])
+
+
+def _deep_cursor():
+    """
+    Returns the `after` cursor of a page about nine tenths into the archive.
+    """
+    queryset = Post.objects.order_by("-date", "-id")  # pylint: disable=no-member
+    total = queryset.count()
+    post = queryset.only("id", "date")[total * 9 // 10] if total else None
+    if post is None:
+        return ""
+    return KeysetPaginator(queryset, 1).encode_cursor(post)
+
+
+def _scenario_requests(name, rng, posts, deep_cursor):
+    """
+    Returns a function producing the `(method, path, data)` of the next
+    request of scenario `name`.
+    """
+    if name == "starting-page":
+        return lambda: ("get", reverse("starting-page"), None)
+    if name == "posts-page":
+        return lambda: ("get", reverse("posts-page"), None)
+    if name == "posts-page-deep":
+        return lambda: ("get", reverse("posts-page"), {"after": deep_cursor})
+    if name == "post-detail-page":
+        return lambda: (
+            "get",
+            reverse("post-detail-page", args=[rng.choice(posts).slug]),
+            None,
+        )
+    if name == "post-comment":
+        return lambda: (
+            "post",
+            reverse("post-detail-page", args=[rng.choice(posts).slug]),
+            {
+                "user_name": "Benchmark",
+                "user_email": f"reader@{PREFIX}.example.com",
+                "comment_text": _sentence(rng, 12),
+            },
+        )
+    if name == "read-later":
+        return lambda: ("get", reverse("read-later"), None)
+    if name == "read-later-toggle":
+        return lambda: (
+            "post",
+            reverse("read-later"),
+            {"post_id": rng.choice(posts).id},
+        )
+    raise ValueError(f"Unknown scenario {name!r}.")
+
+
+def _measure(client, next_request):
+    """
+    Sends one request and returns its latency, query count and status code.
+    """
+    method, path, data = next_request()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = getattr(client, method)(path, data)
+        latency = time.perf_counter() - start
+    return latency, len(queries), response.status_code
+
+
+def _peak_memory(client, next_request):
+    """
+    Returns the peak memory in bytes allocated while serving one request.
+    """
+    tracemalloc.start()
+    try:
+        method, path, data = next_request()
+        getattr(client, method)(path, data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(scenarios=SCENARIOS, iterations=100, warmup=10, seed=0, host=None):
+    # pylint: disable=too-many-arguments,too-many-locals
+    """
+    Runs the scenario benchmarks against the current database.
+
+    The scenarios run one after another with a single client, so cookies
+    (e.g. the read-later list) carry over between requests. Warm-up requests
+    fill the caches and are not measured. The `post-comment` scenario adds
+    comments to random posts.
+
+    Args:
+        scenarios (iterable): The names of the scenarios to run.
+        iterations (int): The number of measured requests per scenario.
+        warmup (int): The number of unmeasured requests per scenario.
+        seed (int): The seed choosing the requested posts.
+        host (str): The `Host` header; defaults to the first allowed host.
+
+    Returns:
+        dict: The run's metadata and the summary of each scenario.
+    """
+    rng = random.Random(seed)
+    posts = _sample_posts(rng, 100)
+    if not posts:
+        raise ValueError("There are no posts to benchmark; run seed_blog first.")
+    deep_cursor = _deep_cursor()
+
+    allowed_hosts = [h for h in settings.ALLOWED_HOSTS if h and "*" not in h]
+    host = host or (allowed_hosts[0].lstrip(".") if allowed_hosts else "testserver")
+    client = Client(HTTP_HOST=host)
+
+    results = {}
+    for name in scenarios:
+        next_request = _scenario_requests(name, rng, posts, deep_cursor)
+        for _ in range(warmup):
+            _measure(client, next_request)
+
+        latencies, query_counts, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            latency, queries, status = _measure(client, next_request)
+            latencies.append(latency)
+            query_counts.append(queries)
+            errors += status >= 400
+        elapsed = time.perf_counter() - started
+
+        results[name] = summarize(
+            latencies,
+            elapsed,
+            query_counts,
+            errors,
+            _peak_memory(client, next_request),
+        )
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": iterations,
+            "warmup": warmup,
+            "seed": seed,
+            "rows": {
+                "posts": Post.objects.count(),  # pylint: disable=no-member
+                "comments": Comment.objects.count(),  # pylint: disable=no-member
+                "tags": Tag.objects.count(),  # pylint: disable=no-member
+                "authors": Author.objects.count(),  # pylint: disable=no-member
+            },
+        },
+        "scenarios": results,
+    }
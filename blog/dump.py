@@ -0,0 +1,501 @@
+"""
+This module implements the streaming import and export of blog content.
+
+Content is exchanged as a stream of flat records, one per line of NDJSON or
+per row of CSV, each with a `type` field:
+
+    - `author`: `first_name`, `last_name`, `e_mail` (the key).
+    - `tag`: `caption` (the key).
+    - `post`: `slug` (the key), `title`, `excerpt`, `image`, `date`,
+      `content`, `author` (an author's `e_mail`) and `tags` (captions; a list
+      in NDJSON, separated by `|` in CSV).
+    - `comment`: `post` (a post's `slug`), `user_name`, `user_email`,
+      `comment_text`.
+
+A CSV file has one header row with all of `CSV_FIELDS`; each row leaves the
+fields of the other record types empty.
+
+`Importer` reads the records one at a time and keeps only the current batch
+and maps from natural keys (e-mail, caption, slug) to database IDs in
+memory. Each batch is written in one transaction with `bulk_create` (which
+sends no signals, so the HTML of posts and comments is rendered here):
+authors, tags, posts, the post/tag through table and comments, in that
+order, so records may refer to anything that appeared earlier in the
+stream. Authors, tags and posts whose key already exists are skipped, which
+makes re-running an import harmless; comments have no key, so an import is
+continued from its last committed batch instead (see the `import_blog`
+command).
+
+`export_records` walks the tables with `.iterator(chunk_size=...)` and
+yields the same records, so an export can be imported again. The tags of
+each post come from a second iterator over the post/tag through table,
+sorted by post and merged with the posts, so no table is ever held in
+memory. `encode_records` turns the records into NDJSON or CSV chunks,
+optionally gzip-compressed on the fly, for the `export_blog` command and
+the admin export view.
+
+Classes:
+    - `InvalidRecord`: Raised for malformed input.
+    - `Importer`: Imports a stream of records in batches.
+
+Functions:
+    - `read_records`: Yields the records of an NDJSON or CSV stream.
+    - `export_records`: Yields the records of all blog content.
+    - `encode_records`: Encodes records as NDJSON or CSV byte chunks.
+"""
+
+import csv
+import io
+import json
+import zlib
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Author, Comment, Post, Tag
+
+RECORD_FIELDS = {
+    "author": ("first_name", "last_name", "e_mail"),
+    "tag": ("caption",),
+    "post": ("slug", "title", "excerpt", "image", "date", "content", "author", "tags"),
+    "comment": ("post", "user_name", "user_email", "comment_text"),
+}
+# The field identifying each record type (for comments, their post).
+RECORD_KEYS = {"author": "e_mail", "tag": "caption", "post": "slug", "comment": "post"}
+CSV_FIELDS = ("type",) + tuple(
+    dict.fromkeys(field for fields in RECORD_FIELDS.values() for field in fields)
+)
+CSV_TAG_SEPARATOR = "|"
+
+
+class InvalidRecord(ValueError):
+    """
+    Raised when an input record is malformed.
+
+    Attributes:
+        line (int): The line (or CSV row) number of the record.
+    """
+
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+
+
+def _read_ndjson(stream):
+    """
+    Yields `(line, record)` for each non-blank line of an NDJSON stream.
+    """
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            raise InvalidRecord(line, f"invalid JSON ({exc}).") from exc
+        if not isinstance(record, dict):
+            raise InvalidRecord(line, "a record must be a JSON object.")
+        yield line, record
+
+
+def _read_csv(stream):
+    """
+    Yields `(row, record)` for each row of a CSV stream with a header row.
+    """
+    for row, record in enumerate(csv.DictReader(stream), start=2):
+        if record.get("type") == "post":
+            tags = record.get("tags") or ""
+            record["tags"] = [tag for tag in tags.split(CSV_TAG_SEPARATOR) if tag]
+        yield row, {key: value for key, value in record.items() if value != ""}
+
+
+def read_records(stream, fmt):
+    """
+    Yields `(line, record)` pairs from a text stream.
+
+    Args:
+        stream (file): The open text stream.
+        fmt (str): `"ndjson"` or `"csv"`.
+
+    Raises:
+        InvalidRecord: If a record cannot be parsed.
+    """
+    if fmt == "csv":
+        return _read_csv(stream)
+    return _read_ndjson(stream)
+
+
+class Importer:
+    """
+    Imports a stream of records in batches.
+
+    Attributes:
+        batch_size (int): The number of records written per transaction.
+        using (str): The database alias written to.
+        stats (Counter): Counts of created and skipped records per type,
+        e.g. `stats["post_created"]`.
+        commented_slugs (set): The slugs of the posts that got comments.
+        on_batch (callable): Called with the line number of the last record
+        of each committed batch, e.g. to save a checkpoint.
+    """
+
+    def __init__(self, batch_size=5000, using=DEFAULT_DB_ALIAS, on_batch=None):
+        self.batch_size = batch_size
+        self.using = using
+        self.on_batch = on_batch
+        self.stats = Counter()
+        self.commented_slugs = set()
+
+        self.author_ids = dict(
+            Author.objects.using(using).values_list(  # pylint: disable=no-member
+                "e_mail", "id"
+            )
+        )
+        self.tag_ids = dict(
+            Tag.objects.using(using).values_list(  # pylint: disable=no-member
+                "caption", "id"
+            )
+        )
+        self.post_ids = dict(
+            Post.objects.using(using).values_list(  # pylint: disable=no-member
+                "slug", "id"
+            )
+        )
+        self._date_field = Post._meta.get_field("date")  # pylint: disable=no-member
+        self._reset()
+
+    def _reset(self):
+        """
+        Empties the pending batch.
+        """
+        self._authors = {}
+        self._tags = {}
+        self._posts = {}
+        self._comments = []
+        self._pending = 0
+
+    def run(self, records, start_after=0):
+        """
+        Imports `records`, skipping those up to line `start_after`.
+
+        Args:
+            records (iterable): `(line, record)` pairs, e.g. from
+            `read_records`.
+            start_after (int): The last line imported by a previous run.
+
+        Returns:
+            Counter: The import statistics.
+        """
+        line = start_after
+        for line, record in records:
+            if line <= start_after:
+                continue
+            self.add(line, record)
+            if self._pending >= self.batch_size:
+                self.flush(line)
+        self.flush(line)
+        return self.stats
+
+    def add(self, line, record):
+        """
+        Adds one record to the pending batch.
+
+        Raises:
+            InvalidRecord: If the record has an unknown type, lacks its key
+            or has an invalid date.
+        """
+        kind = record.get("type")
+        if kind not in RECORD_FIELDS:
+            raise InvalidRecord(line, f"unknown record type {kind!r}.")
+        key = record.get(RECORD_KEYS[kind])
+        if not key:
+            raise InvalidRecord(line, f"{kind} record without {RECORD_KEYS[kind]}.")
+
+        if kind == "comment":
+            comment = Comment(
+                user_name=record.get("user_name", ""),
+                user_email=record.get("user_email", ""),
+                comment_text=record.get("comment_text", ""),
+            )
+            comment.render_html()
+            self._comments.append((key, comment))
+        elif kind == "author":
+            self._add_unique(kind, key, self.author_ids, self._authors, record)
+        elif kind == "tag":
+            self._add_unique(kind, key, self.tag_ids, self._tags, record)
+        else:
+            try:
+                record["date"] = self._date_field.to_python(record.get("date"))
+            except ValidationError as exc:
+                raise InvalidRecord(line, f"invalid date {record['date']!r}.") from exc
+            self._add_unique(kind, key, self.post_ids, self._posts, record)
+        self._pending += 1
+
+    def _add_unique(self, kind, key, existing, pending, record):
+        # pylint: disable=too-many-arguments
+        """
+        Adds a keyed record unless its key exists or is already pending.
+        """
+        if key in existing or key in pending:
+            self.stats[f"{kind}_skipped"] += 1
+        else:
+            pending[key] = record
+
+    def _create(self, model, objects):
+        """
+        Inserts `objects` and returns them with their primary keys.
+        """
+        return model.objects.using(self.using).bulk_create(
+            objects, batch_size=self.batch_size
+        )
+
+    def flush(self, line):
+        """
+        Writes the pending batch in one transaction.
+
+        Args:
+            line (int): The line of the last record in the batch.
+        """
+        if not self._pending:
+            return
+        with transaction.atomic(using=self.using):
+            self._flush_authors()
+            self._flush_tags()
+            self._flush_posts()
+            self._flush_comments()
+        self._reset()
+        if self.on_batch is not None:
+            self.on_batch(line)
+
+    def _flush_authors(self):
+        authors = self._create(
+            Author,
+            [
+                Author(
+                    first_name=record.get("first_name", ""),
+                    last_name=record.get("last_name", ""),
+                    e_mail=e_mail,
+                )
+                for e_mail, record in self._authors.items()
+            ],
+        )
+        self.author_ids.update((author.e_mail, author.pk) for author in authors)
+        self.stats["author_created"] += len(authors)
+
+    def _flush_tags(self):
+        # Tags used by posts are created even without a tag record.
+        captions = dict.fromkeys(self._tags)
+        for record in self._posts.values():
+            captions.update(dict.fromkeys(record.get("tags") or ()))
+        tags = self._create(
+            Tag,
+            [
+                Tag(caption=caption)
+                for caption in captions
+                if caption not in self.tag_ids
+            ],
+        )
+        self.tag_ids.update((tag.caption, tag.pk) for tag in tags)
+        self.stats["tag_created"] += len(tags)
+
+    def _flush_posts(self):
+        posts = []
+        dated = []
+        for slug, record in self._posts.items():
+            post = Post(
+                slug=slug,
+                title=record.get("title", ""),
+                excerpt=record.get("excerpt", ""),
+                image=record.get("image") or None,
+                content=record.get("content", ""),
+                author_id=self.author_ids.get(record.get("author")),
+            )
+            post.render_html()
+            posts.append(post)
+            if record.get("date"):
+                dated.append((post, record["date"]))
+        posts = self._create(Post, posts)
+        self.post_ids.update((post.slug, post.pk) for post in posts)
+        self.stats["post_created"] += len(posts)
+
+        # `Post.date` is set on every save (`auto_now`), so imported dates are
+        # restored with an update.
+        for post, date in dated:
+            post.date = date
+        Post.objects.using(self.using).bulk_update(  # pylint: disable=no-member
+            [post for post, _ in dated], ["date"], batch_size=self.batch_size
+        )
+
+        through = Post.tag.through
+        self._create(
+            through,
+            [
+                through(post_id=self.post_ids[slug], tag_id=self.tag_ids[caption])
+                for slug, record in self._posts.items()
+                for caption in dict.fromkeys(record.get("tags") or ())
+            ],
+        )
+
+    def _flush_comments(self):
+        comments = []
+        for slug, comment in self._comments:
+            comment.post_id = self.post_ids.get(slug)
+            if comment.post_id is None:
+                self.stats["comment_orphaned"] += 1
+            else:
+                comments.append(comment)
+                self.commented_slugs.add(slug)
+        self._create(Comment, comments)
+        self.stats["comment_created"] += len(comments)
+
+
+def _post_tags(through_rows):
+    """
+    Returns a function giving the tag captions of a post, for posts
+    requested in ascending ID order, from `(post_id, caption)` rows sorted
+    by post ID.
+    """
+    rows = iter(through_rows)
+    pending = next(rows, None)
+
+    def tags_of(post_id):
+        nonlocal pending
+        captions = []
+        while pending is not None and pending[0] <= post_id:
+            if pending[0] == post_id:
+                captions.append(pending[1])
+            pending = next(rows, None)
+        return captions
+
+    return tags_of
+
+
+def export_records(chunk_size=2000, using=DEFAULT_DB_ALIAS):
+    # pylint: disable=no-member
+    """
+    Yields the records of all authors, tags, posts and comments.
+
+    Every table is read with a server-side iterator in chunks of
+    `chunk_size` rows, so memory use does not depend on the table sizes.
+
+    Args:
+        chunk_size (int): The number of rows fetched at a time.
+        using (str): The database alias read from.
+
+    Yields:
+        dict: One record, in the format read by `Importer`.
+    """
+    authors = Author.objects.using(using).order_by("id")
+    for first_name, last_name, e_mail in authors.values_list(
+        "first_name", "last_name", "e_mail"
+    ).iterator(chunk_size=chunk_size):
+        yield {
+            "type": "author",
+            "first_name": first_name,
+            "last_name": last_name,
+            "e_mail": e_mail,
+        }
+
+    tags = Tag.objects.using(using).order_by("id").values_list("caption", flat=True)
+    for caption in tags.iterator(chunk_size=chunk_size):
+        yield {"type": "tag", "caption": caption}
+
+    through = Post.tag.through.objects.using(using).order_by("post_id", "tag_id")
+    tags_of = _post_tags(
+        through.values_list("post_id", "tag__caption").iterator(chunk_size=chunk_size)
+    )
+    posts = Post.objects.using(using).order_by("id")
+    for row in posts.values_list(
+        "id",
+        "slug",
+        "title",
+        "excerpt",
+        "image",
+        "date",
+        "content",
+        "author__e_mail",
+    ).iterator(chunk_size=chunk_size):
+        post_id, slug, title, excerpt, image, date, content, author = row
+        yield {
+            "type": "post",
+            "slug": slug,
+            "title": title,
+            "excerpt": excerpt,
+            "image": image or "",
+            "date": date.isoformat(),
+            "content": content,
+            "author": author,
+            "tags": tags_of(post_id),
+        }
+
+    comments = Comment.objects.using(using).order_by("id")
+    for slug, user_name, user_email, comment_text in comments.values_list(
+        "post__slug", "user_name", "user_email", "comment_text"
+    ).iterator(chunk_size=chunk_size):
+        yield {
+            "type": "comment",
+            "post": slug,
+            "user_name": user_name,
+            "user_email": user_email,
+            "comment_text": comment_text,
+        }
+
+
+def _ndjson_lines(records):
+    """
+    Yields each record as a line of NDJSON.
+    """
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _csv_lines(records):
+    """
+    Yields a header row and each record as a CSV row.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        if record["type"] == "post":
+            record = {**record, "tags": CSV_TAG_SEPARATOR.join(record["tags"])}
+        writer.writerow(record)
+        if buffer.tell() >= 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_records(records, fmt="ndjson", compress=False, chunk_size=65536):
+    """
+    Encodes records as NDJSON or CSV, in byte chunks of about `chunk_size`.
+
+    Args:
+        records (iterable): The records, e.g. from `export_records`.
+        fmt (str): `"ndjson"` or `"csv"`.
+        compress (bool): Whether to gzip the output on the fly.
+        chunk_size (int): The approximate size of the yielded chunks.
+
+    Yields:
+        bytes: The next chunk of output.
+    """
+    lines = _csv_lines(records) if fmt == "csv" else _ndjson_lines(records)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line.encode())
+        size += len(pending[-1])
+        if size < chunk_size:
+            continue
+        chunk = b"".join(pending)
+        pending, size = [], 0
+        chunk = compressor.compress(chunk) if compressor else chunk
+        if chunk:
+            yield chunk
+    chunk = b"".join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
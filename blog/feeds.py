@@ -0,0 +1,241 @@
+"""
+This module implements the Atom and RSS feeds of the blog.
+
+Feeds are offered for all posts, for the posts with a given tag and for the
+posts by a given author. Aggregators poll them far more often than the blog
+changes, so:
+
+    - A generated feed body is cached together with its `ETag` (a hash of
+      the body) and `Last-Modified` time, so a poll costs two cache lookups
+      instead of the post queries and the XML serialization.
+    - The cache keys contain a "changed" stamp, the time posts last changed.
+      The signal receivers in `blog.signals` move it forward whenever a
+      post, its tags or its author change, which retires every cached feed at
+      once; stale feeds then expire on their own.
+    - `FeedView` (see `blog.views`) answers conditional requests carrying a
+      matching `If-None-Match` or `If-Modified-Since` header with an empty
+      304 response.
+
+Classes:
+    - `PostFeed`: The RSS 2.0 feed of posts.
+    - `AtomPostFeed`: The Atom 1.0 feed of posts.
+
+Functions:
+    - `changed_stamp`: Returns the time posts last changed.
+    - `invalidate`: Retires all cached feeds.
+    - `get_feed`: Returns a cached or freshly generated feed.
+"""
+
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import caches
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import quote_etag
+
+from .models import Author, Post, Tag
+
+CHANGED_KEY = "blog:feeds:changed"
+
+
+def _cache():
+    """
+    Returns the cache backend used for feeds.
+    """
+    return caches[getattr(settings, "BLOG_FEED_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    """
+    Returns how long generated feeds are cached, in seconds.
+    """
+    return getattr(settings, "BLOG_FEED_CACHE_TIMEOUT", 3600)
+
+
+class PostFeed(Feed):
+    """
+    The RSS 2.0 feed of the newest posts.
+
+    The feed covers all posts, or the posts of one tag or author, depending
+    on the `kind` and `key` URL arguments.
+
+    Attributes:
+        feed_type (class): The feed generator used to serialize the feed.
+        item_count (int): The number of posts in the feed.
+    """
+
+    feed_type = Rss201rev2Feed
+    item_count = 20
+
+    def get_object(self, request, *args, **kwargs):
+        """
+        Returns the tag or author the feed is about, or None for all posts.
+
+        Raises:
+            Http404: If the tag or author does not exist.
+        """
+        kind, key = kwargs.get("kind", "all"), kwargs.get("key")
+        if kind == "tag":
+            tag = Tag.objects.filter(caption=key).first()  # pylint: disable=no-member
+            if tag is None:
+                raise Http404("No such tag.")
+            return tag
+        if kind == "author":
+            return get_object_or_404(Author, pk=key)
+        return None
+
+    def title(self, obj):
+        """
+        Returns the title of the feed.
+        """
+        if isinstance(obj, Tag):
+            return f"Noel's Blog: posts tagged {obj}"
+        if isinstance(obj, Author):
+            return f"Noel's Blog: posts by {obj}"
+        return "Noel's Blog"
+
+    def description(self, obj):
+        """
+        Returns the description of the feed.
+        """
+        return f"The newest posts of {self.title(obj)}."
+
+    def link(self, obj):
+        # pylint: disable=unused-argument
+        """
+        Returns the URL of the page showing the posts of the feed.
+        """
+        return reverse("posts-page")
+
+    def items(self, obj):
+        """
+        Returns the newest posts of the feed, with their authors and tags.
+        """
+        posts = Post.objects.for_list()  # pylint: disable=no-member
+        if isinstance(obj, Tag):
+            posts = posts.filter(tag=obj)
+        elif isinstance(obj, Author):
+            posts = posts.filter(author=obj)
+        return posts.order_by("-date", "-id")[: self.item_count]
+
+    def item_title(self, item):
+        """
+        Returns the title of a post.
+        """
+        return item.title
+
+    def item_description(self, item):
+        """
+        Returns the excerpt of a post.
+        """
+        return item.excerpt
+
+    def item_link(self, item):
+        """
+        Returns the URL of a post's detail page.
+        """
+        return reverse("post-detail-page", args=[item.slug])
+
+    def item_pubdate(self, item):
+        """
+        Returns the publication date of a post as a UTC datetime.
+        """
+        return datetime.datetime.combine(
+            item.date, datetime.time.min, tzinfo=datetime.timezone.utc
+        )
+
+    def item_author_name(self, item):
+        """
+        Returns the full name of a post's author, if it has one.
+        """
+        return item.author.full_name() if item.author else None
+
+    def item_categories(self, item):
+        """
+        Returns the tag captions of a post.
+        """
+        return [tag.caption for tag in item.tag.all()]
+
+
+class AtomPostFeed(PostFeed):
+    """
+    The Atom 1.0 feed of the newest posts.
+    """
+
+    feed_type = Atom1Feed
+    subtitle = PostFeed.description
+
+
+FEEDS = {"rss": PostFeed(), "atom": AtomPostFeed()}
+
+
+def changed_stamp():
+    """
+    Returns the time posts last changed, in whole seconds since the epoch.
+
+    If the stamp is not cached (yet), the current time is recorded, so the
+    feeds are regenerated once and then served from the cache again.
+    """
+    return _cache().get_or_set(CHANGED_KEY, lambda: int(time.time()), None)
+
+
+def invalidate():
+    """
+    Retires all cached feeds by moving the changed stamp forward.
+
+    The stamp is also the `Last-Modified` time of the feeds, so it always
+    moves by at least one second; otherwise clients that only send
+    `If-Modified-Since` could miss a change made within the same second.
+    """
+    cache = _cache()
+    previous = cache.get(CHANGED_KEY)
+    stamp = int(time.time())
+    if previous is not None:
+        stamp = max(stamp, previous + 1)
+    cache.set(CHANGED_KEY, stamp, None)
+
+
+def get_feed(request, feed_format, kind="all", key=None):
+    """
+    Returns a feed from the cache, generating and caching it if needed.
+
+    Feed bodies contain absolute URLs, so they are cached per host.
+
+    Args:
+        request (HttpRequest): The HTTP request for the feed.
+        feed_format (str): "atom" or "rss".
+        kind (str): "all", "tag" or "author".
+        key (str): The caption of the tag or the ID of the author.
+
+    Returns:
+        dict: The feed's `body`, `content_type`, `etag` and `last_modified`
+        time (in seconds since the epoch).
+
+    Raises:
+        Http404: If the format is unknown or the tag or author does not
+        exist.
+    """
+    if feed_format not in FEEDS:
+        raise Http404("No such feed format.")
+    changed = changed_stamp()
+    name = f"{feed_format}:{kind}:{key}:{request.get_host()}"
+    cache_key = f"blog:feed:{changed}:{hashlib.md5(name.encode()).hexdigest()}"
+
+    cache = _cache()
+    entry = cache.get(cache_key)
+    if entry is None:
+        response = FEEDS[feed_format](request, kind=kind, key=key)
+        entry = {
+            "body": response.content,
+            "content_type": response["Content-Type"],
+            "etag": quote_etag(hashlib.sha1(response.content).hexdigest()),
+            "last_modified": changed,
+        }
+        cache.set(cache_key, entry, _timeout())
+    return entry
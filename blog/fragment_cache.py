@@ -0,0 +1,115 @@
+"""
+This module implements the fragment cache for post cards.
+
+Every listing (the starting page, the list of all posts and the search
+results) renders `blog/includes/post.html` once per post, which reverses the
+post's URL, resolves its image URLs and renders the template. The rendered
+cards are therefore cached, keyed by the post's ID and `version`. The
+version is bumped whenever the post is saved or its renditions are rebuilt
+(see `blog.signals` and `blog.renditions`), so a changed post is simply
+looked up under a new key and stale cards expire on their own.
+
+A listing fetches all of its cards with a single `get_many` call. Only the
+posts whose cards are missing get their renditions loaded, their image URLs
+resolved and their cards rendered, and the new cards are stored with a
+single `set_many` call. Their renditions are read from the primary database
+(see `my_site.db_router.primary_reads`), since a lagging replica could pair
+a post's new version with its old renditions in the shared cache.
+
+Functions:
+    - `card_key`: Returns the cache key of a post's card.
+    - `render_cards`: Returns the rendered cards of a list of posts.
+    - `arender_cards`: Asynchronous version of `render_cards`.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from my_site.db_router import primary_reads
+
+from .media import resolve_image_urls
+
+CARD_TEMPLATE = "blog/includes/post.html"
+
+
+def _cache():
+    """
+    Returns the cache backend used for post cards.
+    """
+    return caches[getattr(settings, "BLOG_CARD_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    """
+    Returns how long post cards are cached, in seconds.
+
+    Cards contain image URLs, so they are never cached for longer than the
+    media storage allows its (possibly signed) URLs to be cached.
+    """
+    timeout = getattr(settings, "BLOG_CARD_CACHE_TIMEOUT", 600)
+    if hasattr(default_storage, "url_ttl"):
+        timeout = min(timeout, default_storage.url_ttl())
+    return timeout
+
+
+def card_key(post):
+    """
+    Returns the cache key for the card of `post` at its current version.
+    """
+    return f"blog:post-card:{post.pk}:{post.version}"
+
+
+def _render_missing(posts):
+    """
+    Renders the cards of `posts` and returns them keyed by cache key.
+    """
+    with primary_reads():
+        prefetch_related_objects(posts, "renditions")
+        resolve_image_urls(posts)
+        return {
+            card_key(post): render_to_string(CARD_TEMPLATE, {"post": post})
+            for post in posts
+        }
+
+
+def render_cards(posts):
+    """
+    Returns the rendered cards of `posts`, from the cache when possible.
+
+    Args:
+        posts (iterable): The posts to render, in display order.
+
+    Returns:
+        list: The HTML of each card, marked safe, in the order of `posts`.
+    """
+    posts = list(posts)
+    cache = _cache()
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in cached]
+    if missing:
+        rendered = _render_missing(missing)
+        cache.set_many(rendered, _timeout())
+        cached.update(rendered)
+    return [mark_safe(cached[key]) for key in keys]
+
+
+async def arender_cards(posts):
+    """
+    Asynchronous version of `render_cards()`.
+    """
+    posts = list(posts)
+    cache = _cache()
+    keys = [card_key(post) for post in posts]
+    cached = await cache.aget_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in cached]
+    if missing:
+        rendered = await sync_to_async(_render_missing)(missing)
+        await cache.aset_many(rendered, _timeout())
+        cached.update(rendered)
+    return [mark_safe(cached[key]) for key in keys]
@@ -0,0 +1,73 @@
+"""
+This module defines the `benchmark` management command.
+
+The command runs the scenario benchmarks of `blog.benchmark` against the
+configured database and prints the results as JSON, or writes them to a
+file with `--output`, so that runs can be compared. Seed the database with
+`seed_blog` first, and point the command at a copy of the database: the
+`post-comment` scenario adds comments.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import benchmark
+
+
+class Command(BaseCommand):
+    """
+    Management command that benchmarks the blog pages.
+    """
+
+    help = "Benchmarks the blog pages and reports latency, queries and memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=benchmark.SCENARIOS,
+            dest="scenarios",
+            help="A scenario to run; repeat for several (defaults to all).",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=100,
+            help="The number of measured requests per scenario.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=10,
+            help="The number of unmeasured warm-up requests per scenario.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="The seed choosing the posts."
+        )
+        parser.add_argument("--host", default=None, help="The Host header to send.")
+        parser.add_argument(
+            "--output", default=None, help="Write the JSON results to this file."
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        try:
+            results = benchmark.run_benchmarks(
+                scenarios=options["scenarios"] or benchmark.SCENARIOS,
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                seed=options["seed"],
+                host=options["host"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        report = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(report + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,49 @@
+"""
+This module defines the `build_renditions` management command.
+
+The command builds the responsive image renditions of post images in a pool
+of worker processes. By default only posts whose renditions are missing or
+were built from a different image are processed; `--all` rebuilds every
+post, for example after changing `BLOG_RENDITION_WIDTHS`.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from blog import renditions
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Management command that builds post image renditions in parallel.
+    """
+
+    help = "Builds resized WebP/JPEG renditions of post images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild the renditions of every post, not only stale ones.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="The number of worker processes (defaults to the CPU count).",
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").exclude(  # pylint: disable=no-member
+            image__isnull=True
+        )
+        if not options["all"]:
+            posts = posts.exclude(renditions__source=F("image"))
+
+        built, failed = renditions.build_many(
+            posts.iterator(chunk_size=500), max_workers=options["workers"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Built renditions for {built} posts ({failed} failed).")
+        )
@@ -0,0 +1,72 @@
+"""
+This module defines the `export_blog` management command.
+
+The command writes all authors, tags, posts and comments as NDJSON or CSV,
+optionally gzip-compressed, to a file or standard output. Tables are read
+in chunks (see `blog.dump.export_records`), so memory use stays flat no
+matter how large the blog is, unlike `dumpdata`. The output can be loaded
+again with `import_blog`.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from blog import dump
+
+
+class Command(BaseCommand):
+    """
+    Management command that exports blog content as a stream.
+    """
+
+    help = "Exports authors, tags, posts and comments as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?", default="-", help="The output file, or - for stdout."
+        )
+        parser.add_argument(
+            "--format",
+            choices=("ndjson", "csv"),
+            default=None,
+            help="The output format (defaults to the file extension).",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress the output (implied by a .gz file name).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="The number of rows fetched from the database at a time.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database alias to export from.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        compress = options["gzip"] or path.endswith(".gz")
+        name = path[:-3] if path.endswith(".gz") else path
+        fmt = options["format"] or ("csv" if name.endswith(".csv") else "ndjson")
+
+        records = dump.export_records(
+            chunk_size=options["chunk_size"], using=options["database"]
+        )
+        chunks = dump.encode_records(records, fmt, compress=compress)
+        if path == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(path, "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported the blog to {path}."))
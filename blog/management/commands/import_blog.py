@@ -0,0 +1,122 @@
+"""
+This module defines the `import_blog` management command.
+
+The command streams authors, tags, posts and comments from an NDJSON or CSV
+file (optionally gzip-compressed, or `-` for standard input) into the
+database in constant memory, using `blog.dump.Importer`.
+
+After each committed batch the line reached is saved to a checkpoint file
+next to the input (`<file>.progress`), and running the command again on the
+same file continues after that line. An interrupted import is therefore
+resumed by simply running it again, and importing a finished file again
+does nothing, so no comment is imported twice; `--restart` ignores the
+checkpoint. Authors, tags and posts that already exist are skipped in any
+case.
+
+`bulk_create` bypasses the signal receivers, so the search index and the
+tag post counts are rebuilt and the cached feeds, sitemaps and pages of
+commented posts are dropped at the end. Run `build_renditions` afterwards for
+the post images.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from blog import dump, feeds, object_cache, page_cache, search, sitemaps, tagging
+
+
+class Command(BaseCommand):
+    """
+    Management command that imports blog content in batches.
+    """
+
+    help = "Imports authors, tags, posts and comments from NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The input file, or - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=("ndjson", "csv"),
+            default=None,
+            help="The input format (defaults to the file extension).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="The number of records written per transaction.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of an earlier run of this file.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database alias to import into.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or self.detect_format(path)
+        checkpoint = None if path == "-" else f"{path}.progress"
+
+        start_after = 0
+        if checkpoint and not options["restart"] and os.path.exists(checkpoint):
+            with open(checkpoint, encoding="utf-8") as progress:
+                start_after = json.load(progress)["line"]
+            self.stdout.write(f"Continuing after line {start_after}.")
+
+        def save_checkpoint(line):
+            if checkpoint is not None:
+                with open(checkpoint, "w", encoding="utf-8") as progress:
+                    json.dump({"line": line}, progress)
+
+        importer = dump.Importer(
+            batch_size=options["batch_size"],
+            using=options["database"],
+            on_batch=save_checkpoint,
+        )
+        with self.open_input(path) as stream:
+            try:
+                stats = importer.run(dump.read_records(stream, fmt), start_after)
+            except dump.InvalidRecord as exc:
+                raise CommandError(f"{exc} Fix the input and run again.") from exc
+
+        with transaction.atomic(using=options["database"]):
+            search.get_backend(options["database"]).rebuild()
+            tagging.recount(using=options["database"])
+        page_cache.invalidate(*importer.commented_slugs)
+        feeds.invalidate()
+        sitemaps.invalidate_all()
+        object_cache.invalidate()
+
+        summary = ", ".join(f"{name}: {count}" for name, count in sorted(stats.items()))
+        self.stdout.write(self.style.SUCCESS(f"Imported ({summary or 'nothing'})."))
+
+    @staticmethod
+    def detect_format(path):
+        """
+        Returns the format implied by the extension of `path`.
+        """
+        name = path[:-3] if path.endswith(".gz") else path
+        return "csv" if name.endswith(".csv") else "ndjson"
+
+    @staticmethod
+    def open_input(path):
+        """
+        Opens the input as a text stream, decompressing `.gz` files.
+        """
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8", newline="")
+        # pylint: disable-next=consider-using-with
+        return open(path, encoding="utf-8", newline="")
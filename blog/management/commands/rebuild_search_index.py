@@ -0,0 +1,39 @@
+"""
+This module defines the `rebuild_search_index` management command.
+
+The command rebuilds the full-text search index of the blog posts from the
+post table. It is needed after posts were written without going through
+`Post.save()` (for example with `bulk_create` or raw SQL), which bypasses the
+signal receivers that keep the index current.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from blog import search
+
+
+class Command(BaseCommand):
+    """
+    Management command that rebuilds the post search index.
+    """
+
+    help = "Rebuilds the full-text search index of the blog posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database alias whose index is rebuilt.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        backend = search.get_backend(using)
+        with transaction.atomic(using=using):
+            backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt the search index with {type(backend).__name__}."
+            )
+        )
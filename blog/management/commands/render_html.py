@@ -0,0 +1,82 @@
+"""
+This module defines the `render_html` management command.
+
+Posts and comments store their text rendered as HTML (`Post.content_html`
+and `Comment.comment_html`), which is filled in whenever they are saved.
+The command backfills the HTML of existing rows, walking each table in
+batches by ID and writing every batch with one `bulk_update`. By default
+only rows without HTML are rendered (pages render their text on the fly
+until then); `--all` renders every row again, for
+example after changing `blog.models.render_text`.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from blog.models import Comment, Post
+
+
+class Command(BaseCommand):
+    """
+    Management command that backfills the rendered HTML of posts and comments.
+    """
+
+    help = "Renders the stored HTML of posts and comments in batches."
+
+    # The text and HTML fields of each model.
+    FIELDS = (
+        (Post, "content", "content_html"),
+        (Comment, "comment_text", "comment_html"),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render every row again, not only rows without HTML.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of rows rendered and updated per batch.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to render the rows of.",
+        )
+
+    def handle(self, *args, **options):
+        for model, text_field, html_field in self.FIELDS:
+            rows = model.objects.using(options["database"]).only(
+                "id", text_field, html_field
+            )
+            if not options["all"]:
+                rows = rows.filter(**{html_field: ""})
+            count = self.render(rows, html_field, options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rendered {count} {model._meta.verbose_name_plural}."
+                )
+            )
+
+    @staticmethod
+    def render(rows, html_field, batch_size):
+        """
+        Renders the HTML of `rows` batch by batch and returns their number.
+
+        Each batch continues after the last ID of the previous one, so every
+        query is an index range scan however far the backfill has got.
+        """
+        count, last_id = 0, 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not batch:
+                return count
+            for row in batch:
+                row.render_html()
+            with transaction.atomic(using=rows.db):
+                rows.model.objects.using(rows.db).bulk_update(batch, [html_field])
+            count += len(batch)
+            last_id = batch[-1].id
@@ -0,0 +1,77 @@
+"""
+This module defines the `seed_blog` management command.
+
+The command fills the database with reproducible synthetic blog data for
+benchmarks (see `blog.benchmark`), from a thousand to millions of rows, and
+rebuilds the search index afterwards. `--clear` removes previously
+generated data first.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from blog import benchmark, search
+
+
+class Command(BaseCommand):
+    """
+    Management command that generates synthetic blog data.
+    """
+
+    help = "Generates reproducible authors, tags, posts and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts", type=int, default=1000, help="The number of posts."
+        )
+        parser.add_argument(
+            "--authors",
+            type=int,
+            default=None,
+            help="The number of authors (defaults to one per 100 posts).",
+        )
+        parser.add_argument(
+            "--tags",
+            type=int,
+            default=None,
+            help="The number of tags (defaults to one per 20 posts).",
+        )
+        parser.add_argument(
+            "--comments-per-post",
+            type=int,
+            default=3,
+            help="The average number of comments per post.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="The seed of the generator."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of posts written per transaction.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Remove previously generated data first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted = benchmark.clear_data()
+            self.stdout.write(f"Removed {deleted} generated rows.")
+
+        counts = benchmark.seed_data(
+            posts=options["posts"],
+            authors=options["authors"],
+            tags=options["tags"],
+            comments_per_post=options["comments_per_post"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        with transaction.atomic():
+            search.get_backend(DEFAULT_DB_ALIAS).rebuild()
+
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}."))
@@ -0,0 +1,84 @@
+"""
+This module defines the `serve` management command.
+
+The command runs the site in production under Gunicorn's pre-fork worker
+model (see `my_site.server`): the application is loaded and warmed up once,
+then forked into one worker per CPU share of the container, so throughput
+scales across cores. Unlike `runserver` it neither reloads code nor serves
+static files.
+"""
+
+from django.core.management.base import BaseCommand
+
+from my_site.server import Server
+
+
+class Command(BaseCommand):
+    """
+    Management command that runs the site with pre-forked workers.
+    """
+
+    help = "Runs the site under Gunicorn with preloaded, pre-forked workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bind",
+            action="append",
+            help="The address to listen on, e.g. 0.0.0.0:8000 (repeatable).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="The number of worker processes (default: from the CPUs).",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            help="The number of threads per synchronous worker.",
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Serve the ASGI application with Uvicorn workers.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=30,
+            help="Seconds after which a silent worker is killed and replaced.",
+        )
+        parser.add_argument(
+            "--graceful-timeout",
+            type=int,
+            default=30,
+            help="Seconds workers get to finish their requests on restart.",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=0,
+            help="Replace each worker after about this many requests (0: never).",
+        )
+        parser.add_argument("--pidfile", help="The file to write the master PID to.")
+        parser.add_argument(
+            "--no-warm",
+            action="store_true",
+            help="Do not warm up the application before forking.",
+        )
+
+    def handle(self, *args, **options):
+        max_requests = options["max_requests"]
+        Server(
+            {
+                "bind": options["bind"] or ["0.0.0.0:8000"],
+                "workers": options["workers"],
+                "threads": options["threads"],
+                "timeout": options["timeout"],
+                "graceful_timeout": options["graceful_timeout"],
+                "max_requests": max_requests,
+                "max_requests_jitter": max_requests // 10,
+                "pidfile": options["pidfile"],
+            },
+            asgi=options["asgi"],
+            warm=not options["no_warm"],
+        ).run()
@@ -0,0 +1,75 @@
+"""
+This module resolves the URLs of post images in batches.
+
+Listing pages show the image of every post, and every image has several
+renditions. Asking each file for its `.url` inside the template loop calls
+into the media storage once per file. `resolve_image_urls` instead collects
+all file names of a page of posts and resolves them with one `urls()` call
+per storage (see `custom_storages.CachedURLMixin`), attaching the results to
+the posts for the templates to use.
+
+Functions:
+    - `resolve_image_urls`: Attaches the image URLs of many posts at once.
+    - `file_url`: Returns the URL of a post's file, using resolved URLs when
+      available.
+"""
+
+
+def _post_files(post):
+    """
+    Returns the image files (original and renditions) of `post`.
+    """
+    files = [post.image] if post.image else []
+    files.extend(rendition.image for rendition in post.renditions.all())
+    return files
+
+
+def resolve_image_urls(posts):
+    """
+    Resolves the URLs of the images and renditions of `posts` in one batch.
+
+    Each post gets an `image_urls` dict mapping file names to URLs. Storages
+    without a batch `urls()` method are asked for each URL individually.
+    Prefetch the `renditions` of the posts to keep this free of queries.
+
+    Args:
+        posts (iterable): The posts whose image URLs are resolved.
+
+    Returns:
+        list: The posts, in their original order.
+    """
+    posts = list(posts)
+    files_by_post = [_post_files(post) for post in posts]
+    storages = {}
+    names_by_storage = {}
+    for files in files_by_post:
+        for file in files:
+            storages[id(file.storage)] = file.storage
+            names_by_storage.setdefault(id(file.storage), set()).add(file.name)
+
+    urls = {}
+    for key, names in names_by_storage.items():
+        storage = storages[key]
+        if hasattr(storage, "urls"):
+            urls[key] = storage.urls(names)
+        else:
+            urls[key] = {name: storage.url(name) for name in names}
+
+    for post, files in zip(posts, files_by_post):
+        post.image_urls = {
+            file.name: urls[id(file.storage)][file.name] for file in files
+        }
+    return posts
+
+
+def file_url(post, file):
+    """
+    Returns the URL of `file` belonging to `post`.
+
+    Uses the URLs attached by `resolve_image_urls` when present and falls
+    back to asking the storage.
+    """
+    resolved = getattr(post, "image_urls", None)
+    if resolved is not None and file.name in resolved:
+        return resolved[file.name]
+    return file.url
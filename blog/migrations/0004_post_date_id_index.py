@@ -0,0 +1,38 @@
+"""
+This module contains a migration for the `blog` app.
+
+Key modifications made in this migration:
+- **Tag Model**:
+  1. Recorded the empty-string default on the `caption` field.
+- **Post Model**:
+  1. Added the composite `(date, id)` index used by keyset pagination of the
+     post listings.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that indexes `Post` for newest-first keyset pagination.
+
+    The descending `(date, id)` index lets the database answer "the next page
+    of posts after this cursor" with a single range scan instead of an
+    `OFFSET` walk over every earlier row.
+    """
+
+    dependencies = [
+        ("blog", "0003_comment"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tag",
+            name="caption",
+            field=models.CharField(default="", max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["-date", "-id"], name="blog_post_date_id_idx"),
+        ),
+    ]
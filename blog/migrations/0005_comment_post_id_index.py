@@ -0,0 +1,30 @@
+"""
+This module contains a migration for the `blog` app.
+
+Key modifications made in this migration:
+- **Comment Model**:
+  1. Added the composite `(post, id)` index used to page through the comments
+     of a post.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that indexes `Comment` for cursor-based comment pages.
+
+    The index lets the newest comments of a post, and each following page of
+    older ones, be read with a single range scan.
+    """
+
+    dependencies = [
+        ("blog", "0004_post_date_id_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["post", "-id"], name="blog_comment_post_id_idx"),
+        ),
+    ]
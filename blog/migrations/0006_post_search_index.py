@@ -0,0 +1,69 @@
+"""
+This module contains a migration for the `blog` app.
+
+Key modifications made in this migration:
+- **Post Model**:
+  1. On SQLite, created the `blog_post_fts` FTS5 table holding the title,
+     excerpt and content of each post, and filled it from existing posts.
+  2. On PostgreSQL, created a GIN index over a weighted `tsvector` of the
+     title, excerpt and content.
+  Other databases are left unchanged and use the `icontains` fallback.
+"""
+
+from django.db import migrations
+
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english'::regconfig, title), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, excerpt), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, content), 'D')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    # pylint: disable=unused-argument
+    """
+    Creates the full-text index for the database vendor in use.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE blog_post_fts USING fts5(title, excerpt, content)"
+        )
+        schema_editor.execute(
+            "INSERT INTO blog_post_fts (rowid, title, excerpt, content) "
+            "SELECT id, title, excerpt, content FROM blog_post"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX blog_post_search_idx ON blog_post "
+            f"USING GIN (({PG_SEARCH_VECTOR}))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    # pylint: disable=unused-argument
+    """
+    Drops the full-text index created by `create_search_index`.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS blog_post_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS blog_post_search_idx")
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that adds the full-text search index for `Post`.
+
+    The index structure depends on the database vendor, so it is created
+    with `RunPython` rather than with model-level index declarations.
+    """
+
+    dependencies = [
+        ("blog", "0005_comment_post_id_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,74 @@
+"""
+This module defines the migration for adding the `Rendition` model to the
+`blog` app.
+
+Key additions:
+- Introduced the `Rendition` model with the following fields:
+  - `post`: A foreign key linking the rendition to the `Post` whose image it
+     was resized from.
+  - `source`: The name of the original image the rendition was built from.
+  - `format`: The image format of the rendition (WebP or JPEG).
+  - `width` and `height`: The pixel dimensions of the rendition.
+  - `image`: The stored rendition file.
+- Added a unique constraint on `(post, format, width)`.
+"""
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that adds the `Rendition` model to the `blog` app.
+
+    Renditions are deleted together with their post (`CASCADE`).
+    """
+
+    dependencies = [
+        ("blog", "0006_post_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Rendition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=255)),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("webp", "WebP"), ("jpeg", "JPEG")], max_length=4
+                    ),
+                ),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                ("image", models.ImageField(max_length=255, upload_to="renditions")),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="renditions",
+                        to="blog.post",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["width"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="rendition",
+            constraint=models.UniqueConstraint(
+                fields=("post", "format", "width"),
+                name="blog_rendition_post_format_width_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+"""
+This module defines the migration for adding the `version` field to the
+`Post` model of the `blog` app.
+
+Key additions:
+- Added the `version` field to the `Post` model:
+  - A positive integer, starting at 1 and bumped on every save, that names
+    the post's cached listing card.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that adds the `version` field to the `Post` model.
+
+    Existing posts start at version 1.
+    """
+
+    dependencies = [
+        ("blog", "0007_rendition"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
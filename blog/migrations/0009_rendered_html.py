@@ -0,0 +1,41 @@
+"""
+This module defines the migration for storing the rendered HTML of posts
+and comments in the `blog` app.
+
+Key additions:
+- Added the `content_html` field to the `Post` model:
+  - The post's `content` rendered as HTML paragraphs when it is saved.
+- Added the `comment_html` field to the `Comment` model:
+  - The comment's `comment_text` rendered as HTML paragraphs when it is
+    saved.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that adds the rendered HTML fields to the `Post` and
+    `Comment` models.
+
+    Existing rows start without HTML; the `render_html` management command
+    backfills them in batches, and until then pages render the text on the
+    fly.
+    """
+
+    dependencies = [
+        ("blog", "0008_post_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="comment_html",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="content_html",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+"""
+This module defines the migration that merges tags sharing a caption in the
+`blog` app, ahead of making `Tag.caption` unique.
+
+Key changes:
+- For every caption used by several tags, the tag with the lowest ID is
+  kept:
+  - Posts of the other tags are moved to the kept tag (unless they already
+    have it).
+  - The other tags are deleted.
+"""
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    # pylint: disable=unused-argument
+    """
+    Merges the tags of each duplicated caption into the oldest one.
+    """
+    Tag = apps.get_model("blog", "Tag")
+    Post = apps.get_model("blog", "Post")
+    through = Post.tag.through
+
+    duplicated = (
+        Tag.objects.values("caption")
+        .annotate(count=Count("id"), kept_id=Min("id"))
+        .filter(count__gt=1)
+    )
+    for row in duplicated:
+        kept_id = row["kept_id"]
+        others = Tag.objects.filter(caption=row["caption"]).exclude(pk=kept_id)
+        # One tag at a time, as a post may have several of the duplicates.
+        for other_id in others.values_list("pk", flat=True):
+            tagged = through.objects.filter(tag_id=kept_id).values("post_id")
+            through.objects.filter(tag_id=other_id, post_id__in=tagged).delete()
+            through.objects.filter(tag_id=other_id).update(tag_id=kept_id)
+        others.delete()
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that merges tags with the same caption.
+
+    It runs in its own migration (and transaction) because PostgreSQL does
+    not alter a table in the transaction that modified rows referencing it.
+    Merged tags cannot be split again, so reversing it changes nothing.
+    """
+
+    dependencies = [
+        ("blog", "0009_rendered_html"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+"""
+This module defines the migration for unique tag captions and tag post
+counts in the `blog` app.
+
+Key additions:
+- Made the `caption` field of the `Tag` model unique:
+  - The unique index also serves the lookup of tag pages by caption.
+- Added the `post_count` field to the `Tag` model:
+  - The number of posts using the tag, counted once here and then kept up
+    to date on every change of the post/tag relation.
+"""
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_tag_posts(apps, schema_editor):
+    # pylint: disable=unused-argument
+    """
+    Sets the post count of every tag.
+    """
+    Tag = apps.get_model("blog", "Tag")
+    through = apps.get_model("blog", "Post").tag.through
+    post_count = Subquery(
+        through.objects.filter(tag_id=OuterRef("pk"))
+        .order_by()
+        .values("tag_id")
+        .annotate(count=Count("*"))
+        .values("count"),
+        output_field=IntegerField(),
+    )
+    Tag.objects.update(post_count=Coalesce(post_count, 0))
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that makes tag captions unique and adds the `post_count`
+    field to the `Tag` model.
+
+    Duplicate captions were merged by the previous migration. The counts of
+    existing tags are computed after the field is added.
+    """
+
+    dependencies = [
+        ("blog", "0010_merge_duplicate_tags"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="post_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="tag",
+            name="caption",
+            field=models.CharField(default="", max_length=20, unique=True),
+        ),
+        migrations.RunPython(count_tag_posts, migrations.RunPython.noop),
+    ]
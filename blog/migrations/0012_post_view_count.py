@@ -0,0 +1,40 @@
+"""
+This module defines the migration for adding the `view_count` field to the
+`Post` model of the `blog` app.
+
+Key additions:
+- Added the `view_count` field to the `Post` model:
+  - A positive counter of the views of the post's detail page, updated in
+    batches by `blog.view_counts`.
+- Added the `blog_post_views_idx` index on `(view_count DESC, id DESC)`:
+  - Serves the "most read" listing of the starting page.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    A migration that adds the `view_count` field to the `Post` model and
+    the index the most read posts are listed from.
+
+    Existing posts start with no views.
+    """
+
+    dependencies = [
+        ("blog", "0011_tag_caption_unique_post_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="view_count",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["-view_count", "-id"], name="blog_post_views_idx"
+            ),
+        ),
+    ]
@@ -11,11 +11,29 @@ Models:
       title, and author.
     - `Comment`: Stores user comments on posts, including user details and
       comment text.
+    - `Rendition`: Records a resized variant of a post's image.
+
+Querysets:
+    - `PostQuerySet`: Adds the column projections used by post listings.
+
+Functions:
+    - `render_text`: Renders plain text as HTML paragraphs.
 """
 
 from django.db import models
 from django.urls import reverse
 from django.core.validators import MinLengthValidator
+from django.utils.html import linebreaks
+
+
+def render_text(text):
+    """
+    Renders plain text as HTML paragraphs, like the `linebreaks` filter.
+
+    The text is escaped, blank lines separate paragraphs and single line
+    breaks become `<br>` tags.
+    """
+    return linebreaks(text, autoescape=True)
 
 
 class Author(models.Model):
@@ -49,11 +67,15 @@ class Tag(models.Model):
     """
     Model representing a tag used to categorize blog posts.
 
-    The Tag model contains a single field for the caption of the tag and
-    provides a method to represent the tag as a string.
+    The Tag model contains the caption of the tag and provides a method to
+    represent the tag as a string. Captions are unique, which also indexes
+    the lookup of tag pages by caption. `post_count` is the number of posts
+    using the tag, kept up to date by `blog.tagging` so that it need not be
+    counted on each request.
     """
 
-    caption = models.CharField(max_length=20, default='')
+    caption = models.CharField(max_length=20, default='', unique=True)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         """
@@ -62,6 +84,56 @@ class Tag(models.Model):
         return str(self.caption)
 
 
+class PostQuerySet(models.QuerySet):
+    """
+    QuerySet for posts, with the projections used by listings.
+
+    Listings never show a post's `content`, which is unbounded, or its
+    rendered `content_html`, so they load only the columns they display and
+    keep their rows narrow.
+
+    Attributes:
+        CARD_FIELDS (tuple): The columns of a post card: the fields shown,
+        the sort key of the post listings and the card's cache version.
+        LIST_FIELDS (tuple): The columns of a post summary with its author.
+
+    Methods:
+        for_cards: Loads the fields of post cards.
+        for_list: Loads the fields of post summaries, with the author and
+        tags.
+    """
+
+    CARD_FIELDS = ("id", "title", "slug", "excerpt", "image", "date", "version")
+    LIST_FIELDS = (
+        "id",
+        "title",
+        "slug",
+        "excerpt",
+        "date",
+        "author__first_name",
+        "author__last_name",
+    )
+
+    def for_cards(self):
+        """
+        Returns the posts with only the columns rendered on post cards.
+        """
+        return self.only(*self.CARD_FIELDS)
+
+    def for_list(self):
+        """
+        Returns the posts with only the columns of a summary, their author
+        (in the same query) and their tags (in one further query).
+        """
+        return (
+            self.select_related("author")
+            .only(*self.LIST_FIELDS)
+            .prefetch_related(
+                models.Prefetch("tag", queryset=Tag.objects.only("id", "caption"))
+            )
+        )
+
+
 class Post(models.Model):
     """
     Model representing a blog post.
@@ -70,6 +142,16 @@ class Post(models.Model):
     content, and tags. It defines relationships to the `Tag` model
     (many-to-many) and the `Author` model (foreign key). Additionally,
     a method for generating the absolute URL for a post is provided.
+
+    A composite index on `(date, id)` backs the newest-first keyset
+    pagination used by the post listings. The `version` field is bumped on
+    every save and names the post's cached listing card (see
+    `blog.fragment_cache`). `content_html` holds `content` rendered as HTML
+    by `render_html()` when the post is saved, so pages need not render it
+    on every request. Listings load posts through the projections of
+    `PostQuerySet`. `view_count` counts the views of the detail page; views
+    are buffered and added in batches (see `blog.view_counts`), and an
+    index on `(view_count, id)` backs the "most read" listing.
     """
 
     title = models.CharField(max_length=255)
@@ -82,12 +164,38 @@ class Post(models.Model):
     author = models.ForeignKey(
         Author, on_delete=models.SET_NULL, null=True, related_name="posts"
     )
+    version = models.PositiveIntegerField(default=1, editable=False)
+    content_html = models.TextField(blank=True, default="", editable=False)
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        """
+        Metadata for the Post model.
+
+        Declares the composite `(date, id)` index that keyset pagination
+        walks in descending order, and the `(view_count, id)` index the
+        "most read" listing is read from.
+        """
+
+        indexes = [
+            models.Index(fields=["-date", "-id"], name="blog_post_date_id_idx"),
+            models.Index(fields=["-view_count", "-id"], name="blog_post_views_idx"),
+        ]
 
     def get_absolute_url(self):
         """
         Returns the URL for the detailed view of the post.
         """
-        return reverse("post-detail", args=[self.slug])
+        return reverse("post-detail-page", args=[self.slug])
+
+    def render_html(self):
+        """
+        Renders `content` into `content_html`.
+        """
+        self.content_html = render_text(self.content)
 
     def __str__(self):
         """
@@ -103,9 +211,77 @@ class Comment(models.Model):
     The Comment model includes the user's name, email, the text of their
     comment, and a relationship to the `Post` model to associate the comment
     with a specific blog post.
+
+    A composite index on `(post, id)` serves the newest-first, cursor-based
+    comment pages of a post. `comment_html` holds `comment_text` rendered as
+    HTML by `render_html()` when the comment is saved.
     """
 
     user_name = models.CharField(max_length=100)
     user_email = models.EmailField()
     comment_text = models.TextField(max_length=500)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    comment_html = models.TextField(blank=True, default="", editable=False)
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        """
+        Metadata for the Comment model.
+
+        Declares the composite `(post, id)` index used to page through the
+        comments of a single post.
+        """
+
+        indexes = [
+            models.Index(fields=["post", "-id"], name="blog_comment_post_id_idx"),
+        ]
+
+    def render_html(self):
+        """
+        Renders `comment_text` into `comment_html`.
+        """
+        self.comment_html = render_text(self.comment_text)
+
+
+class Rendition(models.Model):
+    """
+    Model representing a resized variant of a post's image.
+
+    Renditions are generated from `Post.image` by `blog.renditions` in several
+    widths and formats so that templates can offer browsers a `srcset` to
+    pick the smallest file that fits. The `source` field records the name of
+    the original image a rendition was built from, so renditions of a
+    replaced image can be recognised as stale.
+    """
+
+    FORMAT_CHOICES = [("webp", "WebP"), ("jpeg", "JPEG")]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="renditions")
+    source = models.CharField(max_length=255)
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    image = models.ImageField(upload_to="renditions", max_length=255)
+
+    class Meta:
+        # pylint: disable=too-few-public-methods
+        """
+        Metadata for the Rendition model.
+
+        Orders renditions by width and allows a single rendition per post,
+        format and width.
+        """
+
+        ordering = ["width"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "format", "width"],
+                name="blog_rendition_post_format_width_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Returns a description of the rendition as its string representation.
+        """
+        return f"{self.post_id} {self.format} {self.width}w"
@@ -0,0 +1,434 @@
+"""
+This module implements a two-tier cache for frequently read blog objects.
+
+The starting page's newest posts, posts looked up by slug, the tags of a
+post and the tag cloud are read on almost every request but change rarely.
+They are cached in two tiers:
+
+    - A bounded, per-process LRU (`LocalLRU`) answers most lookups from
+      memory, without a network round trip.
+    - The shared cache backend (the `BLOG_OBJECT_CACHE_ALIAS` cache) fills
+      the local tiers of all worker processes, so each object is loaded from
+      the database once per change rather than once per process.
+
+Objects are always loaded from the primary database (see
+`my_site.db_router.primary_reads`): a read replica lagging behind a change
+would put the old object into both tiers under the new version, and every
+worker would serve it until it expired.
+
+Cached objects belong to a group (`posts` or `tags`), whose version is part
+of every cache key. The signal receivers in `blog.signals` invalidate a
+group whenever its models change by storing a new version in the shared
+cache; the old entries are then never looked up again and age out of both
+tiers. The changing process sees the new version at once, the others when
+they next read the versions from the shared cache, at most every
+`BLOG_OBJECT_CACHE_SYNC_INTERVAL` seconds, which bounds how long another
+worker may serve a stale object. Lookups whose result goes into another
+shared cache entry, such as a rendered post detail page, pass `sync=True`
+to read the current version first, so a stale object is never copied into
+an entry that outlives that interval.
+
+Every lookup is counted by group and by the tier that answered it
+(`local`, `shared` or `miss`) in the `blog_object_cache_lookups_total`
+metric of `my_site.metrics`; `stats` returns the resulting hit rates.
+
+Classes:
+    - `LocalLRU`: A bounded, thread-safe, expiring in-process cache.
+
+Functions:
+    - `get_or_load`: Returns a cached object, loading it on a miss.
+    - `aget_or_load`: Asynchronous version of `get_or_load`.
+    - `invalidate`: Retires the cached objects of one or more groups.
+    - `stats`: Returns the lookup counts and hit rates of each group.
+    - `latest_posts`: Returns the newest posts, with their card columns.
+    - `alatest_posts`: Asynchronous version of `latest_posts`.
+    - `get_post`: Returns the post with a slug, with its author and
+      renditions.
+    - `aget_post`: Asynchronous version of `get_post`.
+    - `most_read`: Returns the most viewed posts, with their card columns.
+    - `amost_read`: Asynchronous version of `most_read`.
+    - `post_tags`: Returns the tags of a post.
+    - `tag_cloud`: Returns the weighted tags of the tag cloud.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from my_site.db_router import primary_reads
+from my_site.metrics import REGISTRY, Counter
+
+from . import tagging
+from .models import Post, Tag
+
+GROUPS = ("posts", "tags")
+
+LOOKUPS = REGISTRY.register(
+    Counter(
+        "blog_object_cache_lookups_total",
+        "Object cache lookups by group and the tier that answered them.",
+        ("group", "tier"),
+    )
+)
+
+
+def _cache():
+    """
+    Returns the shared cache backend used for blog objects.
+    """
+    return caches[getattr(settings, "BLOG_OBJECT_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    """
+    Returns how long objects are cached, in seconds.
+    """
+    return getattr(settings, "BLOG_OBJECT_CACHE_TIMEOUT", 300)
+
+
+def _sync_interval():
+    """
+    Returns how often the group versions are read from the shared cache, in
+    seconds.
+    """
+    return getattr(settings, "BLOG_OBJECT_CACHE_SYNC_INTERVAL", 1.0)
+
+
+class LocalLRU:
+    """
+    A bounded, thread-safe, expiring in-process cache.
+
+    Values are stored pickled, like in Django's local-memory cache, so
+    callers never share (and mutate) the same model instances.
+
+    Attributes:
+        max_entries (int): The number of entries kept; the least recently
+        used entry is evicted beyond it.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value stored under `key`, or None if it is missing or
+        expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def set(self, key, value, timeout):
+        """
+        Stores `value` under `key` for `timeout` seconds.
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_local = LocalLRU(getattr(settings, "BLOG_OBJECT_CACHE_ENTRIES", 1000))
+
+# The group versions last read from the shared cache, and when.
+_versions = {}
+_versions_read = 0.0
+_versions_lock = threading.Lock()
+
+
+def _version_key(group):
+    """
+    Returns the shared cache key of the version of `group`.
+    """
+    return f"blog:objects-version:{group}"
+
+
+def _versions_stale():
+    """
+    Returns True if the group versions are due to be read again.
+    """
+    return time.monotonic() - _versions_read >= _sync_interval()
+
+
+def _current_version(group, sync=False):
+    """
+    Returns the current version of `group`, reading the versions of all
+    groups from the shared cache when they are due or `sync` is set.
+    """
+    global _versions_read  # pylint: disable=global-statement
+    with _versions_lock:
+        if sync or _versions_stale():
+            cache = _cache()
+            keys = {_version_key(name): name for name in GROUPS}
+            stored = cache.get_many(keys)
+            for key, name in keys.items():
+                if key not in stored:
+                    # Never set (or evicted): start a new version, keeping
+                    # one another process may have started meanwhile.
+                    cache.add(key, time.time_ns(), None)
+                    stored[key] = cache.get(key)
+                _versions[name] = stored[key]
+            _versions_read = time.monotonic()
+        return _versions[group]
+
+
+def _key(group, name, sync=False):
+    """
+    Returns the cache key of the object `name` of `group`.
+    """
+    return f"blog:objects:{group}:{_current_version(group, sync)}:{name}"
+
+
+def get_or_load(group, name, loader, timeout=None, sync=False):
+    """
+    Returns a cached object, loading and caching it on a miss.
+
+    Args:
+        group (str): The invalidation group of the object, one of `GROUPS`.
+        name (str): The name of the object within its group.
+        loader (callable): Loads the object from the database, and is run
+        against the primary; a None result is returned without being
+        cached.
+        timeout (int): How long the object is cached, in seconds; defaults
+        to `BLOG_OBJECT_CACHE_TIMEOUT`.
+        sync (bool): Whether to read the group's version from the shared
+        cache first, rather than use this process' copy, which may lag by
+        up to `BLOG_OBJECT_CACHE_SYNC_INTERVAL` seconds.
+
+    Returns:
+        object: The cached or freshly loaded object.
+    """
+    key = _key(group, name, sync)
+    timeout = _timeout() if timeout is None else timeout
+    value = _local.get(key)
+    if value is not None:
+        LOOKUPS.inc(group, "local")
+        return value
+    cache = _cache()
+    value = cache.get(key)
+    if value is not None:
+        LOOKUPS.inc(group, "shared")
+    else:
+        LOOKUPS.inc(group, "miss")
+        with primary_reads():
+            value = loader()
+        if value is None:
+            return None
+        cache.set(key, value, timeout)
+    _local.set(key, value, timeout)
+    return value
+
+
+async def aget_or_load(group, name, loader, timeout=None, sync=False):
+    """
+    Asynchronous version of `get_or_load()`.
+
+    Local hits are answered on the event loop; everything that may touch
+    the shared cache or the database runs in a thread.
+    """
+    if not sync and not _versions_stale():
+        value = _local.get(_key(group, name))
+        if value is not None:
+            LOOKUPS.inc(group, "local")
+            return value
+    return await sync_to_async(get_or_load)(group, name, loader, timeout, sync)
+
+
+def invalidate(*groups):
+    """
+    Retires the cached objects of `groups` (by default all groups) by
+    moving them to a new version.
+    """
+    groups = groups or GROUPS
+    version = time.time_ns()
+    _cache().set_many({_version_key(group): version for group in groups}, None)
+    with _versions_lock:
+        _versions.update(dict.fromkeys(groups, version))
+
+
+def stats():
+    """
+    Returns the lookup counts and hit rates of each group in this process.
+
+    Returns:
+        dict: For each group, the number of lookups answered by the `local`
+        tier, the `shared` tier or neither (`miss`), and the `hit_rate`
+        (the share answered by either tier).
+    """
+    counts = {group: {"local": 0, "shared": 0, "miss": 0} for group in GROUPS}
+    for (group, tier), value in LOOKUPS.snapshot():
+        counts.setdefault(group, {"local": 0, "shared": 0, "miss": 0})[tier] = value
+    for group_counts in counts.values():
+        total = sum(group_counts.values())
+        hits = group_counts["local"] + group_counts["shared"]
+        group_counts["hit_rate"] = hits / total if total else None
+    return counts
+
+
+def latest_posts(count=3):
+    """
+    Returns the `count` newest posts, with the columns of their cards.
+    """
+    return get_or_load(
+        "posts",
+        f"latest:{count}",
+        lambda: list(
+            Post.objects.for_cards().order_by(  # pylint: disable=no-member
+                "-date", "-id"
+            )[:count]
+        ),
+    )
+
+
+async def alatest_posts(count=3):
+    """
+    Asynchronous version of `latest_posts()`.
+    """
+    return await aget_or_load(
+        "posts",
+        f"latest:{count}",
+        lambda: list(
+            Post.objects.for_cards().order_by(  # pylint: disable=no-member
+                "-date", "-id"
+            )[:count]
+        ),
+    )
+
+
+def _load_most_read(count):
+    """
+    Loads the `count` most viewed posts, with the columns of their cards.
+    """
+    return list(
+        Post.objects.for_cards()  # pylint: disable=no-member
+        .filter(view_count__gt=0)
+        .order_by("-view_count", "-id")[:count]
+    )
+
+
+def _most_read_timeout():
+    """
+    Returns how long the most read posts are cached, in seconds.
+    """
+    return getattr(settings, "BLOG_MOST_READ_TIMEOUT", 60)
+
+
+def most_read(count=3):
+    """
+    Returns the `count` most viewed posts, with the columns of their cards.
+
+    View counts change without signals (see `blog.view_counts`), so the
+    list is cached for `BLOG_MOST_READ_TIMEOUT` seconds rather than until a
+    change.
+    """
+    return get_or_load(
+        "posts",
+        f"most-read:{count}",
+        lambda: _load_most_read(count),
+        _most_read_timeout(),
+    )
+
+
+async def amost_read(count=3):
+    """
+    Asynchronous version of `most_read()`.
+    """
+    return await aget_or_load(
+        "posts",
+        f"most-read:{count}",
+        lambda: _load_most_read(count),
+        _most_read_timeout(),
+    )
+
+
+def _load_post(slug):
+    """
+    Loads the post with `slug`, its author and its renditions, or returns
+    None.
+    """
+    return (
+        Post.objects.select_related("author")  # pylint: disable=no-member
+        .prefetch_related("renditions")
+        .filter(slug=slug)
+        .first()
+    )
+
+
+def get_post(slug, sync=False):
+    """
+    Returns the post with `slug`, with its author and its renditions.
+
+    With `sync`, the current version of the posts is read first (see
+    `get_or_load`).
+
+    Raises:
+        Post.DoesNotExist: If no post has the slug.
+    """
+    post = get_or_load("posts", f"slug:{slug}", lambda: _load_post(slug), sync=sync)
+    if post is None:
+        raise Post.DoesNotExist(  # pylint: disable=no-member
+            "No post matches the given slug."
+        )
+    return post
+
+
+async def aget_post(slug, sync=False):
+    """
+    Asynchronous version of `get_post()`.
+    """
+    post = await aget_or_load(
+        "posts", f"slug:{slug}", lambda: _load_post(slug), sync=sync
+    )
+    if post is None:
+        raise Post.DoesNotExist(  # pylint: disable=no-member
+            "No post matches the given slug."
+        )
+    return post
+
+
+def post_tags(post_id, sync=False):
+    """
+    Returns the tags of the post with `post_id`.
+
+    With `sync`, the current version of the tags is read first (see
+    `get_or_load`).
+    """
+    return get_or_load(
+        "tags",
+        f"post:{post_id}",
+        lambda: list(Tag.objects.filter(posts=post_id)),  # pylint: disable=no-member
+        sync=sync,
+    )
+
+
+def tag_cloud():
+    """
+    Returns the tags of the tag cloud (see `blog.tagging.cloud`).
+    """
+    return get_or_load("tags", "cloud", tagging.cloud)
@@ -0,0 +1,147 @@
+"""
+This module implements the rendered-page cache for the post detail page.
+
+Rendering a post detail page costs the post lookup, the tag and comment
+queries and a full template render, even though the page rarely changes
+between requests. The page is therefore rendered once with placeholders in
+place of the parts that depend on the visitor (the CSRF token and the
+read-later form) and the resulting HTML is stored in Django's cache, keyed by
+the post's slug. Each request then only fills in its own per-session parts.
+
+Cached pages are removed by the signal receivers in `blog.signals` whenever a
+post, its comments or its tags change.
+
+Functions:
+    - `get_page`: Returns the cached entry for a slug, if any.
+    - `set_page`: Stores a rendered page for a slug.
+    - `aget_page`, `aset_page`: Asynchronous versions of the above.
+    - `invalidate`: Removes the cached pages for one or more slugs.
+    - `render_page`: Renders the post detail template with placeholders.
+    - `fill_session_parts`: Replaces the placeholders for one request.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CSRF_PLACEHOLDER = "__blog_csrf_token__"
+# The attributes of the CSRF field rendered by `{% csrf_token %}`. Only the
+# field is filled in, not every occurrence of the placeholder, which may also
+# appear in (escaped) comment or post text that must not show the token.
+CSRF_FIELD = 'name="csrfmiddlewaretoken" value="{}"'
+READ_LATER_PLACEHOLDER = "<!-- blog:read-later-form -->"
+
+
+def _cache():
+    """
+    Returns the cache backend used for rendered pages.
+    """
+    return caches[getattr(settings, "BLOG_PAGE_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    """
+    Returns how long rendered pages are cached, in seconds.
+    """
+    return getattr(settings, "BLOG_PAGE_CACHE_TIMEOUT", 600)
+
+
+def cache_key(slug):
+    """
+    Returns the cache key for the rendered page of the post with `slug`.
+    """
+    return f"blog:post-detail:{slug}"
+
+
+def get_page(slug):
+    """
+    Returns the cached entry for `slug`, or None on a cache miss.
+
+    The entry is a dict with the `post_id` and the placeholder-bearing
+    `body` of the page.
+    """
+    return _cache().get(cache_key(slug))
+
+
+def set_page(slug, post_id, body):
+    """
+    Stores the rendered `body` for `slug` and returns the cached entry.
+    """
+    entry = {"post_id": post_id, "body": body}
+    _cache().set(cache_key(slug), entry, _timeout())
+    return entry
+
+
+async def aget_page(slug):
+    """
+    Asynchronous version of `get_page()`.
+    """
+    return await _cache().aget(cache_key(slug))
+
+
+async def aset_page(slug, post_id, body):
+    """
+    Asynchronous version of `set_page()`.
+    """
+    entry = {"post_id": post_id, "body": body}
+    await _cache().aset(cache_key(slug), entry, _timeout())
+    return entry
+
+
+def invalidate(*slugs):
+    """
+    Removes the cached pages for the given slugs.
+    """
+    keys = [cache_key(slug) for slug in slugs if slug]
+    if keys:
+        _cache().delete_many(keys)
+
+
+def render_page(context):
+    """
+    Renders the post detail template with per-session placeholders.
+
+    The template is rendered without a request, so no context processors
+    run and nothing visitor-specific ends up in the HTML. The CSRF token of
+    the comment form and the read-later form are left as placeholders for
+    `fill_session_parts`.
+
+    Args:
+        context (dict): The template context for `blog/post-detail.html`.
+
+    Returns:
+        str: The rendered page with placeholders.
+    """
+    context = {
+        **context,
+        "csrf_token": CSRF_PLACEHOLDER,
+        "read_later_form": mark_safe(READ_LATER_PLACEHOLDER),
+    }
+    return render_to_string("blog/post-detail.html", context)
+
+
+def fill_session_parts(body, request, post_id, saved_for_later):
+    """
+    Fills the per-session placeholders of a rendered page for one request.
+
+    Args:
+        body (str): The page rendered by `render_page`.
+        request (HttpRequest): The HTTP request being answered.
+        post_id (int): The ID of the post shown on the page.
+        saved_for_later (bool): Whether the visitor stored the post for
+        later.
+
+    Returns:
+        str: The complete page for this visitor.
+    """
+    read_later_form = render_to_string(
+        "blog/includes/read-later-form.html",
+        {"post_id": post_id, "saved_for_later": saved_for_later},
+        request=request,
+    )
+    body = body.replace(READ_LATER_PLACEHOLDER, read_later_form, 1)
+    return body.replace(
+        CSRF_FIELD.format(CSRF_PLACEHOLDER), CSRF_FIELD.format(get_token(request))
+    )
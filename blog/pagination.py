@@ -0,0 +1,215 @@
+"""
+This module provides keyset (cursor) pagination for the 'blog' application.
+
+Django's built-in `Paginator` slices querysets with `LIMIT ... OFFSET ...`,
+which forces the database to walk and discard every row before the requested
+page. For deep pages of a large archive that cost grows with the page number.
+Keyset pagination instead remembers the sort key of the last row that was
+shown and asks the database for the rows that come after it, which an index on
+the sort key answers in constant time regardless of how deep the page is.
+
+Classes:
+    - `InvalidCursor`: Raised when a cursor string cannot be decoded.
+    - `KeysetPage`: A single page of results with its navigation cursors.
+    - `KeysetPaginator`: Builds pages from a queryset ordered by a composite
+      descending key such as `(date, id)`.
+"""
+
+import base64
+import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor passed in the query string is malformed.
+    """
+
+
+class KeysetPage:
+    """
+    A single page produced by `KeysetPaginator`.
+
+    The page mirrors the parts of Django's `Page` interface that templates
+    commonly use (`object_list`, `has_next`, `has_previous`,
+    `has_other_pages`) and adds the cursors needed to build the links to the
+    neighbouring pages.
+
+    Attributes:
+        object_list (list): The objects shown on this page.
+        next_cursor (str | None): Cursor for the following (older) page.
+        previous_cursor (str | None): Cursor for the preceding (newer) page.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        """
+        Returns True if there is an older page after this one.
+        """
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        """
+        Returns True if there is a newer page before this one.
+        """
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        """
+        Returns True if either neighbouring page exists.
+        """
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by a composite descending key.
+
+    The queryset is ordered by `keys` in descending order (for example
+    `("date", "id")` for newest first). The last key must be unique so that
+    rows sharing the same leading value still have a strict order. A cursor
+    encodes the key values of the boundary row; `after` cursors page towards
+    older rows and `before` cursors page back towards newer ones.
+
+    Attributes:
+        queryset (QuerySet): The unordered base queryset.
+        per_page (int): The maximum number of objects on a page.
+        keys (tuple): The model fields forming the sort key.
+    """
+
+    def __init__(self, queryset, per_page, keys=("date", "id")):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = tuple(keys)
+
+    def encode_cursor(self, obj):
+        """
+        Encodes the sort key of `obj` as an opaque, URL-safe cursor string.
+        """
+        values = []
+        for key in self.keys:
+            value = getattr(obj, key)
+            if isinstance(value, datetime.date):
+                value = value.isoformat()
+            values.append(str(value))
+        raw = "|".join(values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """
+        Decodes a cursor string back into a tuple of key values.
+
+        Raises:
+            InvalidCursor: If the cursor is not one produced by
+            `encode_cursor` for this paginator's keys.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            parts = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+        if len(parts) != len(self.keys):
+            raise InvalidCursor(cursor)
+
+        model = self.queryset.model
+        values = []
+        for key, part in zip(self.keys, parts):
+            field = model._meta.get_field(key)  # pylint: disable=protected-access
+            try:
+                values.append(field.to_python(part))
+            except Exception as exc:  # pylint: disable=broad-except
+                raise InvalidCursor(cursor) from exc
+        return tuple(values)
+
+    def _boundary_filter(self, values, older):
+        """
+        Builds the `Q` filter selecting rows strictly past the boundary key.
+
+        For keys `(a, b)` and `older=True` this expands to
+        `a < va OR (a = va AND b < vb)`, which the composite index can answer
+        with a single range scan.
+        """
+        lookup = "lt" if older else "gt"
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            clause = Q(**{f"{key}__{lookup}": values[index]})
+            for previous_key, previous_value in zip(self.keys[:index], values[:index]):
+                clause &= Q(**{previous_key: previous_value})
+            condition |= clause
+        return condition
+
+    def _page_queryset(self, after, before):
+        """
+        Returns the queryset selecting the rows of the requested page.
+
+        One extra row beyond `per_page` is selected to find out whether a
+        further page exists. `before` pages are selected in ascending order
+        and reversed by `_make_page`.
+        """
+        if before is not None:
+            values = self.decode_cursor(before)
+            return self.queryset.filter(
+                self._boundary_filter(values, older=False)
+            ).order_by(*self.keys)[: self.per_page + 1]
+
+        queryset = self.queryset
+        if after is not None:
+            values = self.decode_cursor(after)
+            queryset = queryset.filter(self._boundary_filter(values, older=True))
+        descending = [f"-{key}" for key in self.keys]
+        return queryset.order_by(*descending)[: self.per_page + 1]
+
+    def _make_page(self, rows, after, before):
+        """
+        Builds the `KeysetPage` from the rows selected by `_page_queryset`.
+        """
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if before is not None:
+            rows.reverse()
+            next_cursor = self.encode_cursor(rows[-1]) if rows else None
+            previous_cursor = self.encode_cursor(rows[0]) if has_more else None
+            return KeysetPage(rows, next_cursor, previous_cursor)
+
+        next_cursor = self.encode_cursor(rows[-1]) if has_more else None
+        previous_cursor = (
+            self.encode_cursor(rows[0]) if after is not None and rows else None
+        )
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def page(self, after=None, before=None):
+        """
+        Returns the `KeysetPage` following `after` or preceding `before`.
+
+        Without either cursor the first (newest) page is returned. One extra
+        row is fetched to find out whether a further page exists, so every
+        page costs a single indexed query of `per_page + 1` rows.
+
+        Raises:
+            InvalidCursor: If a cursor cannot be decoded.
+        """
+        rows = list(self._page_queryset(after, before))
+        return self._make_page(rows, after, before)
+
+    async def apage(self, after=None, before=None):
+        """
+        Asynchronous version of `page()`, using the async ORM.
+
+        Raises:
+            InvalidCursor: If a cursor cannot be decoded.
+        """
+        rows = [row async for row in self._page_queryset(after, before)]
+        return self._make_page(rows, after, before)
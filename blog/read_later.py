@@ -0,0 +1,351 @@
+"""
+This module implements the storage of the visitor's read-later list.
+
+The list used to live in `request.session`, so with the database session
+backend every toggle cost a SELECT and an UPDATE of `django_session`, and
+membership checks scanned a list. The list is now kept by a pluggable store
+chosen with the `BLOG_READ_LATER_STORE` setting:
+
+    - `SignedCookieReadLaterStore` (the default) keeps the post IDs in a
+      signed cookie, sorted and delta-encoded in base 36, so the feature
+      needs no server-side storage at all.
+    - `CacheReadLaterStore` keeps a set of post IDs in the cache under a
+      random visitor token held in a signed cookie, for lists too long for a
+      cookie.
+    - `SessionReadLaterStore` keeps the previous behaviour.
+
+Every store loads the IDs into a `set`, so membership checks are O(1). A
+store may cap the length of the list with `max_ids`; adding a post to a full
+list raises `ReadLaterFull` instead of silently dropping another post.
+
+Classes:
+    - `ReadLaterFull`: Raised when a post is added to a full list.
+    - `BaseReadLaterStore`: The common interface of the stores.
+    - `SessionReadLaterStore`: The session-backed store.
+    - `SignedCookieReadLaterStore`: The signed cookie store.
+    - `CacheReadLaterStore`: The cache-backed store.
+
+Functions:
+    - `encode_ids`: Encodes a set of post IDs as a compact string.
+    - `decode_ids`: Decodes a string produced by `encode_ids`.
+    - `get_store`: Returns the configured store for a request.
+"""
+
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _to_base36(number):
+    """
+    Returns the base 36 representation of a non-negative integer.
+    """
+    digits = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        digits = DIGITS[remainder] + digits
+        if not number:
+            return digits
+
+
+def encode_ids(ids):
+    """
+    Encodes a set of post IDs as a compact string.
+
+    The IDs are sorted and each is stored as the base 36 difference to its
+    predecessor, so e.g. `{1000, 1003, 1010}` becomes `"rs.3.7"`.
+    """
+    parts = []
+    previous = 0
+    for post_id in sorted(ids):
+        parts.append(_to_base36(post_id - previous))
+        previous = post_id
+    return ".".join(parts)
+
+
+def decode_ids(value):
+    """
+    Decodes a string produced by `encode_ids` into a set of post IDs.
+
+    Returns an empty set for malformed input.
+    """
+    ids = set()
+    current = 0
+    try:
+        for part in value.split(".") if value else []:
+            current += int(part, 36)
+            ids.add(current)
+    except ValueError:
+        return set()
+    return ids
+
+
+class ReadLaterFull(ValueError):
+    """
+    Raised when a post is added to a read-later list that is already full.
+    """
+
+
+class BaseReadLaterStore:
+    """
+    Common interface of the read-later stores.
+
+    A store is created per request. The IDs are loaded on first use with
+    `load()` (or `aload()` from asynchronous code), changed in memory and
+    written back with `save(response)` (or `asave(response)`) only if they
+    changed.
+
+    Attributes:
+        request (HttpRequest): The request whose visitor owns the list.
+        max_ids (int): The maximum number of stored posts, or None for no
+        limit.
+    """
+
+    max_ids = None
+
+    def __init__(self, request):
+        self.request = request
+        self._ids = None
+        self._changed = False
+
+    def read(self):
+        """
+        Returns the stored post IDs as a set. Implemented by subclasses.
+        """
+        raise NotImplementedError
+
+    def write(self, response, ids):
+        """
+        Persists `ids`, possibly through `response`. Implemented by
+        subclasses.
+        """
+        raise NotImplementedError
+
+    def load(self):
+        """
+        Loads the stored post IDs if they are not loaded yet.
+        """
+        if self._ids is None:
+            self._ids = self.read()
+
+    async def aload(self):
+        """
+        Asynchronous version of `load()`.
+        """
+        if self._ids is None:
+            self._ids = await sync_to_async(self.read)()
+
+    def ids(self):
+        """
+        Returns the stored post IDs as a frozenset.
+        """
+        self.load()
+        return frozenset(self._ids)
+
+    def contains(self, post_id):
+        """
+        Returns True if the post with `post_id` is stored for later.
+        """
+        self.load()
+        return post_id in self._ids
+
+    def toggle(self, post_id):
+        """
+        Adds the post to the list, or removes it if it is already stored.
+
+        Returns:
+            bool: True if the post is stored after the call.
+
+        Raises:
+            ReadLaterFull: If the post is not stored and the list already
+            holds `max_ids` posts.
+        """
+        self.load()
+        if post_id in self._ids:
+            self._ids.discard(post_id)
+            self._changed = True
+            return False
+        if self.max_ids is not None and len(self._ids) >= self.max_ids:
+            raise ReadLaterFull(post_id)
+        self._ids.add(post_id)
+        self._changed = True
+        return True
+
+    def save(self, response):
+        """
+        Persists the list if it changed.
+        """
+        if self._changed:
+            self.write(response, frozenset(self._ids))
+            self._changed = False
+
+    async def asave(self, response):
+        """
+        Asynchronous version of `save()`.
+        """
+        if self._changed:
+            await sync_to_async(self.write)(response, frozenset(self._ids))
+            self._changed = False
+
+
+class SessionReadLaterStore(BaseReadLaterStore):
+    """
+    Store keeping the list in the session, as a list under `stored_posts`.
+    """
+
+    session_key = "stored_posts"
+
+    def read(self):
+        return set(self.request.session.get(self.session_key) or [])
+
+    def write(self, response, ids):
+        self.request.session[self.session_key] = sorted(ids)
+
+
+def _set_signed_cookie(response, name, value, salt):
+    """
+    Sets a long-lived, signed, HTTP-only cookie on `response`.
+    """
+    response.set_signed_cookie(
+        name,
+        value,
+        salt=salt,
+        max_age=COOKIE_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+class SignedCookieReadLaterStore(BaseReadLaterStore):
+    """
+    Store keeping the list in a signed cookie.
+
+    The cookie holds the IDs encoded with `encode_ids`. Signing prevents
+    tampering; the IDs themselves are not secret. To stay well within
+    browser cookie limits, at most `max_ids` posts can be stored.
+
+    Visitors whose list still lives in the session, from before this store
+    was the default, have no cookie yet; their list is read from the session
+    and moved into the cookie on the next write.
+
+    Attributes:
+        cookie_name (str): The name of the cookie.
+        max_ids (int): The maximum number of stored posts.
+    """
+
+    cookie_name = "read_later"
+    salt = "blog.read_later"
+    max_ids = 500
+
+    def _has_cookie(self):
+        """
+        Returns True if the request carries the cookie, valid or not.
+        """
+        return self.cookie_name in self.request.COOKIES
+
+    def _session_ids(self):
+        """
+        Returns the post IDs still stored in the session.
+        """
+        session = getattr(self.request, "session", None)
+        if session is None:
+            return set()
+        return set(session.get(SessionReadLaterStore.session_key) or [])
+
+    def read(self):
+        if not self._has_cookie():
+            return self._session_ids()
+        value = self.request.get_signed_cookie(
+            self.cookie_name, default="", salt=self.salt
+        )
+        return decode_ids(value)
+
+    def write(self, response, ids):
+        session = getattr(self.request, "session", None)
+        if session is not None and not self._has_cookie():
+            session.pop(SessionReadLaterStore.session_key, None)
+        if not ids:
+            response.delete_cookie(self.cookie_name, samesite="Lax")
+            return
+        _set_signed_cookie(response, self.cookie_name, encode_ids(ids), self.salt)
+
+    async def aload(self):
+        # Reading a cookie does no I/O, so there is no need for a thread;
+        # reading the session may query the database.
+        if self._has_cookie():
+            self.load()
+        else:
+            await super().aload()
+
+    async def asave(self, response):
+        self.save(response)
+
+
+class CacheReadLaterStore(BaseReadLaterStore):
+    """
+    Store keeping the list as a set in the cache.
+
+    The visitor is identified by a random token in a signed cookie, which is
+    only set once the visitor stores a first post.
+
+    Attributes:
+        cookie_name (str): The name of the cookie holding the token.
+        timeout (int): How long an unchanged list is kept, in seconds.
+    """
+
+    cookie_name = "read_later_id"
+    salt = "blog.read_later.id"
+    timeout = COOKIE_MAX_AGE
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cache = caches[getattr(settings, "BLOG_READ_LATER_CACHE_ALIAS", "default")]
+        self.token = request.get_signed_cookie(
+            self.cookie_name, default=None, salt=self.salt
+        )
+
+    def cache_key(self):
+        """
+        Returns the cache key of this visitor's list.
+        """
+        return f"blog:read-later:{self.token}"
+
+    def read(self):
+        if self.token is None:
+            return set()
+        return set(self.cache.get(self.cache_key(), ()))
+
+    def write(self, response, ids):
+        if self.token is None:
+            self.token = secrets.token_urlsafe(18)
+            _set_signed_cookie(response, self.cookie_name, self.token, self.salt)
+        self.cache.set(self.cache_key(), frozenset(ids), self.timeout)
+
+
+def get_store(request):
+    """
+    Returns the read-later store of `request`.
+
+    The store class is taken from the `BLOG_READ_LATER_STORE` setting. The
+    store is created once per request, so repeated checks reuse the loaded
+    IDs.
+    """
+    store = getattr(request, "_read_later_store", None)
+    if store is None:
+        store_class = import_string(
+            getattr(
+                settings,
+                "BLOG_READ_LATER_STORE",
+                "blog.read_later.SignedCookieReadLaterStore",
+            )
+        )
+        store = store_class(request)
+        request._read_later_store = store  # pylint: disable=protected-access
+    return store
@@ -0,0 +1,253 @@
+"""
+This module builds responsive image renditions for blog posts.
+
+Listing pages show post images at a few rem across, yet used to download the
+original upload. Each post image is therefore resized with Pillow into a
+small set of widths, in WebP and JPEG, and recorded as `Rendition` rows so
+that templates can emit `srcset` attributes (see the `responsive_image` tag
+in `blog.templatetags.blog_tags`).
+
+The resizing itself is a pure function of the image bytes, so building
+renditions for many posts can run in a process pool while the parent
+process alone talks to the database and the media storage.
+
+Functions:
+    - `resize_image`: Produces the encoded variants of one image.
+    - `is_stale`: Checks whether a post's renditions need rebuilding.
+    - `build_renditions`: Builds and stores the renditions of one post.
+    - `build_many`: Builds renditions for many posts in a process pool.
+"""
+
+import io
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from . import object_cache, page_cache
+from .models import Post, Rendition
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (96, 192, 384)
+
+# Format name as stored on `Rendition`, mapped to the Pillow encoder name and
+# its save options.
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def rendition_widths():
+    """
+    Returns the rendition widths configured for the site.
+    """
+    return tuple(getattr(settings, "BLOG_RENDITION_WIDTHS", DEFAULT_WIDTHS))
+
+
+def resize_image(data, widths):
+    """
+    Produces resized, encoded variants of an image.
+
+    Images are never upscaled: requested widths larger than the original are
+    replaced by the original width. This function does not touch Django and
+    is safe to run in a worker process.
+
+    Args:
+        data (bytes): The encoded original image.
+        widths (iterable): The target widths in pixels.
+
+    Returns:
+        list: `(format, width, height, bytes)` tuples, one per variant.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        targets = sorted({min(width, image.width) for width in widths})
+
+        variants = []
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for name, (encoder, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, encoder, **options)
+                variants.append((name, width, height, buffer.getvalue()))
+        return variants
+
+
+def is_stale(post):
+    """
+    Returns True if the renditions of `post` do not match its current image.
+    """
+    if not post.image:
+        return post.renditions.exists()
+    sources = set(post.renditions.values_list("source", flat=True))
+    return sources != {post.image.name}
+
+
+def _read_source(post):
+    """
+    Returns the bytes of the original image of `post`.
+    """
+    with post.image.storage.open(post.image.name, "rb") as source:
+        return source.read()
+
+
+def _store_variants(post, source_name, variants):
+    """
+    Replaces the renditions of `post` with `variants` built from
+    `source_name`.
+
+    The post's version is bumped as well, since its cached listing card
+    links the old renditions. Once the change commits, the cached posts,
+    which carry the old version, are retired and the post's cached detail
+    page is dropped.
+    """
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    old = list(post.renditions.all())
+    new = []
+    for fmt, width, height, data in variants:
+        rendition = Rendition(
+            post=post, source=source_name, format=fmt, width=width, height=height
+        )
+        rendition.image.save(
+            f"{post.pk}/{stem}-{width}.{fmt}", ContentFile(data), save=False
+        )
+        new.append(rendition)
+
+    with transaction.atomic():
+        Rendition.objects.filter(  # pylint: disable=no-member
+            pk__in=[r.pk for r in old]
+        ).delete()
+        Rendition.objects.bulk_create(new)  # pylint: disable=no-member
+        Post.objects.filter(pk=post.pk).update(  # pylint: disable=no-member
+            version=F("version") + 1
+        )
+        transaction.on_commit(lambda: _retire_cached(post.slug))
+    post.version += 1
+
+    _delete_files(old, kept={rendition.image.name for rendition in new})
+
+
+def _retire_cached(slug):
+    """
+    Retires the cached posts and the cached detail page of the post `slug`.
+    """
+    object_cache.invalidate("posts")
+    page_cache.invalidate(slug)
+
+
+def _delete_files(old, kept=()):
+    """
+    Deletes the image files of the renditions `old` whose names are not in
+    `kept`.
+    """
+    for rendition in old:
+        if rendition.image.name not in kept:
+            rendition.image.storage.delete(rendition.image.name)
+
+
+def build_renditions(post, widths=None):
+    """
+    Builds and stores the renditions of a single post.
+
+    Any existing renditions are replaced. A post without an image simply
+    loses its renditions, files included.
+
+    Args:
+        post (Post): The post whose image is resized.
+        widths (iterable): The target widths; defaults to the configured
+        widths.
+    """
+    if not post.image:
+        old = list(post.renditions.all())
+        Rendition.objects.filter(  # pylint: disable=no-member
+            pk__in=[r.pk for r in old]
+        ).delete()
+        _delete_files(old)
+        return
+    variants = resize_image(_read_source(post), widths or rendition_widths())
+    _store_variants(post, post.image.name, variants)
+
+
+def build_renditions_safely(post):
+    """
+    Builds the renditions of `post`, logging instead of raising on failure.
+
+    Renditions are an optimisation; a missing or unreadable image must not
+    break saving the post, whose templates fall back to the original image.
+    """
+    try:
+        build_renditions(post)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Building renditions for post %s failed.", post.pk)
+
+
+def build_many(posts, max_workers=None, widths=None):
+    """
+    Builds renditions for many posts, resizing in a process pool.
+
+    The parent process reads each original from storage and hands the bytes
+    to a worker; as each worker finishes, the parent stores the variants and
+    records them. Only a couple of images per worker are in flight at any
+    time, so memory use does not grow with the number of posts. Workers only
+    run `resize_image` and never use the database connections they inherit.
+
+    Args:
+        posts (iterable): The posts to build renditions for.
+        max_workers (int): The number of worker processes; defaults to the
+        CPU count.
+        widths (iterable): The target widths; defaults to the configured
+        widths.
+
+    Returns:
+        tuple: The number of posts built and the number that failed.
+    """
+    widths = tuple(widths or rendition_widths())
+    max_workers = max_workers or os.cpu_count() or 1
+    built = failed = 0
+    pending = {}
+
+    def collect(done):
+        nonlocal built, failed
+        for future in done:
+            post, source_name = pending.pop(future)
+            try:
+                _store_variants(post, source_name, future.result())
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Building renditions for post %s failed.", post.pk)
+                failed += 1
+            else:
+                built += 1
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for post in posts:
+            if not post.image:
+                continue
+            try:
+                data = _read_source(post)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Reading the image of post %s failed.", post.pk)
+                failed += 1
+                continue
+
+            pending[executor.submit(resize_image, data, widths)] = (
+                post,
+                post.image.name,
+            )
+            if len(pending) >= 2 * max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        collect(wait(pending).done)
+
+    return built, failed
@@ -0,0 +1,213 @@
+"""
+This module implements full-text search over blog posts.
+
+Searching with `icontains` scans every row of the post table, so the search
+is delegated to the full-text index of the database in use instead:
+
+    - On SQLite an FTS5 virtual table (`blog_post_fts`) holds a copy of each
+      post's title, excerpt and content under the post's ID. It is kept up to
+      date by the signal receivers in `blog.signals` as posts are saved and
+      deleted.
+    - On PostgreSQL a GIN index over a weighted `tsvector` expression of the
+      same columns is maintained by the database itself whenever a row
+      changes.
+    - Any other database falls back to ranked-by-date `icontains` filtering.
+
+The index structures are created by migration `0006_post_search_index`.
+
+Classes:
+    - `SearchBackend`: The fallback backend and common interface.
+    - `SQLiteFTS5Backend`: The SQLite FTS5 backend.
+    - `PostgresBackend`: The PostgreSQL `tsvector` backend.
+
+Functions:
+    - `get_backend`: Returns the backend for a database connection.
+    - `search_posts`: Returns the IDs of the posts matching a query, best
+      match first.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+
+from .models import Post
+
+FTS_TABLE = "blog_post_fts"
+
+# Title matches rank above excerpt matches, which rank above content matches.
+# The PostgreSQL expression must stay identical to the one indexed by the
+# migration for the planner to use the GIN index.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english'::regconfig, title), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, excerpt), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, content), 'D')"
+)
+SQLITE_COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def tokenize(query):
+    """
+    Splits a user supplied query into plain search terms.
+
+    Operators and punctuation are dropped so that no query can be parsed as
+    index-specific search syntax.
+    """
+    return re.findall(r"\w+", query)
+
+
+class SearchBackend:
+    """
+    Fallback search backend for databases without a supported index.
+
+    Matches posts with `icontains` on the searchable fields and orders them
+    newest first. Indexing is a no-op. The other backends override the
+    methods below with their index-backed versions.
+
+    Attributes:
+        connection (BaseDatabaseWrapper): The database connection searched.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def search(self, query, limit, offset=0):
+        """
+        Returns up to `limit` matching post IDs, skipping `offset` results.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term)
+                | Q(excerpt__icontains=term)
+                | Q(content__icontains=term)
+            )
+        queryset = (
+            Post.objects.using(self.connection.alias)  # pylint: disable=no-member
+            .filter(condition)
+            .order_by("-date", "-id")
+            .values_list("id", flat=True)
+        )
+        return list(queryset[offset : offset + limit])
+
+    def index_post(self, post):
+        """
+        Adds or refreshes `post` in the search index.
+        """
+
+    def remove_post(self, post_id):
+        """
+        Removes the post with `post_id` from the search index.
+        """
+
+    def rebuild(self):
+        """
+        Rebuilds the search index from the post table.
+        """
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    Search backend using an SQLite FTS5 virtual table.
+
+    Results are ranked with FTS5's built-in BM25 function, weighting the
+    title above the excerpt and the excerpt above the content.
+    """
+
+    def search(self, query, limit, offset=0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        match = " ".join(f'"{term}"' for term in terms)
+        weights = ", ".join(str(weight) for weight in SQLITE_COLUMN_WEIGHTS)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s",
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_post(self, post):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content) "
+                "VALUES (%s, %s, %s, %s)",
+                [post.pk, post.title, post.excerpt, post.content],
+            )
+
+    def remove_post(self, post_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+    def rebuild(self):
+        table = Post._meta.db_table  # pylint: disable=protected-access,no-member
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content) "
+                f"SELECT id, title, excerpt, content FROM {table}"
+            )
+
+
+class PostgresBackend(SearchBackend):
+    """
+    Search backend using a PostgreSQL `tsvector` GIN index.
+
+    The index is an expression index, so PostgreSQL keeps it current on every
+    insert and update and the indexing methods are no-ops. Results are ranked
+    with `ts_rank` over the weighted vector.
+    """
+
+    def search(self, query, limit, offset=0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        table = Post._meta.db_table  # pylint: disable=protected-access,no-member
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {table}, "
+                "plainto_tsquery('english'::regconfig, %s) AS query "
+                f"WHERE ({PG_SEARCH_VECTOR}) @@ query "
+                f"ORDER BY ts_rank({PG_SEARCH_VECTOR}, query) DESC, id DESC "
+                "LIMIT %s OFFSET %s",
+                [" ".join(terms), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": SQLiteFTS5Backend,
+    "postgresql": PostgresBackend,
+}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    """
+    Returns the search backend for the database alias `using`.
+    """
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, SearchBackend)(connection)
+
+
+def search_posts(query, limit, offset=0, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the IDs of the posts matching `query`, best match first.
+
+    Args:
+        query (str): The user supplied search text.
+        limit (int): The maximum number of IDs to return.
+        offset (int): The number of leading results to skip.
+        using (str): The database alias to search.
+
+    Returns:
+        list: The matching post IDs in rank order.
+    """
+    return get_backend(using).search(query, limit, offset)
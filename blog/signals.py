@@ -0,0 +1,380 @@
+"""
+This module contains the signal receivers for the 'blog' application.
+
+The receivers keep derived data in sync with the models it is built from.
+They are connected when the application registry is ready (see
+`BlogConfig.ready`).
+
+Receivers:
+    - `render_post_html`: Renders the content of a post being saved.
+    - `render_comment_html`: Renders the text of a comment being saved.
+    - `remember_previous_slug`: Records the slug a post had before saving.
+    - `bump_post_version`: Moves a post being saved to a new cache version.
+    - `refresh_post_version`: Loads the new version of a saved post.
+    - `invalidate_cached_posts`: Retires the posts in the object cache when
+      posts or their authors change.
+    - `invalidate_cached_tags`: Retires the tags in the object cache when tags
+      or their posts change.
+    - `invalidate_post_page`: Drops the cached detail page of a saved or
+      deleted post.
+    - `index_post`: Adds a saved post to the full-text search index.
+    - `unindex_post`: Removes a deleted post from the full-text search index.
+    - `build_post_renditions`: Rebuilds a saved post's image renditions once
+      the save is committed.
+    - `invalidate_comment_post_page`: Drops the cached detail page of the post
+      a comment belongs to.
+    - `invalidate_tagged_post_pages`: Drops cached detail pages when the tags
+      of a post change.
+    - `invalidate_tag_post_pages`: Drops the cached detail pages of the posts
+      using a renamed or deleted tag.
+    - `invalidate_author_post_pages`: Drops the cached detail pages of the
+      posts by a changed or deleted author.
+    - `invalidate_post_sitemap`: Retires the cached sitemap shard of a saved
+      or deleted post.
+    - `count_tagged_posts`: Recounts the posts of tags added to or removed
+      from posts.
+    - `remember_post_tags`: Records the tags of a post about to be deleted.
+    - `count_deleted_post_tags`: Recounts the posts of a deleted post's tags.
+    - `invalidate_feeds`: Retires the cached feeds when posts, their tags or
+      their authors change.
+"""
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+
+from . import feeds, object_cache, page_cache, renditions, search, sitemaps, tagging
+from .models import Author, Comment, Post, Tag
+
+
+def _invalidate_pages_on_commit(slugs, using):
+    """
+    Drops the cached detail pages of the posts with `slugs` once the current
+    transaction commits.
+
+    Dropped before the commit, a page could be rendered again from the old
+    rows by a concurrent request and cached until it expires.
+    """
+    slugs = list(slugs)
+    transaction.on_commit(lambda: page_cache.invalidate(*slugs), using=using)
+
+
+@receiver(pre_save, sender=Post)
+def render_post_html(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Renders the content of a post that is about to be saved into HTML.
+    """
+    instance.render_html()
+
+
+@receiver(pre_save, sender=Comment)
+def render_comment_html(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Renders the text of a comment that is about to be saved into HTML.
+    """
+    instance.render_html()
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_slug(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Records the stored slug of a post that is about to be saved.
+
+    A post whose slug changes must also drop the page cached under its old
+    slug.
+    """
+    instance._previous_slug = None  # pylint: disable=protected-access
+    if instance.pk is not None:
+        instance._previous_slug = (  # pylint: disable=protected-access
+            sender.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+        )
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Bumps the version of a post that is about to be saved.
+
+    The version names the post's cached listing card (see
+    `blog.fragment_cache`), so the next listing renders a fresh card. It is
+    incremented in the database rather than from the instance, which may
+    hold an outdated version: two saves of instances loaded at the same
+    version must not move the post to the same new version.
+    """
+    # pylint: disable=protected-access
+    if instance.pk is not None and not instance._state.adding:
+        instance.version = F("version") + 1
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_version(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Loads the version a saved post was moved to by `bump_post_version`.
+    """
+    if hasattr(instance.version, "resolve_expression"):
+        instance.refresh_from_db(using=using, fields=["version"])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_cached_posts(sender, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Retires the posts in the object cache (see `blog.object_cache`) when a
+    post or an author changes.
+
+    The posts are retired once the change commits; before, a concurrent
+    request would load the old rows and cache them under the new version.
+    The object cache receivers are connected before the ones dropping
+    cached pages, and the latter register their work from the same or
+    later signals, so after a commit the objects are retired before the
+    pages that were built from them are dropped.
+    """
+    transaction.on_commit(
+        lambda: object_cache.invalidate("posts"), using=kwargs["using"]
+    )
+
+
+@receiver(post_delete, sender=Post)
+@receiver(m2m_changed, sender=Post.tag.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_cached_tags(sender, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Retires the tags in the object cache when a tag, the tags of a post or
+    their post counts change, once the change (and the recount) commits.
+    """
+    if kwargs.get("action", "post_").startswith("post_"):
+        transaction.on_commit(
+            lambda: object_cache.invalidate("tags"), using=kwargs["using"]
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_page(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Drops the cached detail page of a saved or deleted post.
+    """
+    _invalidate_pages_on_commit(
+        (instance.slug, getattr(instance, "_previous_slug", None)), using
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_sitemap(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Retires the cached sitemap shard containing a saved or deleted post.
+
+    Posts are assigned to shards by ID, so no other shard is affected.
+    """
+    sitemaps.invalidate(sitemaps.shard_of(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Adds a saved post to the full-text search index, replacing its old entry.
+    """
+    search.get_backend(using).index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Removes a deleted post from the full-text search index.
+    """
+    search.get_backend(using).remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def build_post_renditions(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Rebuilds the image renditions of a saved post if its image changed.
+
+    The work runs after the surrounding transaction commits, so a rolled back
+    save never leaves renditions behind.
+    """
+
+    def build():
+        if renditions.is_stale(instance):
+            renditions.build_renditions_safely(instance)
+
+    transaction.on_commit(build, using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post_page(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Drops the cached detail page of the post a comment belongs to.
+    """
+    slug = Post.objects.filter(pk=instance.post_id).values_list("slug", flat=True)
+    _invalidate_pages_on_commit(slug, using)
+
+
+@receiver(m2m_changed, sender=Post.tag.through)
+def invalidate_tagged_post_pages(
+    sender, instance, action, reverse, pk_set, using, **kwargs
+):
+    # pylint: disable=unused-argument,too-many-arguments
+    """
+    Drops cached detail pages when tags are added to or removed from posts.
+
+    The relation can be changed from either side: from a post
+    (`post.tag.add(...)`) the instance is the post, and from a tag
+    (`tag.posts.add(...)`) the affected posts are in `pk_set`. A reverse
+    `clear()` has no `pk_set`, so the affected posts are collected before
+    the rows are removed and their pages dropped once they are gone.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _invalidate_pages_on_commit([instance.slug], using)
+    elif action == "pre_clear":
+        instance._cleared_post_slugs = list(  # pylint: disable=protected-access
+            instance.posts.values_list("slug", flat=True)
+        )
+    elif action == "post_clear":
+        _invalidate_pages_on_commit(
+            instance._cleared_post_slugs, using  # pylint: disable=protected-access
+        )
+    elif action in ("post_add", "post_remove"):
+        slugs = Post.objects.filter(pk__in=pk_set).values_list("slug", flat=True)
+        _invalidate_pages_on_commit(slugs, using)
+
+
+@receiver(m2m_changed, sender=Post.tag.through)
+def count_tagged_posts(sender, instance, action, reverse, pk_set, using, **kwargs):
+    # pylint: disable=unused-argument,too-many-arguments,protected-access
+    """
+    Recounts the posts of the tags whose relation to posts changed.
+
+    From a tag (`tag.posts.add(...)`) only that tag changes. From a post the
+    changed tags are in `pk_set`, except for `clear()`, whose tags are
+    recorded before the rows are removed.
+    """
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            tagging.recount([instance.pk], using)
+    elif action == "pre_clear":
+        instance._cleared_tag_ids = list(instance.tag.values_list("pk", flat=True))
+    elif action == "post_clear":
+        tagging.recount(instance._cleared_tag_ids, using)
+    elif action in ("post_add", "post_remove"):
+        tagging.recount(pk_set, using)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_tags(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Records the tags of a post that is about to be deleted.
+
+    The post's through rows are deleted with it without an `m2m_changed`
+    signal, so its tags are recounted once it is gone.
+    """
+    instance._deleted_tag_ids = list(  # pylint: disable=protected-access
+        instance.tag.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post_tags(sender, instance, using, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Recounts the posts of the tags a deleted post had.
+    """
+    tag_ids = getattr(instance, "_deleted_tag_ids", None)
+    if tag_ids:
+        tagging.recount(tag_ids, using)
+
+
+def _invalidate_related_pages(instance, signal, using):
+    """
+    Drops the cached detail pages of `instance.posts` once the change to
+    `instance` commits.
+
+    Before a deletion the posts are only recorded, while they can still be
+    looked up; their pages are dropped after it, once the object cache
+    receivers have retired the old objects.
+    """
+    # pylint: disable=protected-access
+    if signal is pre_delete:
+        instance._post_slugs = list(instance.posts.values_list("slug", flat=True))
+    elif signal is post_delete:
+        _invalidate_pages_on_commit(instance._post_slugs, using)
+    else:
+        _invalidate_pages_on_commit(
+            instance.posts.values_list("slug", flat=True), using
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_post_pages(sender, instance, using, signal, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Drops the cached detail pages of the posts using a changed tag.
+
+    The posts of a deleted tag are looked up before its rows are removed.
+    """
+    _invalidate_related_pages(instance, signal, using)
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_post_pages(sender, instance, using, signal, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Drops the cached detail pages of the posts by a changed author.
+
+    Deleting an author nulls `Post.author` with a bulk update that sends no
+    `Post` signals, so the posts are looked up before the author goes away.
+    """
+    _invalidate_related_pages(instance, signal, using)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(m2m_changed, sender=Post.tag.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_feeds(sender, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Retires the cached feeds when a post, its tags or its author change.
+
+    Feeds list post titles, excerpts, tag captions and author names, so any
+    of these changing makes every cached feed stale. Tag changes made
+    through the relation are handled once they are done. The feeds are
+    retired once the change commits, so a concurrent request cannot cache
+    the old items again.
+    """
+    if kwargs.get("action", "post_").startswith("post_"):
+        transaction.on_commit(feeds.invalidate, using=kwargs["using"])
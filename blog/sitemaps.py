@@ -0,0 +1,196 @@
+"""
+This module implements the XML sitemaps of the blog.
+
+The sitemaps list the detail page (`Post.get_absolute_url()`) of every post,
+so search engines need not crawl the whole archive through the post list.
+They are split into shards by post ID: shard `n` covers the IDs from
+`(n - 1) * size + 1` to `n * size`, where `size` is the
+`BLOG_SITEMAP_SHARD_SIZE` setting (50,000, the limit of the sitemap
+protocol). A shard therefore never holds more URLs than allowed, and a post
+always stays in the same shard. The sitemap index links all shards up to
+the highest post ID, which costs a single indexed aggregate query.
+
+A shard is streamed while its posts are read with a keyset iterator over
+the ID range, so neither the posts nor the XML are held in memory at once.
+The gzip-compressed XML is cached afterwards; cached shards are sent as is
+to clients accepting gzip, which every crawler does. Each shard's cache key
+contains a per-shard version that the signal receivers in `blog.signals`
+change when a post is saved or deleted, so editing a post only regenerates
+its own shard.
+
+Functions:
+    - `shard_size`: Returns the number of post IDs covered by a shard.
+    - `shard_of`: Returns the shard containing a post ID.
+    - `shard_count`: Returns the number of shards.
+    - `invalidate`: Retires the cached XML of one or more shards.
+    - `invalidate_all`: Retires the cached XML of all shards.
+    - `index_chunks`: Yields the XML of the sitemap index.
+    - `get_cached_shard`: Returns the cached, compressed XML of a shard.
+    - `shard_chunks`: Yields the XML of a shard and caches it.
+"""
+
+import time
+import zlib
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.urls import reverse
+
+from .models import Post
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def _cache():
+    """
+    Returns the cache backend used for sitemap shards.
+    """
+    return caches[getattr(settings, "BLOG_SITEMAP_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    """
+    Returns how long the XML of a shard is cached, in seconds.
+    """
+    return getattr(settings, "BLOG_SITEMAP_CACHE_TIMEOUT", 86400)
+
+
+def shard_size():
+    """
+    Returns the number of post IDs covered by each shard.
+    """
+    return getattr(settings, "BLOG_SITEMAP_SHARD_SIZE", 50000)
+
+
+def shard_of(post_id):
+    """
+    Returns the number of the shard containing `post_id`, starting from 1.
+    """
+    return (post_id - 1) // shard_size() + 1
+
+
+def shard_count():
+    """
+    Returns the number of shards, from the highest post ID.
+    """
+    highest = Post.objects.aggregate(highest=Max("id"))["highest"]
+    return shard_of(highest) if highest else 0
+
+
+def _version_key(shard):
+    """
+    Returns the cache key of the version of `shard`.
+    """
+    return f"blog:sitemap-version:{shard}"
+
+
+def invalidate(*shards):
+    """
+    Retires the cached XML of the given shards by changing their versions.
+    """
+    if shards:
+        version = time.time_ns()
+        _cache().set_many({_version_key(shard): version for shard in shards}, None)
+
+
+def invalidate_all():
+    """
+    Retires the cached XML of all shards, e.g. after a bulk import.
+    """
+    invalidate(*range(1, shard_count() + 1))
+
+
+def _shard_key(shard, base_url):
+    """
+    Returns the cache key of the current XML of `shard` for `base_url`.
+
+    Shards contain absolute URLs, so they are cached per site address.
+    """
+    version = _cache().get_or_set(_version_key(shard), time.time_ns, None)
+    return f"blog:sitemap:{shard}:{version}:{zlib.crc32(base_url.encode())}"
+
+
+def index_chunks(request):
+    """
+    Yields the XML of the sitemap index, linking every shard.
+
+    Args:
+        request (HttpRequest): The HTTP request for the index.
+
+    Yields:
+        str: Consecutive parts of the XML document.
+    """
+    yield f'{XML_HEADER}<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for shard in range(1, shard_count() + 1):
+        url = request.build_absolute_uri(reverse("sitemap-shard", args=[shard]))
+        yield f"<sitemap><loc>{escape(url)}</loc></sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def _shard_posts(shard, batch_size=2000):
+    """
+    Yields the posts of `shard` in ID order, reading them in batches.
+
+    Every batch continues after the last ID of the previous one, so each
+    query is an index range scan however deep into the archive it is.
+    """
+    last_id, highest = (shard - 1) * shard_size(), shard * shard_size()
+    posts = Post.objects.only("id", "slug", "date").order_by("id")
+    while True:
+        batch = list(posts.filter(id__gt=last_id, id__lte=highest)[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1].id
+
+
+def get_cached_shard(shard, base_url):
+    """
+    Returns the cached, gzip-compressed XML of `shard`, or None.
+
+    Args:
+        shard (int): The number of the shard.
+        base_url (str): The scheme and host the URLs are built with.
+    """
+    return _cache().get(_shard_key(shard, base_url))
+
+
+def shard_chunks(shard, base_url):
+    """
+    Yields the XML of `shard` and caches it once it is complete.
+
+    The XML is compressed as it is produced, so only the compressed shard is
+    kept in memory. A stream that is not consumed to the end (e.g. because
+    the client went away) is not cached.
+
+    Args:
+        shard (int): The number of the shard.
+        base_url (str): The scheme and host the URLs are built with.
+
+    Yields:
+        bytes: Consecutive parts of the XML document.
+    """
+    key = _shard_key(shard, base_url)
+    compressor = zlib.compressobj(wbits=31)
+    compressed = []
+
+    def emit(text):
+        data = text.encode()
+        compressed.append(compressor.compress(data))
+        return data
+
+    yield emit(f'{XML_HEADER}<urlset xmlns="{SITEMAP_NS}">\n')
+    lines = []
+    for post in _shard_posts(shard):
+        loc = escape(base_url + post.get_absolute_url())
+        lines.append(f"<url><loc>{loc}</loc><lastmod>{post.date}</lastmod></url>\n")
+        if len(lines) == 500:
+            yield emit("".join(lines))
+            lines = []
+    yield emit("".join(lines) + "</urlset>\n")
+
+    compressed.append(compressor.flush())
+    _cache().set(key, b"".join(compressed), _timeout())
@@ -0,0 +1,77 @@
+"""
+This module maintains the post counts of tags and builds the tag cloud.
+
+`Tag.post_count` is a denormalized count of the posts using a tag, so tag
+pages and the tag cloud never count posts with `COUNT ... GROUP BY` while
+answering a request. The signal receivers in `blog.signals` recount the
+tags whose posts changed whenever the post/tag relation changes, and the
+bulk paths (imports and seeding) recount all tags when they are done.
+
+Counts are recomputed from the through table rather than incremented, as
+`remove()` reports every requested tag, including tags a post did not
+have, and because a recount is correct however writes interleave.
+
+Functions:
+    - `recount`: Recomputes the post counts of some or all tags.
+    - `cloud`: Returns the tags in use, weighted for the tag cloud.
+"""
+
+import math
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Post, Tag
+
+CLOUD_WEIGHTS = 5
+
+
+def recount(tag_ids=None, using=DEFAULT_DB_ALIAS):
+    """
+    Recomputes the post counts of the given tags with one `UPDATE`.
+
+    Args:
+        tag_ids (iterable): The IDs of the tags to recount, or None for all
+        tags.
+        using (str): The database alias.
+    """
+    through = Post.tag.through
+    post_count = Subquery(
+        through.objects.filter(tag_id=OuterRef("pk"))
+        .order_by()
+        .values("tag_id")
+        .annotate(count=Count("*"))
+        .values("count"),
+        output_field=IntegerField(),
+    )
+    tags = Tag.objects.using(using)  # pylint: disable=no-member
+    if tag_ids is not None:
+        tags = tags.filter(pk__in=list(tag_ids))
+    tags.update(post_count=Coalesce(post_count, 0))
+
+
+def cloud():
+    """
+    Returns the tags with at least one post, ordered by caption.
+
+    Each tag gets a `weight` from 1 to `CLOUD_WEIGHTS`, growing with the
+    logarithm of its post count, so a few very popular tags do not squash
+    all others to the smallest size.
+
+    Returns:
+        list: The tags, each with its `weight` attribute set.
+    """
+    tags = list(
+        Tag.objects.filter(post_count__gt=0).order_by(  # pylint: disable=no-member
+            "caption"
+        )
+    )
+    if not tags:
+        return tags
+    low = math.log(min(tag.post_count for tag in tags))
+    spread = math.log(max(tag.post_count for tag in tags)) - low
+    for tag in tags:
+        share = (math.log(tag.post_count) - low) / spread if spread else 0.5
+        tag.weight = 1 + round(share * (CLOUD_WEIGHTS - 1))
+    return tags
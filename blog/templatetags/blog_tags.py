@@ -0,0 +1,89 @@
+"""
+This module defines the template tags of the 'blog' application.
+
+Load it in a template with `{% load blog_tags %}`.
+
+Tags:
+    - `responsive_image`: Renders a post's image with `srcset`/`sizes`
+      attributes built from its renditions.
+    - `css_bundle`: Links a set of stylesheets as one fingerprinted bundle.
+"""
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from blog.media import file_url
+from my_site.assets import bundle_url_name
+
+register = template.Library()
+
+
+def _srcset(post, renditions):
+    """
+    Returns a `srcset` attribute value for the given renditions of `post`.
+    """
+    return ", ".join(f"{file_url(post, r.image)} {r.width}w" for r in renditions)
+
+
+@register.inclusion_tag("blog/includes/responsive-image.html")
+def responsive_image(post, sizes):
+    """
+    Renders the image of `post` as a `<picture>` with resized variants.
+
+    The WebP renditions are offered through a `<source>` element and the
+    JPEG renditions through the `<img>` element's own `srcset`, so browsers
+    download the smallest file that fits the rendered size. Posts without
+    renditions fall back to the original image. Use
+    `prefetch_related("renditions")` and `blog.media.resolve_image_urls` when
+    rendering many posts.
+
+    Args:
+        post (Post): The post whose image is rendered.
+        sizes (str): The `sizes` attribute describing the rendered width.
+
+    Returns:
+        dict: The context for the image template.
+    """
+    renditions = list(post.renditions.all())
+    webp = [r for r in renditions if r.format == "webp"]
+    jpeg = [r for r in renditions if r.format == "jpeg"]
+
+    if jpeg:
+        src = file_url(post, jpeg[-1].image)
+    elif post.image:
+        src = file_url(post, post.image)
+    else:
+        src = ""
+
+    return {
+        "src": src,
+        "alt": post.title,
+        "sizes": sizes,
+        "webp_srcset": _srcset(post, webp),
+        "jpeg_srcset": _srcset(post, jpeg),
+    }
+
+
+@register.simple_tag
+def css_bundle(*paths):
+    """
+    Links the stylesheets at `paths` as a single bundle.
+
+    The bundle is built by `collectstatic` (see `my_site.assets`); until it
+    exists, e.g. in development, each stylesheet is linked on its own.
+    Templates must pass the paths as literal strings, since the bundles are
+    found by scanning the template sources.
+
+    Args:
+        *paths (str): The static paths of the stylesheets, in cascade order.
+
+    Returns:
+        str: The `<link>` element(s) for the stylesheets.
+    """
+    name = bundle_url_name(paths)
+    if name is not None:
+        return format_html('<link rel="stylesheet" href="{}"/>', static(name))
+    return format_html_join(
+        "\n", '<link rel="stylesheet" href="{}"/>', ((static(p),) for p in paths)
+    )
@@ -12,20 +12,74 @@ URL patterns:
     - '/posts': Maps to the PostsView to display a list of all blog posts.
     - '/posts/<slug:slug>': Maps to the PostDetailView to display a single
       post's details.
+    - '/posts/<slug:slug>/comments': Maps to the CommentsView to load further
+      comments of a post as an HTML fragment.
+    - '/search': Maps to the SearchView to search posts by their text.
     - '/read-later': Maps to the ReadLaterView to show posts saved for later
       reading.
+    - '/feeds/<format>': Maps to the FeedView to serve the Atom ('atom') or
+      RSS ('rss') feed of all posts.
+    - '/tags': Maps to the TagCloudView to show all tags with their post
+      counts.
+    - '/tags/<caption>': Maps to the TagPostsView to list the posts with a
+      tag.
+    - '/tags/<caption>/feeds/<format>': The feed of the posts with a tag.
+    - '/authors/<int:key>/feeds/<format>': The feed of the posts by an
+      author.
+    - '/sitemap.xml': Maps to the SitemapIndexView to list the sitemap
+      shards.
+    - '/sitemap-<int:shard>.xml': Maps to the SitemapShardView to list the
+      posts of one shard.
 
 Each URL pattern also defines a named URL, which can be used for reverse URL
-resolution in templates and views.
+resolution in templates and views. When the `BLOG_ASYNC_VIEWS` setting is
+enabled, the starting page, post list, post detail and read-later URLs are
+served by the asynchronous views in `blog.async_views`.
 """
 
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Under ASGI the page views are served by their native async versions.
+page_views = async_views if settings.BLOG_ASYNC_VIEWS else views
 
 
 urlpatterns = [
-    path("", views.StartingPageView.as_view(), name="starting-page"),
-    path("posts", views.PostsView.as_view(), name="posts-page"),
-    path("posts/<slug:slug>", views.PostDetailView.as_view(), name="post-detail-page"),
-    path("read-later", views.ReadLaterView.as_view(), name="read-later"),
+    path("", page_views.StartingPageView.as_view(), name="starting-page"),
+    path("posts", page_views.PostsView.as_view(), name="posts-page"),
+    path(
+        "posts/<slug:slug>",
+        page_views.PostDetailView.as_view(),
+        name="post-detail-page",
+    ),
+    path(
+        "posts/<slug:slug>/comments",
+        views.CommentsView.as_view(),
+        name="post-comments",
+    ),
+    path("search", views.SearchView.as_view(), name="search-page"),
+    path("read-later", page_views.ReadLaterView.as_view(), name="read-later"),
+    path("feeds/<str:feed_format>", views.FeedView.as_view(), name="feed"),
+    path("tags", views.TagCloudView.as_view(), name="tags-page"),
+    # Captions may contain slashes, so the feed routes are matched first.
+    path(
+        "tags/<path:key>/feeds/<str:feed_format>",
+        views.FeedView.as_view(),
+        {"kind": "tag"},
+        name="tag-feed",
+    ),
+    path("tags/<path:caption>", views.TagPostsView.as_view(), name="tag-page"),
+    path(
+        "authors/<int:key>/feeds/<str:feed_format>",
+        views.FeedView.as_view(),
+        {"kind": "author"},
+        name="author-feed",
+    ),
+    path("sitemap.xml", views.SitemapIndexView.as_view(), name="sitemap"),
+    path(
+        "sitemap-<int:shard>.xml",
+        views.SitemapShardView.as_view(),
+        name="sitemap-shard",
+    ),
 ]
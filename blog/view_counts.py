@@ -0,0 +1,183 @@
+"""
+This module counts the views of posts without writing on the request path.
+
+Incrementing `Post.view_count` on every view would make each page view a
+write, and concurrent views of a popular post would queue up on its row
+lock. Instead:
+
+    - `record` only adds the view to an in-process buffer, under a lock
+      held for a dictionary update.
+    - A background thread in each worker process flushes the buffer every
+      `BLOG_VIEW_FLUSH_INTERVAL` seconds, adding the aggregated views of
+      many posts to their counts with one `UPDATE ... CASE` statement per
+      batch. Views that could not be written are put back into the buffer.
+    - Whatever is still buffered is flushed when the process exits.
+
+Flushing is enabled by the server entry points (`my_site.wsgi` and
+`my_site.asgi`) through `enable`. A process forked from one that enabled it,
+such as a pre-forked worker, starts its own flusher with its first view.
+Elsewhere (tests, management commands) views stay buffered until `flush` is
+called.
+
+The counts are updated with `QuerySet.update()`, which sends no signals, so
+counting views never retires the cached pages, cards or posts.
+
+Functions:
+    - `record`: Counts one view of a post.
+    - `pending`: Returns the buffered views of each post.
+    - `flush`: Adds the buffered views to the posts' counts.
+    - `enable`: Flushes the buffer periodically in this process and its
+      forks.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Case, F, PositiveBigIntegerField, Value, When
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_lock = threading.Lock()
+_pending = {}
+_enabled = False
+_flusher_pid = None
+
+
+def _interval():
+    """
+    Returns how often the buffered views are flushed, in seconds.
+    """
+    return getattr(settings, "BLOG_VIEW_FLUSH_INTERVAL", 10)
+
+
+def record(post_id):
+    """
+    Counts one view of the post with `post_id`.
+    """
+    with _lock:
+        _pending[post_id] = _pending.get(post_id, 0) + 1
+    if _enabled and _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+def pending():
+    """
+    Returns the buffered views of each post, by post ID.
+    """
+    with _lock:
+        return dict(_pending)
+
+
+def _restore(views):
+    """
+    Puts views that could not be written back into the buffer.
+    """
+    with _lock:
+        for post_id, count in views.items():
+            _pending[post_id] = _pending.get(post_id, 0) + count
+
+
+def flush(using=DEFAULT_DB_ALIAS):
+    """
+    Adds the buffered views to the posts' view counts.
+
+    Posts with the same number of new views share a `WHEN` clause, so a
+    batch of `BATCH_SIZE` posts is a single, short `UPDATE`.
+
+    Args:
+        using (str): The database alias.
+
+    Returns:
+        int: The number of views written.
+
+    Raises:
+        DatabaseError: If a batch could not be written; its views and those
+        of the later batches are buffered again.
+    """
+    with _lock:
+        views = dict(_pending)
+        _pending.clear()
+    items = sorted(views.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start : start + BATCH_SIZE]
+        by_count = {}
+        for post_id, count in batch:
+            by_count.setdefault(count, []).append(post_id)
+        increment = Case(
+            *(When(pk__in=ids, then=Value(count)) for count, ids in by_count.items()),
+            default=Value(0),
+            output_field=PositiveBigIntegerField(),
+        )
+        try:
+            Post.objects.using(using).filter(  # pylint: disable=no-member
+                pk__in=[post_id for post_id, _ in batch]
+            ).update(view_count=F("view_count") + increment)
+        except DatabaseError:
+            _restore(dict(items[start:]))
+            raise
+    return sum(views.values())
+
+
+def _flush_quietly():
+    """
+    Flushes the buffer, logging instead of raising database errors.
+    """
+    try:
+        flush()
+    except DatabaseError:
+        logger.warning("Flushing post view counts failed.", exc_info=True)
+    finally:
+        connections.close_all()
+
+
+def _run():
+    """
+    Flushes the buffer every `BLOG_VIEW_FLUSH_INTERVAL` seconds.
+    """
+    while True:
+        time.sleep(_interval())
+        _flush_quietly()
+
+
+def _start_flusher():
+    """
+    Starts the flusher thread of this process, unless it is running.
+    """
+    global _flusher_pid  # pylint: disable=global-statement
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run, name="view-count-flusher", daemon=True).start()
+
+
+def _flush_on_exit():
+    """
+    Writes the views still buffered when the process exits.
+    """
+    if _enabled and _pending:
+        _flush_quietly()
+
+
+def enable():
+    """
+    Flushes the buffered views periodically in this process and in the
+    processes forked from it.
+
+    The flusher thread is started with the first recorded view, so that a
+    pre-forking server starts one in every worker rather than in the master.
+    """
+    global _enabled  # pylint: disable=global-statement
+    _enabled = _interval() > 0
+
+
+atexit.register(_flush_on_exit)
@@ -3,17 +3,41 @@ This module contains views for the 'blog' application in the Django project.
 
 It defines various views related to blog posts, including displaying the
 starting page with recent posts, viewing all posts, detailed views of
-individual posts, and a read-later functionality to store and view posts.
+individual posts, and a read-later functionality to store and view posts,
+as well as the Atom and RSS feeds and the XML sitemaps of the posts.
 """
 
-from django.shortcuts import render
+import gzip
+import re
+
+
+from django.contrib import messages
+from django.shortcuts import get_object_or_404, render
 from django.views.generic import ListView
 from django.views import View
-from django.http import HttpResponseRedirect
+from django.http import (
+    HttpResponse,
+    HttpResponseRedirect,
+    Http404,
+    StreamingHttpResponse,
+)
 from django.urls import reverse
-
-from .models import Post
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import (
+    feeds,
+    fragment_cache,
+    object_cache,
+    page_cache,
+    read_later,
+    search,
+    sitemaps,
+    view_counts,
+)
+from .models import Comment, Post, Tag
 from .forms import CommentForm
+from .pagination import InvalidCursor, KeysetPaginator
 
 
 class StartingPageView(ListView):
@@ -22,11 +46,11 @@ class StartingPageView(ListView):
 
     This class-based view uses Django's ListView to display a list of the most
     recent posts. The queryset is customized to display only the latest 3
-    posts.
+    posts, which are served from the object cache (see `blog.object_cache`).
 
     Attributes:
         template_name (str): The template to render the list of posts.
-        model (class): The model from which to retrieve data (Post).
+        queryset (QuerySet): The posts, with only the columns of their cards.
         context_object_name (str): The name used for the posts variable in the
         template.
         ordering (list): The ordering of posts, with most recent first.
@@ -34,10 +58,12 @@ class StartingPageView(ListView):
     Methods:
         get_queryset: Limits the displayed posts to the top 3 most recent
         posts.
+        get_context_data: Adds the cached cards of the latest and the most
+        read posts.
     """
 
     template_name = "blog/index.html"
-    model = Post
+    queryset = Post.objects.for_cards()  # pylint: disable=no-member
     context_object_name = "posts"
     ordering = ["-date"]
 
@@ -46,36 +72,168 @@ class StartingPageView(ListView):
         Custom queryset method to retrieve only the top 3 recent posts.
 
         This method overrides the default queryset behavior to limit the number
-        of posts shown on the starting page to the three most recent ones.
+        of posts shown on the starting page to the three most recent ones,
+        which usually come from the in-process tier of the object cache.
 
         Returns:
-            Queryset: A limited set of the three most recent posts.
+            list: The three most recent posts.
         """
-        base_query = super().get_queryset()
-        data = base_query[:3]
-        return data
+        return object_cache.latest_posts(3)
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the rendered cards of the posts and of the most read posts, from
+        the fragment cache when possible.
+
+        Returns:
+            dict: The template context.
+        """
+        context = super().get_context_data(**kwargs)
+        context["post_cards"] = fragment_cache.render_cards(context["posts"])
+        context["most_read_cards"] = fragment_cache.render_cards(
+            object_cache.most_read(3)
+        )
+        return context
 
 
 class PostsView(ListView):
     """
-    View for rendering a list of all blog posts.
+    View for rendering a paginated list of all blog posts.
 
     This class-based view is used to display all the posts from the blog. The
-    posts are ordered by date in descending order, and the queryset does not
-    need to be customized as it retrieves all available posts.
+    posts are ordered by date in descending order and split into pages with
+    keyset (cursor) pagination over `(date, id)`, so that each page is a
+    single indexed range query no matter how deep into the archive it lies.
+    The `after` and `before` query parameters carry the cursors for the
+    older and newer neighbouring pages.
 
     Attributes:
         template_name (str): The template to render the list of all posts.
-        model (class): The model from which to retrieve data (Post).
+        queryset (QuerySet): The posts, with only the columns of their cards.
         ordering (list): The ordering of posts, with most recent first.
         context_object_name (str): The name used for the all_posts variable in
         the template.
+        paginate_by (int): The number of posts shown on each page.
+        replica_reads (bool): GET requests read from the read replicas.
+
+    Methods:
+        paginate_queryset: Splits the posts into keyset pages.
+        get_context_data: Adds the cached cards of the page's posts.
     """
 
     template_name = "blog/all-posts.html"
-    model = Post
-    ordering = ["-date"]
+    queryset = Post.objects.for_cards()  # pylint: disable=no-member
+    ordering = ["-date", "-id"]
     context_object_name = "all_posts"
+    paginate_by = 12
+    replica_reads = True
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates the queryset with cursors instead of page numbers.
+
+        This method overrides ListView's offset-based pagination. It returns
+        the same 4-tuple that ListView expects, with a `KeysetPaginator` and
+        its `KeysetPage` in place of Django's `Paginator` and `Page`.
+
+        Args:
+            queryset (QuerySet): The posts to paginate.
+            page_size (int): The number of posts per page.
+
+        Returns:
+            tuple: (paginator, page, object_list, is_paginated).
+
+        Raises:
+            Http404: If the cursor in the query string is malformed.
+        """
+        paginator = KeysetPaginator(queryset, page_size, keys=("date", "id"))
+        try:
+            page = paginator.page(
+                after=self.request.GET.get("after"),
+                before=self.request.GET.get("before"),
+            )
+        except InvalidCursor as exc:
+            raise Http404("Invalid page cursor.") from exc
+
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the rendered cards of the page's posts, from the fragment cache
+        when possible.
+
+        Returns:
+            dict: The template context.
+        """
+        context = super().get_context_data(**kwargs)
+        context["post_cards"] = fragment_cache.render_cards(context["all_posts"])
+        return context
+
+
+class TagPostsView(PostsView):
+    """
+    View for rendering a paginated list of the posts with a given tag.
+
+    This view pages through the tag's posts with the same keyset pagination
+    as `PostsView`. The tag is looked up by its unique caption.
+
+    Attributes:
+        template_name (str): The template to render the tag's posts.
+
+    Methods:
+        get_queryset: Limits the posts to those with the tag.
+        get_context_data: Adds the tag to the context.
+    """
+
+    template_name = "blog/tag-posts.html"
+
+    def get_queryset(self):
+        """
+        Returns the posts with the tag named in the URL.
+
+        Raises:
+            Http404: If there is no tag with that caption.
+        """
+        self.tag = get_object_or_404(  # pylint: disable=attribute-defined-outside-init
+            Tag, caption=self.kwargs["caption"]
+        )
+        return super().get_queryset().filter(tag=self.tag)
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the tag to the template context.
+
+        Returns:
+            dict: The template context.
+        """
+        context = super().get_context_data(**kwargs)
+        context["tag"] = self.tag
+        return context
+
+
+class TagCloudView(View):
+    """
+    View for rendering the tag cloud.
+
+    Tags are sized by their stored post counts (see `blog.tagging`), so the
+    cloud is a single query over the tags table, whose result is kept in the
+    object cache.
+
+    Methods:
+        get: Renders the tag cloud.
+    """
+
+    def get(self, request):
+        """
+        Handles GET requests to render the tag cloud.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The rendered tag cloud page.
+        """
+        return render(request, "blog/tags.html", {"tags": object_cache.tag_cloud()})
 
 
 class PostDetailView(View):
@@ -87,23 +245,28 @@ class PostDetailView(View):
     comments.
 
     Attributes:
-        None explicitly defined.
+        comments_per_page (int): The number of comments rendered inline; the
+        rest are loaded through `CommentsView`.
 
     Methods:
+        render_post: Renders the page for a post with per-session
+        placeholders.
         get: Renders the post detail page with tags, comments, and a comment
-        form.
+        form, using the rendered-page cache.
         post: Handles form submission for adding a new comment and redirects
         on success.
-        is_stored_post: Checks if the post is stored for later in the user's
-        session.
+        is_stored_post: Checks if the post is stored for later in the
+        visitor's read-later store.
     """
 
+    comments_per_page = 20
+
     def is_stored_post(self, request, post_id):
         """
-        Checks if the post is stored for later in the session.
+        Checks if the post is stored for later.
 
         This method checks whether the specified post has been marked as
-        'saved for later' in the user's session data.
+        'saved for later' in the visitor's read-later store.
 
         Args:
             request (HttpRequest): The HTTP request object.
@@ -112,21 +275,48 @@ class PostDetailView(View):
         Returns:
             bool: True if the post is stored for later, otherwise False.
         """
-        stored_posts = request.session.get("stored_posts")
-        if stored_posts is not None:
-            is_saved_for_later = post_id in stored_posts
-        else:
-            is_saved_for_later = False
+        return read_later.get_store(request).contains(post_id)
+
+    def render_post(self, post, comment_form):
+        """
+        Renders the post detail page for `post`.
+
+        The page is rendered with placeholders for the per-session parts,
+        which the caller fills in for the current request. Only the newest
+        `comments_per_page` comments are rendered; older ones are loaded on
+        demand from `CommentsView`.
 
-        return is_saved_for_later
+        Args:
+            post (Post): The post to render.
+            comment_form (CommentForm): The (possibly bound) comment form.
+
+        Returns:
+            str: The rendered page with per-session placeholders.
+        """
+        comments = KeysetPaginator(
+            post.comments.all(), self.comments_per_page, keys=("id",)
+        ).page()
+        context = {
+            "post": post,
+            "post_tags": object_cache.post_tags(post.id, sync=True),
+            "comment_form": comment_form,
+            "comments": comments,
+        }
+        return page_cache.render_page(context)
 
     def get(self, request, slug):
         """
         Handles GET requests to render a post detail page.
 
-        Retrieves the blog post based on the slug, renders the post with its
-        comments and a comment form, and also checks if the post is stored
-        for later.
+        Serves the page from the rendered-page cache when possible. On a
+        cache miss, retrieves the blog post based on the slug, renders the
+        post with its comments and a comment form and caches the result. The
+        page is shared by all visitors, so it is read from the primary
+        database rather than a possibly lagging replica, and from the current
+        versions of the cached posts and tags.
+        Either way, the read-later form and CSRF token are filled in for the
+        current session and the view is counted in the buffer of
+        `blog.view_counts`, so a cache hit does not touch the post tables.
 
         Args:
             request (HttpRequest): The HTTP request object.
@@ -135,16 +325,21 @@ class PostDetailView(View):
         Returns:
             HttpResponse: The rendered post detail page.
         """
-        post = Post.objects.get(slug=slug)  # pylint: disable=no-member
-        context = {
-            "post": post,
-            "post_tags": post.tag.all(),
-            "comment_form": CommentForm(),
-            "comments": post.comments.all().order_by("-id"),
-            "saved_for_later": self.is_stored_post(request, post.id),
-        }
-
-        return render(request, "blog/post-detail.html", context)
+        entry = page_cache.get_page(slug)
+        if entry is None:
+            post = object_cache.get_post(slug, sync=True)
+            body = self.render_post(post, CommentForm())
+            entry = page_cache.set_page(slug, post.id, body)
+
+        body = page_cache.fill_session_parts(
+            entry["body"],
+            request,
+            entry["post_id"],
+            self.is_stored_post(request, entry["post_id"]),
+        )
+        if request.method == "GET":
+            view_counts.record(entry["post_id"])
+        return HttpResponse(body)
 
     def post(self, request, slug):  # pylint: disable=no-member
         """
@@ -152,7 +347,8 @@ class PostDetailView(View):
 
         Validates the submitted comment form, saves the comment if valid, and
         redirects
-        to the post detail page.
+        to the post detail page. An invalid form is rendered back with its
+        errors and is never cached.
 
         Args:
             request (HttpRequest): The HTTP request object.
@@ -162,8 +358,8 @@ class PostDetailView(View):
             HttpResponseRedirect: Redirects to the post detail page after
             saving the comment.
         """
-        comment_form = CommentForm(request.POST)    # pylint: disable=no-member
-        post = Post.objects.get(slug=slug)          # pylint: disable=no-member
+        comment_form = CommentForm(request.POST)  # pylint: disable=no-member
+        post = Post.objects.get(slug=slug)  # pylint: disable=no-member
 
         if comment_form.is_valid():
             comment = comment_form.save(commit=False)
@@ -172,15 +368,128 @@ class PostDetailView(View):
 
             return HttpResponseRedirect(reverse("post-detail-page", args=[slug]))
 
+        body = page_cache.fill_session_parts(
+            self.render_post(post, comment_form),
+            request,
+            post.id,
+            self.is_stored_post(request, post.id),
+        )
+        return HttpResponse(body)
+
+
+class CommentsView(View):
+    """
+    View for loading further comments of a post as an HTML fragment.
+
+    The post detail page renders only the newest comments. This view returns
+    the next page of older comments as a list of `<li>` elements, followed by
+    a link to the page after that if one exists. Pages are selected with a
+    keyset cursor on the comment ID passed as the `after` query parameter.
+
+    Attributes:
+        comments_per_page (int): The number of comments in each fragment.
+
+    Methods:
+        get: Renders a fragment with the next page of comments.
+    """
+
+    comments_per_page = PostDetailView.comments_per_page
+
+    def get(self, request, slug):
+        """
+        Handles GET requests for a page of comments.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            slug (str): The slug of the post whose comments are loaded.
+
+        Returns:
+            HttpResponse: The rendered comments fragment.
+
+        Raises:
+            Http404: If the post does not exist or the cursor is malformed.
+        """
+        try:
+            post_id = object_cache.get_post(slug).id
+        except Post.DoesNotExist as exc:  # pylint: disable=no-member
+            raise Http404("No post matches the given slug.") from exc
+        paginator = KeysetPaginator(
+            Comment.objects.filter(post_id=post_id),  # pylint: disable=no-member
+            self.comments_per_page,
+            keys=("id",),
+        )
+        try:
+            comments = paginator.page(after=request.GET.get("after"))
+        except InvalidCursor as exc:
+            raise Http404("Invalid page cursor.") from exc
+
+        context = {"comments": comments, "post_slug": slug}
+        return render(request, "blog/includes/comments.html", context)
+
+
+class SearchView(View):
+    """
+    View for searching blog posts by title, excerpt and content.
+
+    The query is taken from the `q` parameter and run against the full-text
+    index of the database (see `blog.search`). Results are ordered by
+    relevance and split into numbered pages selected with the `page`
+    parameter.
+
+    Attributes:
+        results_per_page (int): The number of posts shown on each page.
+
+    Methods:
+        get: Renders a page of search results.
+    """
+
+    results_per_page = 12
+
+    def get(self, request):
+        """
+        Handles GET requests to render a page of search results.
+
+        One extra result is requested from the index to find out whether a
+        further page exists, so no separate count query is needed.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The rendered search results page.
+
+        Raises:
+            Http404: If the page number is not a positive integer.
+        """
+        query = request.GET.get("q", "").strip()
+        try:
+            page_number = int(request.GET.get("page", 1))
+        except ValueError as exc:
+            raise Http404("Invalid page number.") from exc
+        if page_number < 1:
+            raise Http404("Invalid page number.")
+
+        post_ids = search.search_posts(
+            query,
+            limit=self.results_per_page + 1,
+            offset=(page_number - 1) * self.results_per_page,
+        )
+        has_next = len(post_ids) > self.results_per_page
+        post_ids = post_ids[: self.results_per_page]
+        posts_by_id = Post.objects.for_cards().in_bulk(  # pylint: disable=no-member
+            post_ids
+        )
+        posts = [posts_by_id[i] for i in post_ids if i in posts_by_id]
+
         context = {
-            "post": post,
-            "post_tags": post.tag.all(),
-            "comment_form": comment_form,
-            "comments": post.comments.all().order_by("-id"),
-            "saved_for_later": self.is_stored_post(request, post.id),
+            "query": query,
+            "posts": posts,
+            "post_cards": fragment_cache.render_cards(posts),
+            "page_number": page_number,
+            "previous_page": page_number - 1 if page_number > 1 else None,
+            "next_page": page_number + 1 if has_next else None,
         }
-
-        return render(request, "blog/post-detail.html", context)
+        return render(request, "blog/search-results.html", context)
 
 
 class ReadLaterView(View):
@@ -188,24 +497,32 @@ class ReadLaterView(View):
     View for handling storing and retrieving posts marked as 'saved for later'.
 
     This view allows users to see a list of posts they've saved for later, and
-    also add or remove posts from that list.
+    also add or remove posts from that list. The list is kept by the
+    configured read-later store (see `blog.read_later`), which by default
+    needs no database writes.
 
     Attributes:
-        None explicitly defined.
+        replica_reads (bool): GET requests read from the read replicas.
+        full_message (str): The message shown when the list is full.
 
     Methods:
         get: Renders a list of saved posts.
-        post: Adds or removes a post from the user's saved posts list in the
-        session.
+        post: Adds or removes a post from the user's saved posts list.
     """
 
+    replica_reads = True
+    full_message = (
+        "Your read-later list is full. Remove a post from it before storing "
+        "another one."
+    )
+
     def get(self, request):
         """
         Handles GET requests to display a list of stored posts.
 
-        Retrieves the list of saved posts from the user's session and renders
-        them on a dedicated page. If no posts are saved, it provides a message
-        indicating that the list is empty.
+        Retrieves the list of saved posts from the visitor's read-later store
+        and renders them on a dedicated page. If no posts are saved, it
+        provides a message indicating that the list is empty.
 
         Args:
             request (HttpRequest): The HTTP request object.
@@ -213,17 +530,17 @@ class ReadLaterView(View):
         Returns:
             HttpResponse: The rendered stored posts page.
         """
-        stored_posts = request.session.get("stored_posts")
+        stored_posts = read_later.get_store(request).ids()
 
         context = {}
 
-        if stored_posts is None or len(stored_posts) == 0:
+        if len(stored_posts) == 0:
             context["posts"] = []
             context["has_posts"] = False
         else:
-            posts = Post.objects.filter(
+            posts = Post.objects.for_cards().filter(  # pylint: disable=no-member
                 id__in=stored_posts
-            )  # pylint: disable=no-member
+            )
             context["posts"] = posts
             context["has_posts"] = True
 
@@ -233,28 +550,136 @@ class ReadLaterView(View):
         """
         Handles POST requests to save or remove posts from the saved list.
 
-        This method updates the user's session to either add or remove a post
-        from their saved posts list and then redirects to the home page.
+        This method toggles the post in the visitor's read-later store and
+        then redirects to the home page, persisting the store on the
+        response. If the list is full, the post is not stored and the home
+        page tells the visitor so.
 
         Args:
             request (HttpRequest): The HTTP request object.
 
         Returns:
             HttpResponseRedirect: Redirects to the home page after updating
-            the session.
+            the read-later list.
         """
-        stored_posts = request.session.get("stored_posts")
+        store = read_later.get_store(request)
+        try:
+            store.toggle(int(request.POST["post_id"]))
+        except read_later.ReadLaterFull:
+            messages.warning(request, self.full_message)
 
-        if stored_posts is None:
-            stored_posts = []
+        response = HttpResponseRedirect("/")
+        store.save(response)
+        return response
 
-        post_id = int(request.POST["post_id"])
 
-        if post_id not in stored_posts:
-            stored_posts.append(post_id)
-        else:
-            stored_posts.remove(post_id)
+class FeedView(View):
+    """
+    View serving the Atom and RSS feeds of the posts.
 
-        request.session["stored_posts"] = stored_posts
+    Feeds are generated and cached by `blog.feeds`. Each response carries
+    the feed's `ETag` and `Last-Modified` headers, and requests whose
+    `If-None-Match` or `If-Modified-Since` header shows the feed is unchanged
+    get an empty 304 response, so polling aggregators cost almost nothing.
 
-        return HttpResponseRedirect("/")
+    Methods:
+        get: Returns a feed, or a 304 response if the client has it.
+    """
+
+    def get(self, request, feed_format, kind="all", key=None):
+        """
+        Handles GET requests for a feed.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            feed_format (str): "atom" or "rss".
+            kind (str): "all", "tag" or "author".
+            key (str): The caption of the tag or the ID of the author.
+
+        Returns:
+            HttpResponse: The feed, or an empty 304 response.
+
+        Raises:
+            Http404: If the format is unknown or the tag or author does not
+            exist.
+        """
+        feed = feeds.get_feed(request, feed_format, kind, key)
+        response = get_conditional_response(
+            request, etag=feed["etag"], last_modified=feed["last_modified"]
+        )
+        if response is None:
+            response = HttpResponse(feed["body"], content_type=feed["content_type"])
+        response["ETag"] = feed["etag"]
+        response["Last-Modified"] = http_date(feed["last_modified"])
+        return response
+
+
+class SitemapIndexView(View):
+    """
+    View serving the sitemap index, which links the sitemap shards.
+
+    Methods:
+        get: Streams the sitemap index.
+    """
+
+    def get(self, request):
+        """
+        Handles GET requests for the sitemap index.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            StreamingHttpResponse: The XML of the sitemap index.
+        """
+        return StreamingHttpResponse(
+            sitemaps.index_chunks(request), content_type="application/xml"
+        )
+
+
+class SitemapShardView(View):
+    """
+    View serving one shard of the sitemap.
+
+    Shards are generated and cached by `blog.sitemaps`. A cached shard is
+    sent in its stored gzip-compressed form to clients that accept it; an
+    uncached shard is streamed while it is generated.
+
+    Methods:
+        get: Returns or streams a sitemap shard.
+    """
+
+    accepts_gzip = re.compile(r"\bgzip\b")
+
+    def get(self, request, shard):
+        """
+        Handles GET requests for a sitemap shard.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            shard (int): The number of the shard, starting from 1.
+
+        Returns:
+            HttpResponse: The XML of the shard.
+
+        Raises:
+            Http404: If the shard does not exist.
+        """
+        base_url = request.build_absolute_uri("/")[:-1]
+        body = sitemaps.get_cached_shard(shard, base_url)
+        if body is None:
+            if not 1 <= shard <= sitemaps.shard_count():
+                raise Http404("No such sitemap.")
+            return StreamingHttpResponse(
+                sitemaps.shard_chunks(shard, base_url), content_type="application/xml"
+            )
+
+        if self.accepts_gzip.search(request.headers.get("Accept-Encoding", "")):
+            response = HttpResponse(body, content_type="application/xml")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(
+                gzip.decompress(body), content_type="application/xml"
+            )
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
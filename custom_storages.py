@@ -1,10 +1,295 @@
+"""
+This module defines the file storage classes used for static and media files.
+
+Static and media files live in S3 in production. Building a URL for an S3
+object (and signing it, with query string authentication) happens on every
+`{{ post.image.url }}`, so the storages keep the URLs they build in a small
+in-process cache. Entries expire before a signed URL would, and the cache is
+bounded so that the least recently used URLs are evicted first.
+
+Calls into the storages are timed as part of sampled requests (see
+`my_site.instrumentation`).
+
+Classes:
+    - `InstrumentedStorageMixin`: Times storage calls for the performance
+      instrumentation.
+    - `URLCache`: A thread-safe, bounded, TTL-aware URL cache.
+    - `CachedURLMixin`: Adds URL caching and the batch `urls()` API to a
+      storage class.
+    - `S3CachedURLMixin`: URL caching that respects the expiry of signed S3
+      URLs.
+    - `CSSBundleMixin`: Builds the CSS bundles (see `my_site.assets`) when
+      `collectstatic` runs.
+    - `StaticFileStorage`: S3 storage for static files.
+    - `MediaFileStorage`: S3 storage for uploaded media files.
+    - `LocalMediaFileStorage`: Local filesystem stand-in for
+      `MediaFileStorage`, for development and tests without AWS.
+    - `LocalStaticFileStorage`: Local filesystem stand-in for
+      `StaticFileStorage`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
 from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from my_site import assets, instrumentation
+
+# Bundles are named after their content, so they can be cached for good.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class InstrumentedStorageMixin:
+    """
+    Storage mixin that times file operations and URL lookups as `storage`
+    time of the current request.
+    """
+
+    def _open(self, name, mode="rb"):
+        with instrumentation.timer("storage"):
+            return super()._open(name, mode)
+
+    def _save(self, name, content):
+        with instrumentation.timer("storage"):
+            return super()._save(name, content)
+
+    def exists(self, name):
+        with instrumentation.timer("storage"):
+            return super().exists(name)
+
+    def delete(self, name):
+        with instrumentation.timer("storage"):
+            return super().delete(name)
+
+    def size(self, name):
+        with instrumentation.timer("storage"):
+            return super().size(name)
+
+    def url(self, name, *args, **kwargs):
+        with instrumentation.timer("storage"):
+            return super().url(name, *args, **kwargs)
+
+
+class URLCache:
+    """
+    A bounded, thread-safe cache of file URLs with per-entry expiry.
+
+    Entries are kept in least-recently-used order. Expired entries are
+    treated as misses and removed when found; when the cache is full the
+    least recently used entry makes room for the new one.
+
+    Attributes:
+        max_entries (int): The maximum number of URLs kept.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that were not.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names, now=None):
+        """
+        Returns a dict of the cached, unexpired URLs for `names`.
+        """
+        now = time.monotonic() if now is None else now
+        found = {}
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(name)
+                if entry is None:
+                    self.misses += 1
+                elif entry[0] <= now:
+                    del self._entries[name]
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(name)
+                    found[name] = entry[1]
+                    self.hits += 1
+        return found
+
+    def set_many(self, urls, ttl, now=None):
+        """
+        Stores the `{name: url}` mapping `urls` for `ttl` seconds.
+        """
+        if ttl <= 0:
+            return
+        expires = (time.monotonic() if now is None else now) + ttl
+        with self._lock:
+            for name, url in urls.items():
+                self._entries[name] = (expires, url)
+                self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every cached URL.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedURLMixin:
+    """
+    Storage mixin that caches the URLs built by `url()`.
+
+    Only plain `url(name)` calls are cached; calls with extra arguments (such
+    as a custom expiry) always go to the underlying storage. The batch
+    `urls(names)` method answers as many names as possible from the cache and
+    builds the rest, so a listing page resolves all of its images in one
+    call.
+
+    Attributes:
+        url_cache_ttl (int): How long a URL is cached, in seconds.
+        url_cache_max_entries (int): The maximum number of cached URLs.
+    """
+
+    url_cache_ttl = getattr(settings, "STORAGE_URL_CACHE_TTL", 300)
+    url_cache_max_entries = getattr(settings, "STORAGE_URL_CACHE_MAX_ENTRIES", 10000)
+
+    @cached_property
+    def url_cache(self):
+        """
+        Returns the URL cache of this storage instance.
+        """
+        return URLCache(self.url_cache_max_entries)
+
+    def url_ttl(self):
+        """
+        Returns how long URLs built by this storage may be cached.
+        """
+        return self.url_cache_ttl
+
+    def url(self, name, *args, **kwargs):
+        """
+        Returns the URL of `name`, from the cache when possible.
+        """
+        if args or any(value is not None for value in kwargs.values()):
+            return super().url(name, *args, **kwargs)
+        return self.urls([name])[name]
+
+    def urls(self, names):
+        """
+        Returns a `{name: url}` dict for all of `names`.
+
+        Args:
+            names (iterable): The names of the stored files.
+
+        Returns:
+            dict: The URL of each name.
+        """
+        names = list(dict.fromkeys(names))
+        with instrumentation.timer("storage"):
+            found = self.url_cache.get_many(names)
+            missing = {
+                name: super(CachedURLMixin, self).url(name)
+                for name in names
+                if name not in found
+            }
+            self.url_cache.set_many(missing, self.url_ttl())
+        found.update(missing)
+        return found
+
+
+class S3CachedURLMixin(CachedURLMixin):
+    """
+    URL caching for S3 storages that never outlives a signed URL.
+
+    With query string authentication each URL is only valid for
+    `querystring_expire` seconds, so cached URLs are dropped a safety margin
+    before they would stop working for the browser.
+
+    Attributes:
+        url_expiry_margin (int): Seconds of validity a cached signed URL
+        keeps when it is handed out at the latest.
+    """
+
+    url_expiry_margin = 60
+
+    def url_ttl(self):
+        ttl = super().url_ttl()
+        if self.querystring_auth:
+            ttl = min(ttl, self.querystring_expire - self.url_expiry_margin)
+        return ttl
+
+
+class CSSBundleMixin:
+    """
+    Static storage mixin that builds the CSS bundles after `collectstatic`
+    has copied the individual files.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        """
+        Post-processes the collected files, then builds the CSS bundles.
+
+        Yields:
+            tuple: `(original_name, processed_name, processed)` for each
+            post-processed file, as `collectstatic` expects.
+        """
+        parent = getattr(super(), "post_process", None)
+        if parent is not None:
+            yield from parent(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in assets.build_bundles(self):
+            yield name, name, True
+
+
+class StaticFileStorage(
+    InstrumentedStorageMixin, CSSBundleMixin, S3CachedURLMixin, S3Boto3Storage
+):
+    """
+    S3 storage for static files.
+
+    CSS bundles are uploaded with far-future caching headers, and their
+    precompressed siblings with the matching `Content-Encoding`.
+    """
 
-class StaticFileStorage(S3Boto3Storage):
     location = settings.STATICFILES_FOLDER
 
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if name.startswith(f"{assets.BUNDLE_DIR}/"):
+            params["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+            if name.endswith(".gz"):
+                params.update(ContentEncoding="gzip", ContentType="text/css")
+            elif name.endswith(".br"):
+                params.update(ContentEncoding="br", ContentType="text/css")
+        return params
+
 
-class MediaFileStorage(S3Boto3Storage):
+class MediaFileStorage(InstrumentedStorageMixin, S3CachedURLMixin, S3Boto3Storage):
     location = settings.MEDIAFILES_FOLDER
+
+
+class LocalMediaFileStorage(
+    InstrumentedStorageMixin, CachedURLMixin, FileSystemStorage
+):
+    """
+    Local filesystem stand-in for `MediaFileStorage`.
+
+    Stores media under `MEDIA_ROOT` and serves it from `MEDIA_URL`, with the
+    same URL cache and batch API as the S3 storage, so it can replace it in
+    development and tests.
+    """
+
+
+class LocalStaticFileStorage(
+    InstrumentedStorageMixin, CSSBundleMixin, StaticFilesStorage
+):
+    """
+    Local filesystem stand-in for `StaticFileStorage`.
+
+    Collects static files, including the CSS bundles, into `STATIC_ROOT`,
+    from where the web server serves them.
+    """
@@ -3,6 +3,9 @@ ASGI config for my_site project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The blog pages are served by their asynchronous views (see
+`blog.async_views`) unless `BLOG_ASYNC_VIEWS` is set to "false".
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +15,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "my_site.settings")
+os.environ.setdefault("BLOG_ASYNC_VIEWS", "true")
 
 application = get_asgi_application()
+
+# Post views are buffered and written in batches by a background thread.
+from blog import view_counts  # pylint: disable=wrong-import-position
+
+view_counts.enable()
@@ -0,0 +1,203 @@
+"""
+This module implements the CSS bundling pipeline of the site.
+
+Each page template declares the stylesheets it needs in its `css_files`
+block with the `css_bundle` template tag, e.g.
+
+    {% css_bundle "app.css" "blog/post.css" "blog/all-posts.css" %}
+
+When `collectstatic` runs, the static files storage (see
+`custom_storages.CSSBundleMixin`) calls `build_bundles`, which finds every
+`css_bundle` tag in the project's templates, concatenates and minifies the
+listed files, and saves the result under a content-hashed name in
+`bundles/`, together with precompressed `.gz` and `.br` siblings. A local
+manifest file (the `CSS_BUNDLE_MANIFEST` setting) maps each set of
+stylesheets to its bundle, so looking a bundle up never needs a request to
+the storage.
+
+At render time the tag looks the set up in the manifest and links the single
+fingerprinted bundle, which can be cached by browsers and the CDN forever.
+When no bundle exists for the set (e.g. in development before running
+`collectstatic`), the individual stylesheets are linked instead.
+
+Functions:
+    - `bundle_key`: Returns the manifest key of a list of stylesheets.
+    - `minify_css`: Minifies a stylesheet.
+    - `find_bundles`: Finds the stylesheet sets declared in templates.
+    - `build_bundles`: Builds and saves all bundles into a storage.
+    - `bundle_url_name`: Returns the static name of a built bundle.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is optional
+    brotli = None
+
+BUNDLE_DIR = "bundles"
+
+CSS_BUNDLE_TAG = re.compile(r"{%\s*css_bundle\s+(.*?)\s*%}")
+QUOTED = re.compile(r"""["']([^"']+)["']""")
+# An `@import` rule; its URL may contain semicolons, e.g. Google Fonts'
+# `wght@400;700`.
+IMPORT_RULE = re.compile(
+    r"""@import\s+(?:url\(\s*(?:"[^"]*"|'[^']*'|[^)]*)\s*\)|"[^"]*"|'[^']*')[^;]*;"""
+)
+
+_manifest_cache = {}
+
+
+def manifest_path():
+    """
+    Returns the path of the local bundle manifest file.
+    """
+    return Path(
+        getattr(
+            settings,
+            "CSS_BUNDLE_MANIFEST",
+            Path(settings.STATIC_ROOT) / "css-bundles.json",
+        )
+    )
+
+
+def bundle_key(paths):
+    """
+    Returns the manifest key of the ordered list of stylesheet `paths`.
+    """
+    return hashlib.sha1("\n".join(paths).encode()).hexdigest()[:12]
+
+
+def minify_css(css):
+    """
+    Minifies a stylesheet by removing comments and redundant whitespace.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def _template_dirs():
+    """
+    Yields the project and application template directories.
+    """
+    for engine in settings.TEMPLATES:
+        for directory in engine.get("DIRS", []):
+            yield Path(directory)
+    for app_config in apps.get_app_configs():
+        yield Path(app_config.path) / "templates"
+
+
+def find_bundles():
+    """
+    Finds the stylesheet sets declared with `css_bundle` in templates.
+
+    Returns:
+        list: The distinct sets, each an ordered tuple of static paths.
+    """
+    bundles = {}
+    for directory in _template_dirs():
+        if not directory.is_dir():
+            continue
+        for template in sorted(directory.rglob("*.html")):
+            for match in CSS_BUNDLE_TAG.finditer(template.read_text(encoding="utf-8")):
+                paths = tuple(QUOTED.findall(match.group(1)))
+                if paths:
+                    bundles[paths] = True
+    return list(bundles)
+
+
+def _concatenate(paths):
+    """
+    Returns the minified concatenation of the stylesheets at `paths`.
+
+    `@import` rules are only valid at the start of a stylesheet, so they are
+    moved to the start of the bundle.
+    """
+    imports = []
+    bodies = []
+    for path in paths:
+        source = finders.find(path)
+        if source is None:
+            raise FileNotFoundError(f"Static file {path!r} was not found.")
+        css = Path(source).read_text(encoding="utf-8")
+        imports.extend(IMPORT_RULE.findall(css))
+        bodies.append(IMPORT_RULE.sub("", css))
+    return minify_css("\n".join(imports + bodies))
+
+
+def _save(storage, name, content):
+    """
+    Saves `content` under exactly `name` in `storage`, replacing any file.
+    """
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def build_bundles(storage):
+    """
+    Builds every bundle declared in the templates and saves it to `storage`.
+
+    Each bundle is saved as `bundles/<key>.<hash>.css` with `.gz` and, when
+    Brotli is installed, `.br` siblings. The local manifest is written last,
+    so pages keep linking the previous bundles until all new ones exist.
+
+    Args:
+        storage (Storage): The static files storage to write to.
+
+    Returns:
+        list: The names of the saved files.
+    """
+    manifest = {}
+    saved = []
+    for paths in find_bundles():
+        css = _concatenate(paths).encode()
+        key = bundle_key(paths)
+        name = f"{BUNDLE_DIR}/{key}.{hashlib.md5(css).hexdigest()[:12]}.css"
+
+        _save(storage, name, css)
+        _save(storage, f"{name}.gz", gzip.compress(css, 9, mtime=0))
+        saved.extend([name, f"{name}.gz"])
+        if brotli is not None:
+            _save(storage, f"{name}.br", brotli.compress(css))
+            saved.append(f"{name}.br")
+        manifest[key] = name
+
+    path = manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    _manifest_cache.clear()
+    return saved
+
+
+def _load_manifest():
+    """
+    Returns the bundle manifest, reading it once per process.
+    """
+    path = manifest_path()
+    if path not in _manifest_cache:
+        try:
+            _manifest_cache[path] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _manifest_cache[path] = {}
+    return _manifest_cache[path]
+
+
+def bundle_url_name(paths):
+    """
+    Returns the static name of the bundle for `paths`, or None if no bundle
+    was built for them.
+    """
+    return _load_manifest().get(bundle_key(paths))
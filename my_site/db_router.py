@@ -0,0 +1,239 @@
+"""
+This module routes the read-only page views to read replicas.
+
+With replicas configured (the `DATABASE_REPLICAS` setting, see
+`my_site.settings`), the posts shown by the post list (and tag pages) and
+the read-later page are read from a randomly chosen replica, taking load
+off the primary database. Everything else uses the primary (`default`):
+
+    - Only `GET` and `HEAD` requests to views declaring `replica_reads =
+      True` are routed to replicas; comment `POST`s, the admin and all other
+      views are not.
+    - Sessions, users and the other Django contrib apps are always read from
+      the primary, since replicas may lag behind their writes.
+    - Once a request writes anything (or locks rows with
+      `select_for_update()`), its later reads stick to the primary.
+    - After a request that wrote, the visitor's reads stay on the primary
+      for `DATABASE_REPLICA_PIN_SECONDS` (a short-lived cookie), so their
+      changes show on the next pages they visit even while the replicas
+      catch up.
+    - Reads that build a shared cache entry (`primary_reads`), such as a
+      post card or an object of `blog.object_cache`, use the primary: a
+      lagging replica would otherwise put stale content into the cache,
+      where every visitor would be served it until the entry expires. For
+      the same reason, the starting page and the post detail page, whose
+      reads all build cache entries, read the primary.
+
+The routing state of a request is held in a context variable, so it follows
+the request into the `sync_to_async` threads of the async views.
+
+Classes:
+    - `ReplicaRouter`: The database router.
+    - `ReplicaRoutingMiddleware`: Enables replica reads for the page views.
+
+Functions:
+    - `replica_aliases`: Returns the aliases of the configured replicas.
+    - `choose_replica`: Returns the replica a read is sent to.
+    - `replica_reads`: Routes the reads of a block of code to replicas.
+    - `primary_reads`: Sends the reads of a block of code to the primary.
+"""
+
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "db_primary"
+
+# Models of these apps are always read from the primary.
+PRIMARY_APPS = frozenset({"admin", "auth", "contenttypes", "sessions"})
+
+_current = contextvars.ContextVar("replica_routing", default=None)
+
+
+class _Routing:
+    """
+    The routing state of one request.
+    """
+
+    def __init__(self):
+        self.replicas = False
+        self.wrote = False
+
+
+def replica_aliases():
+    """
+    Returns the database aliases of the configured read replicas.
+    """
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def choose_replica():
+    """
+    Returns the alias of the replica a read is sent to.
+    """
+    return random.choice(replica_aliases())
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """
+    Routes the reads of the enclosed block to replicas, e.g. in scripts.
+
+    Yields:
+        _Routing: The routing state of the block.
+    """
+    routing = _Routing()
+    routing.replicas = True
+    token = _current.set(routing)
+    try:
+        yield routing
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """
+    Sends the reads of the enclosed block to the primary, e.g. while a
+    shared cache entry is built from them.
+
+    Writes within the block still keep the request's later reads on the
+    primary.
+    """
+    routing = _current.get()
+    if routing is None or not routing.replicas:
+        yield
+        return
+    routing.replicas = False
+    try:
+        yield
+    finally:
+        routing.replicas = True
+
+
+class ReplicaRouter:
+    """
+    Routes the reads of replica-enabled requests to read replicas and all
+    other queries to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        # pylint: disable=unused-argument
+        """
+        Returns a replica for reads of replica-enabled requests, else None
+        (the primary).
+        """
+        routing = _current.get()
+        if (
+            routing is None
+            or not routing.replicas
+            or routing.wrote
+            or not replica_aliases()
+            or model._meta.app_label in PRIMARY_APPS  # pylint: disable=protected-access
+        ):
+            return None
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        # pylint: disable=unused-argument
+        """
+        Returns the primary, and keeps the request's later reads there.
+        """
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # pylint: disable=unused-argument
+        """
+        Allows relations between objects read from the primary or replicas,
+        which hold the same data.
+        """
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        # pylint: disable=protected-access
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # pylint: disable=unused-argument
+        """
+        Leaves replicas to replication: migrations only run on the primary.
+        """
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Middleware enabling replica reads for the views that declare
+    `replica_reads = True`.
+
+    Works with both synchronous and asynchronous request handling.
+
+    Attributes:
+        pin_seconds (int): How long a visitor's reads stay on the primary
+        after a request of theirs wrote.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        routing = _Routing()
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin(response, routing)
+
+    async def __acall__(self, request):
+        routing = _Routing()
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin(response, routing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # pylint: disable=unused-argument
+        """
+        Sends the reads of safe requests to replica-enabled views to the
+        replicas, unless the visitor wrote recently.
+        """
+        routing = _current.get()
+        view_class = getattr(view_func, "view_class", None)
+        if (
+            routing is not None
+            and request.method in ("GET", "HEAD")
+            and getattr(view_class, "replica_reads", False)
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            routing.replicas = True
+
+    def pin(self, response, routing):
+        """
+        Keeps the visitor's reads on the primary for a while after a write.
+        """
+        if routing.wrote and self.pin_seconds and replica_aliases():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax"
+            )
+        return response
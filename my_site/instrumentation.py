@@ -0,0 +1,253 @@
+"""
+This module implements per-request performance instrumentation.
+
+`PerformanceMiddleware` measures a sample of requests (the
+`PERF_SAMPLE_RATE` setting, from 0 to 1) and breaks their time down into:
+
+    - `db`: SQL queries, counted and timed by a database execute wrapper.
+    - `tpl`: Template rendering, timed by the `InstrumentedDjangoTemplates`
+      template backend.
+    - `storage`: Calls into the file storages of `custom_storages`, timed by
+      `custom_storages.InstrumentedStorageMixin`.
+    - `total`: The whole request as seen by the middleware.
+
+The breakdown is logged as one JSON line on the `my_site.performance`
+logger and, with `PERF_SERVER_TIMING` enabled, returned in a `Server-Timing`
+header (shown by browser developer tools). The header is off by default, as
+it exposes backend timings to any client.
+
+Measurements are collected in a `RequestTimings` object held in a context
+variable, so they follow the request into `sync_to_async` threads. Requests
+that are not sampled only pay for a context variable lookup per query,
+template and storage call.
+
+Classes:
+    - `RequestTimings`: The measurements of one request.
+    - `InstrumentedTemplate`: A Django template that times its rendering.
+    - `InstrumentedDjangoTemplates`: The Django template backend returning
+      instrumented templates.
+    - `PerformanceMiddleware`: Measures, reports and logs sampled requests.
+
+Functions:
+    - `timer`: Times a block of code as part of the current request.
+    - `install_sql_wrapper`: Adds the query timer to a database connection.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger("my_site.performance")
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    The measurements of one request.
+
+    Durations are accumulated in seconds per kind (`db`, `tpl`, `storage`),
+    together with the number of calls. Nested timers of the same kind (e.g.
+    a storage call made by another storage call) are only counted once.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.calls = {}
+        self._depth = {}
+
+    def add(self, kind, seconds):
+        """
+        Adds one call of `kind` that took `seconds`.
+        """
+        self.durations[kind] = self.durations.get(kind, 0.0) + seconds
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    @contextlib.contextmanager
+    def measure(self, kind):
+        """
+        Times the enclosed block as one call of `kind`, unless it is nested
+        in another block of the same kind.
+        """
+        depth = self._depth.get(kind, 0)
+        self._depth[kind] = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth[kind] = depth
+            if not depth:
+                self.add(kind, time.perf_counter() - start)
+
+    def elapsed(self):
+        """
+        Returns the seconds since the request started.
+        """
+        return time.perf_counter() - self.started
+
+
+def timer(kind):
+    """
+    Returns a context manager timing a block as part of the current request.
+
+    Outside a sampled request this is a no-op.
+    """
+    timings = _current.get()
+    if timings is None:
+        return contextlib.nullcontext()
+    return timings.measure(kind)
+
+
+def _time_query(execute, sql, params, many, context):
+    # pylint: disable=too-many-arguments
+    """
+    Database execute wrapper that times queries of sampled requests.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    with timings.measure("db"):
+        return execute(sql, params, many, context)
+
+
+def install_sql_wrapper(connection, **kwargs):
+    # pylint: disable=unused-argument
+    """
+    Adds the query timer to `connection` if it is not installed yet.
+
+    Connections are per thread, so the wrapper is installed whenever a
+    connection is created (via the `connection_created` signal) rather than
+    around each request; that way it also sees the queries that async views
+    run in `sync_to_async` threads.
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(install_sql_wrapper)
+
+
+class InstrumentedTemplate(DjangoTemplate):
+    """
+    A Django template whose rendering is timed as part of the request.
+    """
+
+    def render(self, context=None, request=None):
+        with timer("tpl"):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, returning templates that time their
+    rendering. Templates included from other templates are rendered as part
+    of their parent and are not timed separately.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class PerformanceMiddleware:
+    """
+    Middleware measuring where the time of sampled requests goes.
+
+    Works with both synchronous and asynchronous request handling.
+
+    Attributes:
+        sample_rate (float): The share of requests measured, from 0 to 1.
+        server_timing (bool): Whether to add the `Server-Timing` header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    # The `Server-Timing` metric names, in header order.
+    METRICS = (("db", "SQL"), ("tpl", "Templates"), ("storage", "Storage"))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, "PERF_SAMPLE_RATE", 0.05))
+        self.server_timing = getattr(settings, "PERF_SERVER_TIMING", False)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        """
+        Returns True if the current request should be measured.
+        """
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        for connection in connections.all(initialized_only=True):
+            install_sql_wrapper(connection)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, timings)
+        return response
+
+    def report(self, request, response, timings):
+        """
+        Adds the `Server-Timing` header to `response` and logs the
+        measurements of `request`.
+        """
+        total = timings.elapsed()
+        if self.server_timing:
+            metrics = [
+                f'{name};dur={timings.durations[name] * 1000:.1f};desc="{desc}"'
+                for name, desc in self.METRICS
+                if name in timings.durations
+            ]
+            metrics.append(f"total;dur={total * 1000:.1f}")
+            response["Server-Timing"] = ", ".join(metrics)
+
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 3),
+        }
+        for name, _ in self.METRICS:
+            record[f"{name}_ms"] = round(timings.durations.get(name, 0.0) * 1000, 3)
+            record[f"{name}_calls"] = timings.calls.get(name, 0)
+        logger.info(json.dumps(record), extra={"performance": record})
@@ -0,0 +1,541 @@
+"""
+This module implements the in-process metrics of the site and their
+Prometheus endpoint.
+
+`MetricsMiddleware` counts every request and records its latency in a
+fixed-bucket histogram, labelled with the name of the matched URL pattern
+(`starting-page`, `posts-page`, ...; every admin page is labelled `admin`).
+Unlike the sampled logs of `my_site.instrumentation`, these aggregates are
+cheap enough to keep for every request.
+
+Recording never takes a lock: each thread updates its own shard of every
+metric, and the shards are only summed when the metrics are collected.
+
+With several pre-forked worker processes each worker only sees its own
+requests. When the `METRICS_MULTIPROC_DIR` setting names a directory, every
+worker periodically writes a snapshot of its metrics there (at most every
+`METRICS_FLUSH_INTERVAL` seconds, and on exit), and the endpoint adds up the
+snapshots of all workers, so any worker answers for all of them. When a
+worker exits, the master folds its snapshots into a single file kept for all
+retired workers (`retire_snapshots`), so counters never go backwards and
+recycled workers do not leave a file each behind; the directory is cleared
+(`clear_snapshots`) when the whole server restarts.
+
+The endpoint (`metrics_view`) is internal: it answers requests bearing the
+`METRICS_TOKEN` and direct (not proxied) requests from the addresses in
+`METRICS_ALLOWED_IPS`, and returns 404 to everyone else.
+
+Classes:
+    - `Counter`: A monotonically increasing, labelled counter.
+    - `Histogram`: A labelled histogram with fixed buckets.
+    - `Registry`: A set of metrics that can be snapshotted and rendered.
+    - `MetricsMiddleware`: Records the requests of every view.
+
+Functions:
+    - `render_prometheus`: Renders a snapshot in the Prometheus text format.
+    - `collect`: Returns the metrics of this process, or of all workers.
+    - `retire_snapshots`: Folds the snapshots of an exited worker into those
+      of all retired workers.
+    - `clear_snapshots`: Removes the snapshots of all workers.
+    - `metrics_view`: The Prometheus endpoint.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The snapshot adding up the metrics of all exited workers.
+RETIRED_FILE = "retired.json"
+
+
+class _Shards:
+    """
+    Per-thread cells of a metric.
+
+    Each thread gets its own cell the first time it records a value, so
+    recording never contends with other threads. The lock is only taken
+    once per thread, to register its cell.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def cell(self):
+        """
+        Returns the cell of the current thread.
+        """
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._factory()
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def cells(self):
+        """
+        Returns the cells of all threads.
+        """
+        with self._lock:
+            return list(self._cells)
+
+
+class Counter:
+    """
+    A monotonically increasing counter with labels.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The metric description.
+        labelnames (tuple): The names of the labels.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards(dict)
+
+    def inc(self, *labels, amount=1):
+        """
+        Increments the counter for the label values `labels`.
+        """
+        cell = self._shards.cell()
+        cell[labels] = cell.get(labels, 0) + amount
+
+    def snapshot(self):
+        """
+        Returns `[labels, value]` pairs summed over all threads.
+        """
+        totals = {}
+        for cell in self._shards.cells():
+            for labels, value in cell.copy().items():
+                totals[labels] = totals.get(labels, 0) + value
+        return [[list(labels), value] for labels, value in totals.items()]
+
+
+class Histogram:
+    """
+    A histogram with fixed bucket bounds and labels.
+
+    Each series keeps a count per bucket (plus one for values above the
+    last bound) followed by the sum of the observed values.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The metric description.
+        labelnames (tuple): The names of the labels.
+        buckets (tuple): The upper bounds of the buckets, ascending.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._shards = _Shards(dict)
+
+    def observe(self, value, *labels):
+        """
+        Records `value` for the label values `labels`.
+        """
+        cell = self._shards.cell()
+        series = cell.get(labels)
+        if series is None:
+            series = cell[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def snapshot(self):
+        """
+        Returns `[labels, series]` pairs summed over all threads.
+        """
+        totals = {}
+        for cell in self._shards.cells():
+            for labels, series in cell.copy().items():
+                total = totals.setdefault(labels, [0] * len(series))
+                for index, value in enumerate(list(series)):
+                    total[index] += value
+        return [[list(labels), series] for labels, series in totals.items()]
+
+
+class Registry:
+    """
+    A set of metrics.
+
+    Snapshots are JSON-serialisable dicts keyed by metric name, so they can
+    be written to disk by one worker and merged by another.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._pid = None
+        self._file_name = None
+
+    def register(self, metric):
+        """
+        Adds `metric` to the registry and returns it.
+        """
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        """
+        Returns the current values of all metrics.
+        """
+        return {
+            name: {
+                "kind": metric.kind,
+                "help": metric.help,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", [])),
+                "samples": metric.snapshot(),
+            }
+            for name, metric in self.metrics.items()
+        }
+
+    def file_path(self, directory):
+        """
+        Returns the snapshot file of this process in `directory`.
+
+        The name is chosen in the process itself, so workers forked from a
+        server that imported this module never share a file.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file_name = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+        return os.path.join(directory, self._file_name)
+
+    def flush(self, directory, interval=0):
+        """
+        Writes a snapshot to `directory` unless one was written less than
+        `interval` seconds ago or another thread is writing one.
+        """
+        now = time.monotonic()
+        if now - self._last_flush < interval:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = self.file_path(directory)
+            temporary = f"{path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as snapshot:
+                json.dump(self.snapshot(), snapshot)
+            os.replace(temporary, path)
+            self._last_flush = now
+        finally:
+            self._flush_lock.release()
+
+
+def merge_snapshots(snapshots):
+    """
+    Adds up several snapshots of the same metrics.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                if isinstance(value, list):
+                    total = target["samples"].setdefault(key, [0] * len(value))
+                    for index, item in enumerate(value):
+                        total[index] += item
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+    for metric in merged.values():
+        metric["samples"] = [
+            [list(labels), value] for labels, value in metric["samples"].items()
+        ]
+    return merged
+
+
+def _escape(value):
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    """
+    Formats a label set, e.g. `{view="posts-page",le="0.1"}`.
+    """
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    """
+    Formats a sample value.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot):
+    """
+    Renders a snapshot in the Prometheus text exposition format (0.0.4).
+    """
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labelnames"]
+        for labels, value in sorted(metric["samples"]):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            bounds = [*metric["buckets"], float("inf")]
+            for bound, count in zip(bounds, value[:-1]):
+                cumulative += count
+                le = (("le", _number(bound)),)
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(
+    Counter(
+        "blog_http_requests_total",
+        "HTTP requests by URL name, method and status code.",
+        ("view", "method", "status"),
+    )
+)
+LATENCY = REGISTRY.register(
+    Histogram(
+        "blog_http_request_duration_seconds",
+        "HTTP request latency by URL name, in seconds.",
+        ("view",),
+    )
+)
+
+
+def _multiproc_dir():
+    """
+    Returns the directory shared by the worker processes, if configured.
+    """
+    return getattr(settings, "METRICS_MULTIPROC_DIR", None)
+
+
+def collect(registry=REGISTRY):
+    """
+    Returns a snapshot of the metrics of all worker processes.
+
+    Without `METRICS_MULTIPROC_DIR` only this process is reported. With it,
+    the live metrics of this process are merged with the latest snapshots
+    written by all other workers.
+    """
+    snapshots = [registry.snapshot()]
+    directory = _multiproc_dir()
+    if directory and os.path.isdir(directory):
+        own = os.path.basename(registry.file_path(directory))
+        for entry in os.scandir(directory):
+            if entry.name == own or not entry.name.endswith(".json"):
+                continue
+            snapshot = _read_snapshot(entry.path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return merge_snapshots(snapshots)
+
+
+def _read_snapshot(path):
+    """
+    Returns the snapshot stored at `path`, or None if it cannot be read.
+    """
+    try:
+        with open(path, encoding="utf-8") as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        return None
+
+
+def retire_snapshots(pid, directory=None):
+    """
+    Folds the snapshots of the exited worker `pid` into `RETIRED_FILE`.
+
+    Called by the master once a worker has exited, so that the directory
+    holds one file per live worker plus one for all retired ones, instead of
+    growing with every recycled worker.
+
+    Args:
+        pid (int): The process ID of the exited worker.
+        directory (str): The snapshot directory; defaults to
+        `METRICS_MULTIPROC_DIR`.
+    """
+    directory = directory or _multiproc_dir()
+    if not directory or not os.path.isdir(directory):
+        return
+    prefix = f"{pid}-"
+    paths = [
+        entry.path
+        for entry in os.scandir(directory)
+        if entry.name.startswith(prefix) and entry.name.endswith((".json", ".json.tmp"))
+    ]
+    if not paths:
+        return
+
+    retired = os.path.join(directory, RETIRED_FILE)
+    snapshots = []
+    for path in [retired, *paths]:
+        snapshot = _read_snapshot(path) if path.endswith(".json") else None
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    temporary = f"{retired}.tmp"
+    with open(temporary, "w", encoding="utf-8") as snapshot:
+        json.dump(merge_snapshots(snapshots), snapshot)
+    os.replace(temporary, retired)
+
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+
+
+def clear_snapshots(directory=None):
+    """
+    Removes the snapshots in `directory` (by default `METRICS_MULTIPROC_DIR`).
+
+    Called when the server starts, before any worker writes a snapshot, so
+    that the counters of a previous server are not added to the new ones.
+    """
+    directory = directory or _multiproc_dir()
+    if not directory or not os.path.isdir(directory):
+        return
+    for entry in os.scandir(directory):
+        if entry.name.endswith((".json", ".json.tmp")):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+
+
+def _flush_on_exit():
+    """
+    Writes a final snapshot when the worker process exits.
+    """
+    directory = _multiproc_dir()
+    if directory:
+        REGISTRY.flush(directory)
+
+
+atexit.register(_flush_on_exit)
+
+
+def _view_label(request):
+    """
+    Returns the `view` label of a request: its URL name, `admin` for the
+    admin site and `unmatched` for requests that resolved to no view.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    if match.app_name == "admin" or "admin" in match.namespaces:
+        return "admin"
+    return match.view_name or "unnamed"
+
+
+class MetricsMiddleware:
+    """
+    Middleware counting requests and recording their latency per view.
+
+    Works with both synchronous and asynchronous request handling.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.flush_interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, seconds):
+        """
+        Records one request and periodically shares the metrics with the
+        other workers.
+        """
+        view = _view_label(request)
+        REQUESTS.inc(view, request.method, str(response.status_code))
+        LATENCY.observe(seconds, view)
+        directory = _multiproc_dir()
+        if directory:
+            REGISTRY.flush(directory, self.flush_interval)
+
+
+def _authorized(request):
+    """
+    Returns True if `request` may read the metrics.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        header = request.headers.get("Authorization", "")
+        if secrets.compare_digest(header, f"Bearer {token}"):
+            return True
+    # Behind the reverse proxy every request comes from a local address, so
+    # only requests that did not pass through it are trusted by address.
+    if "X-Forwarded-For" in request.headers:
+        return False
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    return request.META.get("REMOTE_ADDR") in allowed
+
+
+def metrics_view(request):
+    """
+    Returns the metrics of all workers in the Prometheus text format.
+
+    Raises:
+        Http404: If the request is not allowed to read the metrics.
+    """
+    if not _authorized(request):
+        raise Http404()
+    return HttpResponse(
+        render_prometheus(collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,226 @@
+"""
+This module runs the site under Gunicorn's pre-fork worker model.
+
+`Server` is a Gunicorn application serving `my_site.wsgi` (synchronous
+workers, threaded with `threads > 1`) or `my_site.asgi` (Uvicorn workers).
+It is started by the `serve` management command:
+
+    - The application is preloaded in the master process and warmed up
+      (`warm_up`) before the workers are forked, so every worker starts with
+      the URLconf, templates, CSS bundle manifest and the post cards of the
+      first listing page already loaded, sharing their memory copy-on-write.
+    - The number of workers follows the CPUs the container may use
+      (`available_cpus` honours CPU affinity and cgroup quotas): `2n + 1`
+      synchronous workers or `n` asynchronous ones, unless
+      `WEB_CONCURRENCY` or `--workers` says otherwise.
+    - Restarts are graceful: `SIGHUP` replaces the workers one generation at
+      a time while the old ones finish their requests (within
+      `graceful_timeout`); with `max_requests` set, workers are also
+      recycled one by one, with jitter so they never restart together. The
+      preloaded code itself is only replaced by a new master: send `SIGUSR2`
+      to start one next to the old master, then `SIGQUIT` to the old one.
+    - Metric snapshots left in `METRICS_MULTIPROC_DIR` by a previous server
+      are cleared when the master starts, and the snapshots of each exited
+      worker are folded into one file for all retired workers.
+
+Classes:
+    - `Server`: The Gunicorn application serving the site.
+
+Functions:
+    - `available_cpus`: Returns the number of CPUs this process may use.
+    - `default_workers`: Returns the default number of workers.
+    - `warm_up`: Loads and caches what every worker needs.
+"""
+
+import logging
+import math
+import os
+
+from django.utils.module_loading import import_string
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger("my_site.server")
+
+WSGI_APPLICATION = "my_site.wsgi.application"
+ASGI_APPLICATION = "my_site.asgi.application"
+ASGI_WORKER_CLASS = "uvicorn_worker.UvicornWorker"
+
+# Templates rendered by most requests, compiled once in the master.
+WARM_TEMPLATES = (
+    "blog/index.html",
+    "blog/all-posts.html",
+    "blog/post-detail.html",
+    "blog/includes/post.html",
+    "blog/includes/comments.html",
+    "404.html",
+)
+
+
+def _cgroup_cpu_limit():
+    """
+    Returns the CPU quota of the container's cgroup as a number of CPUs, or
+    None if it is unlimited or unknown.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="ascii") as limits:
+            quota, period = limits.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="ascii") as q:
+                quota = q.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="ascii") as p:
+                period = p.read().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    try:
+        return int(quota) / int(period)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def available_cpus():
+    """
+    Returns the number of CPUs this process may use.
+
+    `os.cpu_count()` reports the CPUs of the host. Containers are usually
+    limited further, by CPU affinity (`--cpuset-cpus`) or by a CFS quota
+    (`--cpus`), and the smaller of these limits is returned.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, max(1, math.ceil(limit)))
+    return count
+
+
+def default_workers(asgi=False):
+    """
+    Returns the default number of worker processes.
+
+    `WEB_CONCURRENCY` takes precedence. Otherwise synchronous workers block
+    on the database and storage, so `2n + 1` of them keep `n` CPUs busy,
+    while one asynchronous worker per CPU suffices.
+    """
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.environ["WEB_CONCURRENCY"])
+    cpus = available_cpus()
+    return cpus if asgi else 2 * cpus + 1
+
+
+def warm_up():
+    """
+    Loads and caches what every worker needs, before the workers are forked.
+
+    Compiles the common templates, loads the URLconf and the CSS bundle
+    manifest, and renders the post cards of the first listing page into the
+    cache. Failures (e.g. a database that is not migrated yet) are logged
+    and do not stop the server. Database and cache connections opened here
+    are closed again, so that no worker inherits a socket of the master.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.core.cache import caches
+    from django.db import connections
+    from django.template.loader import get_template
+    from django.urls import reverse
+
+    from blog import fragment_cache
+    from blog.models import Post
+    from blog.views import PostsView
+    from my_site import assets
+
+    try:
+        reverse("starting-page")
+        for name in WARM_TEMPLATES:
+            get_template(name)
+        assets.bundle_url_name(("app.css",))
+        posts = Post.objects.for_cards().order_by(  # pylint: disable=no-member
+            "-date", "-id"
+        )[: PostsView.paginate_by]
+        fragment_cache.render_cards(posts)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Warming up the application failed.", exc_info=True)
+    finally:
+        connections.close_all()
+        caches.close_all()
+
+
+def _on_starting(server):
+    # pylint: disable=unused-argument
+    """
+    Gunicorn hook run in the master before anything is loaded.
+
+    Clears the metric snapshots of a previous server, whose workers are all
+    gone.
+    """
+    from my_site import metrics  # pylint: disable=import-outside-toplevel
+
+    metrics.clear_snapshots()
+
+
+def _on_child_exit(server, worker):
+    # pylint: disable=unused-argument
+    """
+    Gunicorn hook run in the master after a worker exited.
+
+    Folds the metric snapshots of the worker into those of all retired
+    workers.
+    """
+    from my_site import metrics  # pylint: disable=import-outside-toplevel
+
+    metrics.retire_snapshots(worker.pid)
+
+
+class Server(BaseApplication):
+    """
+    The Gunicorn application serving the site.
+
+    Attributes:
+        application_path (str): The dotted path of the WSGI or ASGI
+        application.
+        options (dict): Gunicorn settings; None values keep the defaults.
+        warm (bool): Whether the application is warmed up after loading.
+    """
+
+    def __init__(self, options, asgi=False, warm=True):
+        self.application_path = ASGI_APPLICATION if asgi else WSGI_APPLICATION
+        self.warm = warm
+        self.options = {
+            "preload_app": True,
+            "workers": default_workers(asgi),
+            "worker_class": ASGI_WORKER_CLASS if asgi else None,
+            "on_starting": _on_starting,
+            "child_exit": _on_child_exit,
+            **{key: value for key, value in options.items() if value is not None},
+        }
+        super().__init__()
+
+    def init(self, parser, opts, args):
+        """
+        Returns no extra configuration; the options are applied by
+        `load_config` instead of being parsed from the command line.
+        """
+        return None
+
+    def load_config(self):
+        """
+        Applies the options to the Gunicorn configuration.
+        """
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        """
+        Imports the application and warms it up.
+
+        With `preload_app` this runs once, in the master process.
+        """
+        application = import_string(self.application_path)
+        if self.warm:
+            warm_up()
+        return application
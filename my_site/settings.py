@@ -52,11 +52,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "my_site.metrics.MetricsMiddleware",
+    "my_site.instrumentation.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "my_site.db_router.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -65,7 +68,7 @@ ROOT_URLCONF = "my_site.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "my_site.instrumentation.InstrumentedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -96,6 +99,58 @@ DATABASES = {
     }
 }
 
+# Read replicas: a comma-separated list of replica hosts (or, with SQLite,
+# database files, e.g. DB_REPLICAS=replica.sqlite3 next to a copy of
+# db.sqlite3). They share the other settings of the primary and are named
+# replica1, replica2, ... GET requests to the blog's page views read from a
+# random replica (see my_site.db_router); everything else, every read after
+# a write and every read filling a shared cache use the primary. After
+# writing, a visitor's reads stay on the primary for
+# DATABASE_REPLICA_PIN_SECONDS while the replicas catch up.
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(
+    filter(None, os.getenv("DB_REPLICAS", "").split(",")), start=1
+):
+    _replica = _replica.strip()
+    if DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+        _address, _replica = "NAME", BASE_DIR / _replica
+    else:
+        _address = "HOST"
+    DATABASES[f"replica{_index}"] = {
+        **DATABASES["default"],
+        _address: _replica,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_index}")
+
+DATABASE_ROUTERS = ["my_site.db_router.ReplicaRouter"]
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", "5"))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The shared cache of all worker processes and servers is Redis at REDIS_URL
+# (e.g. redis://localhost:6379/0). Without it each process gets its own
+# in-memory cache, which suits development and tests.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+            "KEY_PREFIX": "my_site",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "my_site",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -158,5 +213,111 @@ AWS_S3_CUSTOM_DOMAIN = f"{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com"
 STATICFILES_FOLDER = "static"
 MEDIAFILES_FOLDER = "media"
 
-STATICFILES_STORAGE = "custom_storages.StaticFileStorage"
-DEFAULT_FILE_STORAGE = "custom_storages.MediaFileStorage"
+# Set DEFAULT_FILE_STORAGE=custom_storages.LocalMediaFileStorage to keep media
+# on the local filesystem (for development and tests without AWS).
+STATICFILES_STORAGE = os.getenv(
+    "STATICFILES_STORAGE", "custom_storages.StaticFileStorage"
+)
+DEFAULT_FILE_STORAGE = os.getenv(
+    "DEFAULT_FILE_STORAGE", "custom_storages.MediaFileStorage"
+)
+
+# Set STATICFILES_STORAGE=custom_storages.LocalStaticFileStorage to collect
+# static files into STATIC_ROOT instead of S3. Either storage builds the CSS
+# bundles during `collectstatic` and records them in this local manifest, so
+# run `collectstatic` on each host (or bake the manifest into the image).
+CSS_BUNDLE_MANIFEST = Path(
+    os.getenv("CSS_BUNDLE_MANIFEST", BASE_DIR / "staticfiles" / "css-bundles.json")
+)
+
+# Storage URLs are cached in-process for this many seconds (signed S3 URLs are
+# always dropped before they expire).
+STORAGE_URL_CACHE_TTL = int(os.getenv("STORAGE_URL_CACHE_TTL", "300"))
+
+# Serve the blog pages with their native async views. `my_site.asgi` enables
+# this by default; WSGI deployments keep the synchronous views.
+BLOG_ASYNC_VIEWS = os.getenv("BLOG_ASYNC_VIEWS", "False").lower() == "true"
+
+# Where visitors' read-later lists are kept: in a signed cookie (default), in
+# the cache (blog.read_later.CacheReadLaterStore) or in the session
+# (blog.read_later.SessionReadLaterStore).
+BLOG_READ_LATER_STORE = os.getenv(
+    "BLOG_READ_LATER_STORE", "blog.read_later.SignedCookieReadLaterStore"
+)
+
+# Rendered post detail pages are cached for this many seconds and dropped
+# earlier whenever the post, its comments or its tags change.
+BLOG_PAGE_CACHE_TIMEOUT = int(os.getenv("BLOG_PAGE_CACHE_TIMEOUT", "600"))
+
+# Rendered post cards of the listing pages are cached for at most this many
+# seconds (and never longer than the media storage caches its image URLs).
+BLOG_CARD_CACHE_TIMEOUT = int(os.getenv("BLOG_CARD_CACHE_TIMEOUT", "600"))
+
+# Generated Atom/RSS feeds are cached for this many seconds and retired
+# earlier whenever posts, their tags or their authors change.
+BLOG_FEED_CACHE_TIMEOUT = int(os.getenv("BLOG_FEED_CACHE_TIMEOUT", "3600"))
+
+# Sitemap shards cover this many post IDs each (at most 50,000 URLs, the
+# limit of the sitemap protocol). Their XML is cached for
+# BLOG_SITEMAP_CACHE_TIMEOUT seconds and regenerated earlier when one of
+# their posts changes.
+BLOG_SITEMAP_SHARD_SIZE = int(os.getenv("BLOG_SITEMAP_SHARD_SIZE", "50000"))
+BLOG_SITEMAP_CACHE_TIMEOUT = int(os.getenv("BLOG_SITEMAP_CACHE_TIMEOUT", "86400"))
+
+# The newest posts, posts by slug and tag lists are kept in a per-process LRU
+# of BLOG_OBJECT_CACHE_ENTRIES objects in front of the shared cache, for
+# BLOG_OBJECT_CACHE_TIMEOUT seconds (see blog.object_cache). Changes retire
+# them at once in the changing process and within
+# BLOG_OBJECT_CACHE_SYNC_INTERVAL seconds in all others.
+BLOG_OBJECT_CACHE_ENTRIES = int(os.getenv("BLOG_OBJECT_CACHE_ENTRIES", "1000"))
+BLOG_OBJECT_CACHE_TIMEOUT = int(os.getenv("BLOG_OBJECT_CACHE_TIMEOUT", "300"))
+BLOG_OBJECT_CACHE_SYNC_INTERVAL = float(
+    os.getenv("BLOG_OBJECT_CACHE_SYNC_INTERVAL", "1")
+)
+
+# Views of post detail pages are buffered in each worker process and added
+# to Post.view_count every BLOG_VIEW_FLUSH_INTERVAL seconds (0 disables the
+# periodic flush; see blog.view_counts). The "most read" posts of the
+# starting page are cached for BLOG_MOST_READ_TIMEOUT seconds.
+BLOG_VIEW_FLUSH_INTERVAL = float(os.getenv("BLOG_VIEW_FLUSH_INTERVAL", "10"))
+BLOG_MOST_READ_TIMEOUT = int(os.getenv("BLOG_MOST_READ_TIMEOUT", "60"))
+
+# The admin lists of posts and comments count approximately, page with
+# keyset cursors and filter by typed-in values, so that they stay fast on
+# large tables (see blog.admin_tools). Set to false for the stock admin.
+BLOG_ADMIN_LARGE_TABLES = (
+    os.getenv("BLOG_ADMIN_LARGE_TABLES", "True").lower() == "true"
+)
+
+# Share of requests (0 to 1) whose SQL, template and storage time is measured
+# by my_site.instrumentation.PerformanceMiddleware and logged as JSON on the
+# "my_site.performance" logger. PERF_SERVER_TIMING=true also reports the
+# breakdown in a Server-Timing header, which every client can read, so it is
+# off by default; enable it only where the backend timings are not sensitive.
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.05"))
+PERF_SERVER_TIMING = os.getenv("PERF_SERVER_TIMING", "False").lower() == "true"
+
+# Request counts and latency histograms per view are served in the Prometheus
+# format at /internal/metrics, to requests with "Authorization: Bearer
+# <METRICS_TOKEN>" or direct requests from METRICS_ALLOWED_IPS. With several
+# worker processes, set METRICS_MULTIPROC_DIR to a directory shared by them
+# (and emptied on server start) so that every worker reports the totals.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "my_site.performance": {
+            "handlers": ["console"],
+            "level": os.getenv("PERF_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
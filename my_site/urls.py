@@ -18,8 +18,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from my_site import metrics
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("internal/metrics", metrics.metrics_view, name="metrics"),
     path("", include("blog.urls")),
 ]
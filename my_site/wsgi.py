@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "my_site.settings")
 
 application = get_wsgi_application()
+
+# Post views are buffered and written in batches by a background thread.
+from blog import view_counts  # pylint: disable=wrong-import-position
+
+view_counts.enable()
@@ -1,5 +1,3 @@
-from django.test import TestCase
-
 """
 This module contains tests for the 'blog' application in the Django project.
 
@@ -9,6 +7,85 @@ integrity. The test suite will help to maintain and improve the application
 by catching any regressions or issues during development.
 """
 
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from pathlib import Path
+
+from django.contrib.admin import site as admin_site
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from django.urls import reverse
+
+from blog.models import Author, Comment, Post, Rendition, Tag
+from blog import (
+    async_views,
+    benchmark,
+    fragment_cache,
+    object_cache,
+    page_cache,
+    read_later,
+    renditions,
+    search,
+    sitemaps,
+    view_counts,
+)
+from blog.admin_tools import EstimatedCountPaginator
+from blog.media import resolve_image_urls
+from custom_storages import (
+    LocalMediaFileStorage,
+    LocalStaticFileStorage,
+    MediaFileStorage,
+    URLCache,
+)
+from my_site import assets, db_router, metrics, server
+from blog.pagination import KeysetPaginator
+
+
+def make_post(index, author=None, **kwargs):
+    """
+    Creates and returns a minimal `Post` for use in tests.
+    """
+    fields = {
+        "title": f"Post {index}",
+        "excerpt": f"Excerpt {index}",
+        "image": "posts/test.jpg",
+        "slug": f"post-{index}",
+        "content": f"Content of post number {index}.",
+        "author": author,
+    }
+    fields.update(kwargs)
+    return Post.objects.create(**fields)  # pylint: disable=no-member
+
+
+def lagging_replica(table):
+    """
+    Returns a database execute wrapper that hides the rows of `table` from
+    reads routed to a replica, like a replica that has not caught up yet.
+    """
+
+    def execute(run, sql, params, many, context):
+        routed = db_router.ReplicaRouter().db_for_read(Post) is not None
+        if routed and f'"{table}"' in sql:
+            sql = f"SELECT * FROM ({sql}) WHERE 0"
+        return run(sql, params, many, context)
+
+    return execute
+
 
 class BlogTests(TestCase):
     """
@@ -34,3 +111,1416 @@ class BlogTests(TestCase):
     """
 
     pass  # Add your test methods here
+
+
+class PaginationTests(TestCase):
+    """
+    Tests for the keyset pagination of the all-posts page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(  # pylint: disable=no-member
+            first_name="Ada", last_name="Lovelace", e_mail="ada@example.com"
+        )
+        cls.posts = [make_post(i, cls.author) for i in range(7)]
+
+    def test_pages_walk_forward_and_back_without_overlap(self):
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        third = paginator.page(after=second.next_cursor)
+
+        seen = [p.id for page in (first, second, third) for p in page]
+        self.assertEqual(seen, sorted((p.id for p in self.posts), reverse=True))
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(before=second.previous_cursor)
+        self.assertEqual([p.id for p in back], [p.id for p in first])
+        self.assertFalse(back.has_previous())
+
+    def test_posts_page_renders_cursor_links(self):
+        response = self.client.get(reverse("posts-page"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["all_posts"]), 7)
+
+        response = self.client.get(reverse("posts-page") + "?after=bogus")
+        self.assertEqual(response.status_code, 404)
+
+
+class PostDetailCacheTests(TestCase):
+    """
+    Tests for the rendered-page cache of the post detail page.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.post = make_post(1)
+        self.url = reverse("post-detail-page", args=[self.post.slug])
+
+    def test_cached_page_is_served_without_post_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, self.post.title)
+        self.assertNotContains(response, "__blog_csrf_token__")
+        self.assertContains(response, "Read Later")
+
+    def test_only_the_csrf_field_receives_the_token(self):
+        Comment.objects.create(  # pylint: disable=no-member
+            user_name="Mallory",
+            user_email="mallory@example.com",
+            comment_text="Show me __blog_csrf_token__",
+            post=self.post,
+        )
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertContains(response, "Show me __blog_csrf_token__")
+        self.assertContains(response, 'name="csrfmiddlewaretoken" value="', 2)
+        self.assertNotContains(
+            response, 'name="csrfmiddlewaretoken" value="__blog_csrf_token__"'
+        )
+
+    def test_saved_for_later_is_filled_per_session(self):
+        self.client.get(self.url)
+        self.client.post(reverse("read-later"), {"post_id": self.post.id})
+        response = self.client.get(self.url)
+        self.assertContains(response, "Remove From Read Later List")
+
+    def test_comment_and_tag_changes_invalidate_page(self):
+        self.client.get(self.url)
+        # The cached page is dropped once the change is committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(  # pylint: disable=no-member
+                user_name="Grace",
+                user_email="grace@example.com",
+                comment_text="A fresh comment",
+                post=self.post,
+            )
+            self.assertNotContains(self.client.get(self.url), "A fresh comment")
+        self.assertContains(self.client.get(self.url), "A fresh comment")
+
+        tag = Tag.objects.create(caption="django")  # pylint: disable=no-member
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tag.add(tag)
+        self.assertContains(self.client.get(self.url), "django")
+
+
+class CommentPaginationTests(TestCase):
+    """
+    Tests for the paginated comment threads of the post detail page.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.post = make_post(1)
+        Comment.objects.bulk_create(  # pylint: disable=no-member
+            Comment(
+                user_name=f"User {i}",
+                user_email="user@example.com",
+                comment_text=f"Comment number {i}",
+                post=self.post,
+            )
+            for i in range(25)
+        )
+
+    def test_detail_page_renders_first_page_and_fragment_continues(self):
+        response = self.client.get(reverse("post-detail-page", args=["post-1"]))
+        self.assertContains(response, "Comment number 24")
+        self.assertNotContains(response, "Comment number 4<")
+        self.assertContains(response, "Load more comments")
+
+        cursor = response.content.decode().split("?after=")[1].split('"')[0]
+        fragment = self.client.get(
+            reverse("post-comments", args=["post-1"]) + f"?after={cursor}"
+        )
+        self.assertContains(fragment, "Comment number 4<")
+        self.assertContains(fragment, "Comment number 0<")
+        self.assertNotContains(fragment, "Comment number 5<")
+        self.assertNotContains(fragment, "Load more comments")
+
+
+class SearchTests(TestCase):
+    """
+    Tests for the full-text search over posts.
+    """
+
+    def setUp(self):
+        self.title_match = make_post(1, title="Django tips")
+        self.content_match = make_post(2, content="Some notes about django apps.")
+        make_post(3, title="Unrelated")
+
+    def test_results_are_ranked_and_follow_saves(self):
+        self.assertEqual(
+            search.search_posts("django", limit=10),
+            [self.title_match.id, self.content_match.id],
+        )
+
+        self.title_match.title = "Flask tips"
+        self.title_match.save()
+        self.assertEqual(
+            search.search_posts("django", limit=10), [self.content_match.id]
+        )
+
+        self.content_match.delete()
+        self.assertEqual(search.search_posts("django", limit=10), [])
+
+    def test_search_page_tolerates_query_syntax(self):
+        response = self.client.get(reverse("search-page"), {"q": '"django*'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["posts"]), 2)
+
+
+class PostCardCacheTests(TestCase):
+    """
+    Tests for the fragment cache of the post cards on listing pages.
+    """
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [make_post(i) for i in range(3)]
+
+    def test_cached_cards_are_fetched_in_one_batch(self):
+        self.client.get(reverse("starting-page"))
+        self.assertIsNotNone(cache.get(fragment_cache.card_key(self.posts[0])))
+
+        # The posts come from the object cache and their cards from the
+        # fragment cache: no queries, no rendering.
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("starting-page"))
+        self.assertContains(response, self.posts[2].title)
+        self.assertTemplateNotUsed(response, "blog/includes/post.html")
+
+    def test_concurrent_saves_move_a_post_to_distinct_versions(self):
+        first = Post.objects.get(pk=self.posts[0].pk)  # pylint: disable=no-member
+        second = Post.objects.get(pk=self.posts[0].pk)  # pylint: disable=no-member
+        first.title = "First edit"
+        first.save()
+        second.title = "Second edit"
+        second.save()
+
+        self.assertEqual((first.version, second.version), (2, 3))
+        self.assertNotEqual(
+            fragment_cache.card_key(first), fragment_cache.card_key(second)
+        )
+        self.assertContains(self.client.get(reverse("posts-page")), "Second edit")
+
+    def test_saving_a_post_renders_a_new_card(self):
+        self.client.get(reverse("posts-page"))
+        post = self.posts[1]
+        old_key = fragment_cache.card_key(post)
+
+        post.title = "A new title"
+        post.save()
+        self.assertNotEqual(fragment_cache.card_key(post), old_key)
+        self.assertContains(self.client.get(reverse("posts-page")), "A new title")
+
+
+class RenditionTests(TestCase):
+    """
+    Tests for the responsive image renditions of post images.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        storage = override_settings(
+            MEDIA_ROOT=self.media_root,
+            DEFAULT_FILE_STORAGE="custom_storages.LocalMediaFileStorage",
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+    def make_image(self, width, height):
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height), "purple").save(buffer, "PNG")
+        return SimpleUploadedFile("photo.png", buffer.getvalue())
+
+    def test_renditions_are_built_and_rendered_as_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = make_post(1, image=self.make_image(300, 150))
+
+        built = sorted((r.format, r.width, r.height) for r in post.renditions.all())
+        self.assertEqual(
+            built,
+            [
+                ("jpeg", 96, 48),
+                ("jpeg", 192, 96),
+                ("jpeg", 300, 150),
+                ("webp", 96, 48),
+                ("webp", 192, 96),
+                ("webp", 300, 150),
+            ],
+        )
+        self.assertFalse(renditions.is_stale(post))
+
+        response = self.client.get(reverse("starting-page"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, "-192.webp 192w")
+
+    def test_build_many_uses_worker_processes(self):
+        posts = [make_post(i, image=self.make_image(400, 400)) for i in range(3)]
+        self.assertEqual(renditions.build_many(posts, max_workers=2), (3, 0))
+        self.assertEqual(posts[2].renditions.count(), 6)
+
+    def test_rebuilt_renditions_reach_the_cached_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = make_post(1, image=self.make_image(300, 150))
+        url = reverse("post-detail-page", args=[post.slug])
+        self.assertContains(self.client.get(url), "-192.webp 192w")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            renditions.build_renditions(post, widths=(128,))
+        self.assertContains(self.client.get(url), "-128.webp 128w")
+        self.assertNotContains(self.client.get(url), "-192.webp 192w")
+
+    def test_removed_images_take_their_rendition_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = make_post(1, image=self.make_image(300, 150))
+        paths = [r.image.path for r in post.renditions.all()]
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        post.image = None
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertFalse(post.renditions.exists())
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+
+class StorageURLCacheTests(TestCase):
+    """
+    Tests for the cached and batched media URL resolution.
+    """
+
+    def test_entries_expire_and_least_recently_used_are_evicted(self):
+        url_cache = URLCache(max_entries=2)
+        url_cache.set_many({"a": "/a", "b": "/b"}, ttl=10, now=0)
+        self.assertEqual(url_cache.get_many(["a"], now=5), {"a": "/a"})
+
+        url_cache.set_many({"c": "/c"}, ttl=10, now=5)
+        self.assertEqual(
+            url_cache.get_many(["a", "b", "c"], now=6), {"a": "/a", "c": "/c"}
+        )
+        self.assertEqual(url_cache.get_many(["a", "c"], now=15), {})
+
+    def test_signed_urls_are_not_cached_past_their_expiry(self):
+        storage = MediaFileStorage(querystring_auth=True, querystring_expire=100)
+        self.assertEqual(storage.url_ttl(), 40)
+
+    def test_posts_resolve_urls_in_one_batch(self):
+        storage = LocalMediaFileStorage(location=tempfile.gettempdir())
+        for i in range(3):
+            make_post(i)
+        posts = list(Post.objects.prefetch_related("renditions"))
+        for post in posts:
+            post.image.storage = storage
+
+        with self.assertNumQueries(0):
+            resolve_image_urls(posts)
+        self.assertEqual(
+            posts[0].image_urls, {"posts/test.jpg": "/files/posts/test.jpg"}
+        )
+        self.assertEqual((storage.url_cache.hits, storage.url_cache.misses), (0, 1))
+
+        self.assertEqual(storage.url("posts/test.jpg"), "/files/posts/test.jpg")
+        self.assertEqual(storage.url_cache.hits, 1)
+
+
+class AsyncViewTests(TestCase):
+    """
+    Tests for the asynchronous versions of the blog views.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.session = SessionStore()
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        request = getattr(self.factory, method)(path, data)
+        request.session = self.session
+        request.COOKIES.update(self.cookies)
+        return request
+
+    def keep_cookies(self, response):
+        self.cookies.update({k: v.value for k, v in response.cookies.items()})
+
+    async def test_listing_views_render_posts(self):
+        await Post.objects.acreate(
+            title="Async", excerpt="x", image="posts/a.jpg", slug="async", content="c"
+        )
+        view = async_views.StartingPageView.as_view()
+        response = await view(self.request("get", "/"))
+        self.assertContains(response, "Async")
+
+        view = async_views.PostsView.as_view()
+        response = await view(self.request("get", "/posts"))
+        self.assertContains(response, "Async")
+
+    async def test_detail_comment_and_read_later_flow(self):
+        post = await Post.objects.acreate(
+            title="Async", excerpt="x", image="posts/a.jpg", slug="async", content="c"
+        )
+        detail = async_views.PostDetailView.as_view()
+        response = await detail(
+            self.request(
+                "post",
+                "/posts/async",
+                {
+                    "user_name": "Ada",
+                    "user_email": "ada@example.com",
+                    "comment_text": "Async comment",
+                },
+            ),
+            slug="async",
+        )
+        self.assertEqual(response.status_code, 302)
+
+        read_later = async_views.ReadLaterView.as_view()
+        self.keep_cookies(
+            await read_later(self.request("post", "/read-later", {"post_id": post.id}))
+        )
+
+        response = await detail(self.request("get", "/posts/async"), slug="async")
+        self.assertContains(response, "Async comment")
+        self.assertContains(response, "Remove From Read Later List")
+
+        response = await read_later(self.request("get", "/read-later"))
+        self.assertContains(response, 'href="/posts/async"')
+
+
+class ReadLaterStoreTests(TestCase):
+    """
+    Tests for the pluggable read-later stores.
+    """
+
+    def test_ids_round_trip_through_compact_encoding(self):
+        self.assertEqual(read_later.encode_ids({1003, 1000, 1010}), "rs.3.7")
+        self.assertEqual(read_later.decode_ids("rs.3.7"), {1000, 1003, 1010})
+        self.assertEqual(read_later.decode_ids("not base36!"), set())
+
+    def toggle_and_check(self):
+        post = make_post(1)
+        with self.assertNumQueries(0):
+            self.client.post(reverse("read-later"), {"post_id": post.id})
+        response = self.client.get(reverse("read-later"))
+        self.assertContains(response, post.title)
+
+        self.client.post(reverse("read-later"), {"post_id": post.id})
+        response = self.client.get(reverse("read-later"))
+        self.assertFalse(response.context["has_posts"])
+
+    def test_signed_cookie_store_needs_no_database(self):
+        self.toggle_and_check()
+        self.client.cookies["read_later"] = "tampered"
+        response = self.client.get(reverse("read-later"))
+        self.assertFalse(response.context["has_posts"])
+
+    @override_settings(BLOG_READ_LATER_STORE="blog.read_later.CacheReadLaterStore")
+    def test_cache_store_needs_no_database(self):
+        self.toggle_and_check()
+
+    def test_signed_cookie_store_takes_over_the_session_list(self):
+        first, second = make_post(1), make_post(2)
+        session = self.client.session
+        session["stored_posts"] = [first.id]
+        session.save()
+
+        response = self.client.get(reverse("read-later"))
+        self.assertContains(response, first.title)
+
+        self.client.post(reverse("read-later"), {"post_id": second.id})
+        self.assertNotIn("stored_posts", self.client.session)
+        response = self.client.get(reverse("read-later"))
+        self.assertContains(response, first.title)
+        self.assertContains(response, second.title)
+
+    def test_full_list_rejects_new_posts(self):
+        first, second = make_post(1), make_post(2)
+        with mock.patch.object(read_later.SignedCookieReadLaterStore, "max_ids", 1):
+            self.client.post(reverse("read-later"), {"post_id": first.id})
+            response = self.client.post(
+                reverse("read-later"), {"post_id": second.id}, follow=True
+            )
+        self.assertContains(response, "Your read-later list is full.")
+        response = self.client.get(reverse("read-later"))
+        self.assertContains(response, first.title)
+        self.assertNotContains(response, second.title)
+
+
+class CSSBundleTests(TestCase):
+    """
+    Tests for the fingerprinted, precompressed CSS bundles.
+    """
+
+    def setUp(self):
+        self.static_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.static_root)
+        manifest = override_settings(
+            CSS_BUNDLE_MANIFEST=self.static_root / "css-bundles.json"
+        )
+        manifest.enable()
+        self.addCleanup(manifest.disable)
+        self.addCleanup(
+            assets._manifest_cache.clear
+        )  # pylint: disable=protected-access
+        self.template = Template(
+            "{% load blog_tags %}"
+            '{% css_bundle "app.css" "blog/post.css" "blog/all-posts.css" %}'
+        )
+
+    def test_stylesheets_are_linked_one_by_one_without_a_bundle(self):
+        html = self.template.render(Context())
+        self.assertEqual(html.count("<link"), 3)
+        self.assertIn("blog/post.css", html)
+
+    def test_collectstatic_builds_compressed_bundles(self):
+        storage = LocalStaticFileStorage(location=self.static_root)
+        saved = list(storage.post_process({}))
+
+        name = assets.bundle_url_name(
+            ("app.css", "blog/post.css", "blog/all-posts.css")
+        )
+        self.assertRegex(name, r"^bundles/\w{12}\.\w{12}\.css$")
+        self.assertIn((name, name, True), saved)
+        css = (self.static_root / name).read_bytes()
+        self.assertNotIn(b"/*", css)
+        self.assertEqual(
+            gzip.decompress((self.static_root / f"{name}.gz").read_bytes()), css
+        )
+
+        html = self.template.render(Context())
+        self.assertEqual(html.count("<link"), 1)
+        self.assertIn(name, html)
+
+    def test_imports_with_semicolons_move_to_the_start(self):
+        css = assets._concatenate(  # pylint: disable=protected-access
+            ("blog/index.css", "app.css")
+        )
+        self.assertTrue(css.startswith("@import url('https://fonts.googleapis"))
+        self.assertIn("wght@400;700&family=Open+Sans", css)
+        self.assertEqual(css.count("@import"), 1)
+        self.assertEqual(css.count("display=swap');"), 1)
+        self.assertLess(css.index("display=swap');"), css.index("{"))
+
+
+class BenchmarkTests(TestCase):
+    """
+    Tests for the synthetic data generator and the benchmark runner.
+    """
+
+    def test_percentiles_interpolate_between_ranks(self):
+        values = [4, 1, 3, 2]
+        self.assertEqual(benchmark.percentile(values, 50), 2.5)
+        self.assertEqual(benchmark.percentile(values, 100), 4)
+        self.assertIsNone(benchmark.percentile([], 95))
+
+    def test_seeded_data_is_benchmarked_into_json(self):
+        counts = benchmark.seed_data(posts=30, comments_per_post=2, seed=7)
+        self.assertEqual(counts["posts"], 30)
+        self.assertEqual(Post.objects.count(), 30)
+
+        cache.clear()
+        results = benchmark.run_benchmarks(
+            scenarios=["posts-page", "read-later-toggle"], iterations=5, warmup=1
+        )
+        summary = json.loads(json.dumps(results))["scenarios"]["posts-page"]
+        self.assertEqual((summary["requests"], summary["errors"]), (5, 0))
+        self.assertLessEqual(summary["latency_ms"]["p50"], summary["latency_ms"]["p99"])
+        self.assertEqual(summary["queries"]["max"], 1)
+        self.assertGreater(summary["peak_memory_bytes"], 0)
+
+        self.assertGreater(benchmark.clear_data(), 0)
+        self.assertFalse(Post.objects.exists())
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0, PERF_SERVER_TIMING=True)
+class PerformanceMiddlewareTests(TestCase):
+    """
+    Tests for the per-request performance instrumentation.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.post = make_post(1)
+
+    def test_sampled_requests_report_server_timing_and_log(self):
+        with self.assertLogs("my_site.performance", "INFO") as logs:
+            response = self.client.get(reverse("starting-page"))
+
+        metrics = response["Server-Timing"]
+        for name in ("db;dur=", "tpl;dur=", "storage;dur=", "total;dur="):
+            self.assertIn(name, metrics)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "starting-page")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["db_calls"], 0)
+
+    async def test_async_requests_are_measured(self):
+        with self.assertLogs("my_site.performance", "INFO"):
+            response = await self.async_client.get(reverse("starting-page"))
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_left_alone(self):
+        response = self.client.get(reverse("starting-page"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_server_timing_header_is_opt_in(self):
+        with self.assertLogs("my_site.performance", "INFO"):
+            response = self.client.get(reverse("starting-page"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+class MetricsTests(TestCase):
+    """
+    Tests for the metrics registry and its Prometheus endpoint.
+    """
+
+    def test_threads_record_without_losing_updates(self):
+        counter = metrics.Counter("test_total", "Test.", ("view",))
+        histogram = metrics.Histogram("test_seconds", "Test.", buckets=(0.1, 1))
+
+        def work():
+            for _ in range(1000):
+                counter.inc("a")
+                histogram.observe(0.5)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.snapshot(), [[["a"], 4000]])
+        self.assertEqual(histogram.snapshot(), [[[], [0, 4000, 0, 2000.0]]])
+
+    def test_worker_snapshots_are_aggregated(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = metrics.Registry()
+        worker.register(metrics.Counter("jobs_total", "Jobs.")).inc(amount=2)
+        worker.flush(directory)
+        local = metrics.Registry()
+        local.register(metrics.Counter("jobs_total", "Jobs.")).inc()
+
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            text = metrics.render_prometheus(metrics.collect(local))
+        self.assertIn("# TYPE jobs_total counter\njobs_total 3\n", text)
+
+    def test_exited_worker_snapshots_are_folded_into_one(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for _ in range(2):
+            worker = metrics.Registry()
+            worker.register(metrics.Counter("jobs_total", "Jobs.")).inc(amount=2)
+            worker.flush(directory)
+            metrics.retire_snapshots(os.getpid(), directory)
+        self.assertEqual(os.listdir(directory), [metrics.RETIRED_FILE])
+
+        local = metrics.Registry()
+        local.register(metrics.Counter("jobs_total", "Jobs.")).inc()
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            text = metrics.render_prometheus(metrics.collect(local))
+        self.assertIn("# TYPE jobs_total counter\njobs_total 5\n", text)
+
+    def test_endpoint_reports_view_latency_to_local_scrapers(self):
+        self.client.get(reverse("posts-page"))
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(response["Content-Type"].split(";")[0], "text/plain")
+        text = response.content.decode()
+        self.assertIn('blog_http_requests_total{view="posts-page",method="GET"', text)
+        self.assertIn(
+            'blog_http_request_duration_seconds_bucket{view="posts-page",le="+Inf"}',
+            text,
+        )
+
+        proxied = self.client.get(
+            reverse("metrics"), REMOTE_ADDR="127.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4"
+        )
+        self.assertEqual(proxied.status_code, 404)
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"),
+                REMOTE_ADDR="10.0.0.1",
+                HTTP_AUTHORIZATION="Bearer secret",
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class ImportTests(TestCase):
+    """
+    Tests for the streaming `import_blog` command.
+    """
+
+    RECORDS = [
+        {"type": "author", "first_name": "Ada", "last_name": "L", "e_mail": "a@x.io"},
+        {
+            "type": "post",
+            "slug": "imported",
+            "title": "Imported",
+            "excerpt": "Excerpt",
+            "content": "Imported content",
+            "date": "2020-05-17",
+            "author": "a@x.io",
+            "tags": ["django", "python"],
+        },
+        {"type": "comment", "post": "imported", "user_name": "G", "comment_text": "1"},
+        {"type": "comment", "post": "imported", "user_name": "G", "comment_text": "2"},
+        {"type": "comment", "post": "missing", "user_name": "G", "comment_text": "3"},
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, text):
+        path = f"{self.directory}/{name}"
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(text)
+        return path
+
+    def test_ndjson_import_is_batched_and_not_repeated(self):
+        path = self.write(
+            "blog.ndjson", "\n".join(json.dumps(r) for r in self.RECORDS) + "\n"
+        )
+        call_command("import_blog", path, batch_size=2, stdout=io.StringIO())
+
+        post = Post.objects.get(slug="imported")
+        self.assertEqual(str(post.date), "2020-05-17")
+        self.assertEqual(post.author.e_mail, "a@x.io")
+        self.assertEqual(
+            sorted(t.caption for t in post.tag.all()), ["django", "python"]
+        )
+        self.assertEqual(post.comments.count(), 2)
+        self.assertEqual(search.search_posts("imported", limit=5), [post.id])
+
+        call_command("import_blog", path, stdout=io.StringIO())
+        self.assertEqual(Comment.objects.count(), 2)
+        call_command("import_blog", path, restart=True, stdout=io.StringIO())
+        self.assertEqual((Post.objects.count(), Comment.objects.count()), (1, 4))
+
+    def test_csv_import_and_invalid_records(self):
+        path = self.write(
+            "blog.csv",
+            "type,slug,title,excerpt,content,tags,post,user_name,comment_text\n"
+            "post,csv-post,CSV,Excerpt,Some content,a|b,,,\n"
+            "comment,,,,,,csv-post,G,Hello\n",
+        )
+        call_command("import_blog", path, stdout=io.StringIO())
+        post = Post.objects.get(slug="csv-post")
+        self.assertEqual(post.tag.count(), 2)
+        self.assertEqual(post.comments.get().comment_text, "Hello")
+
+        path = self.write("bad.ndjson", '{"type": "post", "title": "No slug"}\n')
+        with self.assertRaisesMessage(CommandError, "Line 1: post record without slug"):
+            call_command("import_blog", path, stdout=io.StringIO())
+
+
+class ExportTests(TestCase):
+    """
+    Tests for the streaming export command and admin view.
+    """
+
+    def setUp(self):
+        author = Author.objects.create(  # pylint: disable=no-member
+            first_name="Ada", last_name="Lovelace", e_mail="ada@example.com"
+        )
+        tag = Tag.objects.create(caption="django")  # pylint: disable=no-member
+        for index in range(3):
+            post = make_post(index, author=author)
+            post.tag.add(tag)
+            Comment.objects.create(  # pylint: disable=no-member
+                user_name="G", user_email="g@x.io", comment_text="Hi", post=post
+            )
+        make_post(9)
+
+    def test_export_can_be_imported_again(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f"{directory}/blog.ndjson.gz"
+        call_command("export_blog", path, chunk_size=2, stderr=io.StringIO())
+
+        with gzip.open(path, "rt") as export:
+            records = [json.loads(line) for line in export]
+        posts = [r for r in records if r["type"] == "post"]
+        self.assertEqual(len(records), 1 + 1 + 4 + 3)
+        self.assertEqual([p["tags"] for p in posts], [["django"]] * 3 + [[]])
+
+        Post.objects.all().delete()  # pylint: disable=no-member
+        call_command("import_blog", path, stdout=io.StringIO())
+        self.assertEqual(Post.objects.filter(tag__caption="django").count(), 3)
+        self.assertEqual(Comment.objects.count(), 3)  # pylint: disable=no-member
+
+    def test_admin_export_streams_csv_to_staff_only(self):
+        url = reverse("admin:blog_post_export")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        admin_user = User.objects.create_superuser("admin", "a@x.io", "password")
+        self.client.force_login(admin_user)
+        response = self.client.get(url, {"format": "csv"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith("type,first_name,last_name,e_mail"))
+        self.assertEqual(len(lines), 1 + 9)
+
+    def test_admin_export_needs_every_view_permission(self):
+        url = reverse("admin:blog_post_export")
+        editor = User.objects.create_user("editor", "e@x.io", is_staff=True)
+        editor.user_permissions.add(
+            Permission.objects.get(codename="view_post"),
+            Permission.objects.get(codename="view_tag"),
+        )
+        self.client.force_login(editor)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        editor.user_permissions.add(
+            Permission.objects.get(codename="view_author"),
+            Permission.objects.get(codename="view_comment"),
+        )
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class FeedTests(TestCase):
+    """
+    Tests for the cached Atom and RSS feeds.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(  # pylint: disable=no-member
+            first_name="Ada", last_name="Lovelace", e_mail="ada@example.com"
+        )
+        self.tag = Tag.objects.create(caption="django")  # pylint: disable=no-member
+        self.posts = [make_post(i, author=self.author) for i in range(3)]
+        self.posts[0].tag.add(self.tag)
+
+    def test_feeds_list_posts(self):
+        atom = self.client.get(reverse("feed", args=["atom"]))
+        self.assertEqual(atom["Content-Type"], "application/atom+xml; charset=utf-8")
+        self.assertContains(atom, self.posts[2].title)
+        self.assertContains(atom, "Ada Lovelace")
+
+        rss = self.client.get(reverse("tag-feed", args=["django", "rss"]))
+        self.assertContains(rss, self.posts[0].title)
+        self.assertNotContains(rss, self.posts[1].title)
+
+        author_feed = reverse("author-feed", args=[self.author.pk, "atom"])
+        self.assertContains(self.client.get(author_feed), self.posts[1].title)
+        missing = self.client.get(reverse("tag-feed", args=["missing", "atom"]))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_cached_feed_answers_conditional_requests(self):
+        url = reverse("feed", args=["rss"])
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            again = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            not_modified_since = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+            )
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        self.assertEqual(not_modified_since.status_code, 304)
+
+        post = self.posts[1]
+        post.title = "A new title"
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+            # Until the change commits, the cached feed is still served.
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code,
+                304,
+            )
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertContains(changed, "A new title")
+        self.assertNotEqual(changed["Last-Modified"], first["Last-Modified"])
+        changed_since = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(changed_since.status_code, 200)
+
+
+@override_settings(BLOG_SITEMAP_SHARD_SIZE=2)
+class SitemapTests(TestCase):
+    """
+    Tests for the sharded, cached XML sitemaps.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.posts = [make_post(i) for i in range(5)]
+        self.first_shard = sitemaps.shard_of(self.posts[0].pk)
+
+    def shard_url(self, post):
+        return reverse("sitemap-shard", args=[sitemaps.shard_of(post.pk)])
+
+    def test_index_links_every_shard(self):
+        response = self.client.get(reverse("sitemap"))
+        index = b"".join(response.streaming_content).decode()
+        self.assertEqual(index.count("<sitemap>"), sitemaps.shard_count())
+        self.assertIn(f"http://testserver{self.shard_url(self.posts[4])}", index)
+
+    def test_shards_are_streamed_then_served_from_the_cache(self):
+        post = self.posts[0]
+        response = self.client.get(self.shard_url(post))
+        xml = b"".join(response.streaming_content).decode()
+        self.assertIn(f"http://testserver/posts/{post.slug}", xml)
+        self.assertLessEqual(xml.count("<url>"), 2)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.shard_url(post))
+            compressed = self.client.get(
+                self.shard_url(post), HTTP_ACCEPT_ENCODING="gzip"
+            )
+        self.assertEqual(cached.content.decode(), xml)
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content).decode(), xml)
+
+        other = self.client.get(self.shard_url(self.posts[4]))
+        b"".join(other.streaming_content)
+        post.slug = "renamed-post"
+        post.save()
+        self.assertTrue(self.client.get(self.shard_url(post)).streaming)
+        self.assertFalse(self.client.get(self.shard_url(self.posts[4])).streaming)
+
+    def test_unknown_shard_is_not_found(self):
+        self.assertEqual(self.client.get("/sitemap-99.xml").status_code, 404)
+
+
+class RenderedHTMLTests(TestCase):
+    """
+    Tests for the HTML of posts and comments rendered when they are saved.
+    """
+
+    def test_html_is_rendered_on_save_and_shown(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = make_post(
+                1, content="First <b>paragraph</b>.\n\nSecond line\nbreak."
+            )
+            Comment.objects.create(  # pylint: disable=no-member
+                user_name="G", user_email="g@x.io", comment_text="Hi\nthere", post=post
+            )
+        self.assertEqual(
+            post.content_html,
+            "<p>First &lt;b&gt;paragraph&lt;/b&gt;.</p>\n\n<p>Second line<br>break.</p>",
+        )
+        response = self.client.get(reverse("post-detail-page", args=[post.slug]))
+        self.assertContains(response, post.content_html, html=True)
+        self.assertContains(response, "<p>Hi<br>there</p>", html=True)
+
+    def test_backfill_renders_rows_without_html(self):
+        post = make_post(1)
+        comment = Comment.objects.create(  # pylint: disable=no-member
+            user_name="G", user_email="g@x.io", comment_text="Hi", post=post
+        )
+        Post.objects.update(content_html="")  # pylint: disable=no-member
+        Comment.objects.update(comment_html="")  # pylint: disable=no-member
+
+        call_command("render_html", batch_size=1, stdout=io.StringIO())
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(post.content_html, f"<p>{post.content}</p>")
+        self.assertEqual(comment.comment_html, "<p>Hi</p>")
+
+
+class TagTests(TestCase):
+    """
+    Tests for the tag pages, the tag cloud and the stored tag post counts.
+    """
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.django = Tag.objects.create(  # pylint: disable=no-member
+                caption="django"
+            )
+            self.python = Tag.objects.create(  # pylint: disable=no-member
+                caption="py/thon"
+            )
+            self.posts = [make_post(i) for i in range(3)]
+            for post in self.posts:
+                post.tag.add(self.django)
+            self.posts[0].tag.add(self.python)
+
+    def counts(self):
+        return dict(
+            Tag.objects.values_list(
+                "caption", "post_count"
+            )  # pylint: disable=no-member
+        )
+
+    def test_post_counts_follow_the_relation(self):
+        self.assertEqual(self.counts(), {"django": 3, "py/thon": 1})
+
+        self.posts[0].tag.remove(self.django, self.django)
+        self.python.posts.add(self.posts[1])
+        self.assertEqual(self.counts(), {"django": 2, "py/thon": 2})
+
+        self.posts[1].tag.clear()
+        self.posts[2].delete()
+        self.assertEqual(self.counts(), {"django": 0, "py/thon": 1})
+
+        self.python.posts.clear()
+        self.assertEqual(self.counts(), {"django": 0, "py/thon": 0})
+
+    def test_tag_page_lists_the_tagged_posts(self):
+        response = self.client.get(reverse("tag-page", args=["py/thon"]))
+        self.assertContains(response, self.posts[0].title)
+        self.assertNotContains(response, self.posts[1].title)
+        self.assertEqual(
+            self.client.get(reverse("tag-page", args=["missing"])).status_code, 404
+        )
+
+    def test_tag_cloud_uses_stored_counts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("tags-page"))
+        tags = {tag.caption: tag.weight for tag in response.context["tags"]}
+        self.assertEqual(tags, {"django": 5, "py/thon": 1})
+        self.assertContains(response, reverse("tag-page", args=["py/thon"]))
+
+    def test_pages_are_not_rebuilt_from_retired_objects(self):
+        url = reverse("post-detail-page", args=[self.posts[0].slug])
+        self.assertContains(self.client.get(url), "py/thon")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.python.delete()
+        # A request arriving between the callbacks must not cache the page
+        # again from the old tags.
+        for callback in callbacks:
+            callback()
+            self.client.get(url)
+        self.assertNotContains(self.client.get(url), "py/thon")
+
+
+class AdminLargeTableTests(TestCase):
+    """
+    Tests for the large-table mode of the post and comment admin.
+    """
+
+    def setUp(self):
+        self.author = Author.objects.create(  # pylint: disable=no-member
+            first_name="Ada", last_name="Lovelace", e_mail="ada@example.com"
+        )
+        self.tag = Tag.objects.create(caption="django")  # pylint: disable=no-member
+        self.posts = [make_post(i, author=self.author) for i in range(5)]
+        self.posts[0].tag.add(self.tag)
+        Comment.objects.create(  # pylint: disable=no-member
+            user_name="Grace",
+            user_email="g@x.io",
+            comment_text="Hi",
+            post=self.posts[0],
+        )
+        Comment.objects.create(  # pylint: disable=no-member
+            user_name="Alan", user_email="a@x.io", comment_text="Yo", post=self.posts[1]
+        )
+        user = User.objects.create_superuser("admin", "a@x.io", "password")
+        self.client.force_login(user)
+
+        post_admin = admin_site._registry[Post]  # pylint: disable=protected-access
+        post_admin.list_per_page = 2
+        self.addCleanup(setattr, post_admin, "list_per_page", 100)
+
+    def test_posts_are_paged_with_cursors(self):
+        url = reverse("admin:blog_post_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(url)
+        self.assertFalse(
+            [q for q in queries if 'FROM "blog_author"' in q["sql"]],
+            "authors should be loaded with the posts",
+        )
+        cl = first.context["cl"]
+        self.assertContains(first, 'rel="next"')
+        self.assertEqual(cl.result_count, 5)
+        self.assertEqual(len(cl.result_list), 2)
+
+        second = self.client.get(url + cl.next_page_query())
+        titles = [post.title for post in second.context["cl"].result_list]
+        self.assertEqual(len(titles), 2)
+        self.assertNotIn(cl.result_list[0].title, titles)
+        self.assertTrue(second.context["cl"].keyset_page.has_previous())
+        self.assertEqual(self.client.get(url, {"after": "!"}).status_code, 302)
+
+    def test_input_filters(self):
+        url = reverse("admin:blog_post_changelist")
+        response = self.client.get(url, {"tag_caption": "django"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.posts[0]])
+        self.assertEqual(self.client.get(url, {"date_from": "soon"}).status_code, 302)
+
+        response = self.client.get(
+            reverse("admin:blog_comment_changelist"), {"commenter": "Alan"}
+        )
+        self.assertEqual(
+            [c.user_name for c in response.context["cl"].result_list], ["Alan"]
+        )
+
+    def test_counts_are_bounded(self):
+        paginator = EstimatedCountPaginator(Post.objects.order_by("-id"), 2)
+        paginator.count_limit = 3
+        self.assertEqual(paginator.count, 3)
+        self.assertTrue(paginator.approximate)
+
+
+class ListProjectionTests(TestCase):
+    """
+    Query budgets for the post listings and their column projections.
+    """
+
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(  # pylint: disable=no-member
+            first_name="Ada", last_name="Lovelace", e_mail="ada@example.com"
+        )
+        tag = Tag.objects.create(caption="django")  # pylint: disable=no-member
+        self.posts = [make_post(i, author=author) for i in range(4)]
+        for post in self.posts:
+            post.tag.add(tag)
+
+    def post_queries(self, url, **params):
+        """
+        Returns the SQL of the queries reading posts while `url` is served.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in queries if 'FROM "blog_post"' in q["sql"]]
+
+    def assert_narrow(self, sql):
+        self.assertNotIn('"blog_post"."content"', sql)
+        self.assertNotIn('"blog_post"."content_html"', sql)
+
+    def test_listings_read_narrow_queries(self):
+        # The starting page reads the latest and the most read posts.
+        pages = [
+            (reverse("starting-page"), {}, 2),
+            (reverse("posts-page"), {}, 1),
+            (reverse("tag-page", args=["django"]), {}, 1),
+            (reverse("search-page"), {"q": "post"}, 1),
+        ]
+        for url, params, count in pages:
+            with self.subTest(url=url):
+                queries = self.post_queries(url, **params)
+                self.assertEqual(len(queries), count)
+                for sql in queries:
+                    self.assert_narrow(sql)
+
+    def test_read_later_reads_one_narrow_query(self):
+        self.client.post(reverse("read-later"), {"post_id": self.posts[0].pk})
+        with self.assertNumQueries(1):
+            queries = self.post_queries(reverse("read-later"))
+        self.assert_narrow(queries[0])
+
+    def test_feed_selects_author_and_prefetches_tags(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("feed", args=["atom"]))
+        self.assertEqual(len(queries), 2)
+        self.assert_narrow(queries[0]["sql"])
+        self.assertIn('"blog_author"."last_name"', queries[0]["sql"])
+        self.assertNotIn('"blog_author"."e_mail"', queries[0]["sql"])
+
+
+class ServerTests(TestCase):
+    """
+    Tests for the pre-forking production server.
+    """
+
+    def test_worker_count_follows_cpus_unless_configured(self):
+        cpus = server.available_cpus()
+        self.assertGreaterEqual(cpus, 1)
+        with mock.patch.dict("os.environ", {"WEB_CONCURRENCY": ""}):
+            self.assertEqual(server.default_workers(), 2 * cpus + 1)
+            self.assertEqual(server.default_workers(asgi=True), cpus)
+        with mock.patch.dict("os.environ", {"WEB_CONCURRENCY": "3"}):
+            self.assertEqual(server.default_workers(), 3)
+
+    def test_options_are_applied_to_gunicorn(self):
+        app = server.Server({"bind": ["127.0.0.1:9000"], "workers": None}, asgi=True)
+        self.assertTrue(app.cfg.preload_app)
+        self.assertEqual(app.cfg.bind, ["127.0.0.1:9000"])
+        self.assertEqual(app.cfg.workers, server.default_workers(asgi=True))
+        self.assertEqual(app.cfg.worker_class_str, server.ASGI_WORKER_CLASS)
+
+    def test_warm_up_caches_the_first_cards(self):
+        cache.clear()
+        posts = [make_post(i) for i in range(3)]
+        with mock.patch("django.db.connections.close_all") as close_all:
+            server.warm_up()
+        close_all.assert_called_once()
+        for post in posts:
+            self.assertIsNotNone(cache.get(fragment_cache.card_key(post)))
+
+    def test_old_metric_snapshots_are_cleared(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = metrics.Registry()
+        worker.register(metrics.Counter("jobs_total", "Jobs.")).inc()
+        worker.flush(directory)
+        Path(directory, "notes.txt").write_text("kept")
+
+        metrics.clear_snapshots(directory)
+        self.assertEqual(os.listdir(directory), ["notes.txt"])
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(TestCase):
+    """
+    Tests for routing the page views' reads to read replicas.
+    """
+
+    def setUp(self):
+        self.post = make_post(1)
+        # The tests have no replica database, so routed reads are counted
+        # and sent to the primary.
+        patcher = mock.patch.object(db_router, "choose_replica", return_value="default")
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_page_views_read_from_replicas(self):
+        self.client.post(reverse("read-later"), {"post_id": self.post.pk})
+        for url in (reverse("posts-page"), reverse("read-later")):
+            with self.subTest(url=url):
+                self.choose_replica.reset_mock()
+                self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertTrue(self.choose_replica.called)
+
+    def test_other_views_read_from_the_primary(self):
+        self.client.get(reverse("tags-page"))
+        self.client.get(reverse("search-page"), {"q": "post"})
+        self.assertFalse(self.choose_replica.called)
+
+    def test_sessions_and_reads_after_writes_use_the_primary(self):
+        self.choose_replica.return_value = "replica1"
+        with db_router.replica_reads():
+            self.assertEqual(Post.objects.all().db, "replica1")
+            self.assertEqual(Session.objects.all().db, "default")
+            make_post(2)
+            self.assertEqual(Post.objects.all().db, "default")
+        self.assertEqual(Post.objects.all().db, "default")
+
+    def test_comment_pins_the_visitors_reads_to_the_primary(self):
+        url = reverse("post-detail-page", args=[self.post.slug])
+        response = self.client.post(
+            url,
+            {
+                "user_name": "Grace",
+                "user_email": "grace@example.com",
+                "comment_text": "First!",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertFalse(self.choose_replica.called)
+
+        self.assertContains(self.client.get(url), "First!")
+        self.assertFalse(self.choose_replica.called)
+
+    def test_cached_pages_are_built_from_the_primary(self):
+        url = reverse("post-detail-page", args=[self.post.slug])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(  # pylint: disable=no-member
+                post=self.post,
+                user_name="Grace",
+                user_email="grace@example.com",
+                comment_text="Not replicated yet",
+            )
+
+        with connection.execute_wrapper(lagging_replica("blog_comment")):
+            with db_router.replica_reads():
+                self.assertFalse(Comment.objects.exists())  # pylint: disable=no-member
+            # Another visitor, without the pin cookie, refills the page cache.
+            self.assertContains(self.client.get(url), "Not replicated yet")
+        self.assertContains(self.client.get(url), "Not replicated yet")
+
+    def test_cards_are_built_from_the_primary(self):
+        cache.clear()
+        Rendition.objects.create(  # pylint: disable=no-member
+            post=self.post,
+            source=self.post.image.name,
+            format="webp",
+            width=96,
+            height=48,
+            image="renditions/post-1-96.webp",
+        )
+        with connection.execute_wrapper(lagging_replica("blog_rendition")):
+            response = self.client.get(reverse("posts-page"))
+        self.assertTrue(self.choose_replica.called)
+        self.assertContains(response, "-96.webp 96w")
+
+
+class ObjectCacheTests(TestCase):
+    """
+    Tests for the two-tier cache of posts and tags.
+    """
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag = Tag.objects.create(caption="django")  # pylint: disable=no-member
+            self.posts = [make_post(i) for i in range(4)]
+            self.posts[0].tag.add(self.tag)
+
+    def test_starting_page_posts_come_from_process_memory(self):
+        self.client.get(reverse("starting-page"))
+        before = object_cache.stats()["posts"]
+
+        # Even with the shared cache gone, the local tier answers.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("starting-page"))
+        self.assertFalse([q for q in queries if 'FROM "blog_post"' in q["sql"]])
+        after = object_cache.stats()["posts"]
+        # The latest and the most read posts.
+        self.assertEqual(after["local"], before["local"] + 2)
+        self.assertGreater(after["hit_rate"], 0)
+
+    def test_changes_retire_cached_objects(self):
+        post = self.posts[0]
+        self.assertEqual(object_cache.get_post(post.slug).title, post.title)
+        self.assertEqual(object_cache.post_tags(post.id), [self.tag])
+        self.assertEqual([t.post_count for t in object_cache.tag_cloud()], [1])
+
+        post.title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+            self.posts[1].tag.add(self.tag)
+            # Until the change commits, the cached objects are kept.
+            self.assertEqual(object_cache.get_post(post.slug).title, "Post 0")
+        self.assertEqual(object_cache.get_post(post.slug).title, "Renamed")
+        self.assertEqual([t.post_count for t in object_cache.tag_cloud()], [2])
+        self.assertEqual(object_cache.latest_posts(3)[0].title, "Post 3")
+
+        with self.assertRaises(Post.DoesNotExist):  # pylint: disable=no-member
+            object_cache.get_post("missing")
+
+    def test_other_processes_pick_up_new_versions(self):
+        post = self.posts[0]
+        object_cache.get_post(post.slug)
+        # Another process changes the post and moves the shared version.
+        Post.objects.filter(pk=post.pk).update(  # pylint: disable=no-member
+            title="Changed elsewhere"
+        )
+        cache.set(
+            object_cache._version_key("posts"), 1, None
+        )  # pylint: disable=protected-access
+
+        with override_settings(BLOG_OBJECT_CACHE_SYNC_INTERVAL=3600):
+            self.assertEqual(object_cache.get_post(post.slug).title, post.title)
+        with override_settings(BLOG_OBJECT_CACHE_SYNC_INTERVAL=0):
+            self.assertEqual(
+                object_cache.get_post(post.slug).title, "Changed elsewhere"
+            )
+
+    def test_objects_are_loaded_from_the_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            new_post = make_post(4)
+        with override_settings(DATABASE_REPLICAS=["replica1"]), mock.patch.object(
+            db_router, "choose_replica", return_value="default"
+        ), connection.execute_wrapper(lagging_replica("blog_post")):
+            with db_router.replica_reads():
+                self.assertFalse(Post.objects.exists())  # pylint: disable=no-member
+                self.assertEqual(object_cache.latest_posts(3)[0], new_post)
+                self.assertEqual(object_cache.get_post(new_post.slug), new_post)
+            self.assertContains(self.client.get(reverse("starting-page")), "Post 4")
+
+    def test_cached_pages_are_built_from_current_versions(self):
+        post = self.posts[0]
+        url = reverse("post-detail-page", args=[post.slug])
+        self.client.get(url)
+        # Another process changes the post, moves the shared version and
+        # drops the cached page; this one has not read the new version yet.
+        Post.objects.filter(pk=post.pk).update(  # pylint: disable=no-member
+            title="Changed elsewhere"
+        )
+        cache.set(
+            object_cache._version_key("posts"), 1, None
+        )  # pylint: disable=protected-access
+        page_cache.invalidate(post.slug)
+
+        with override_settings(BLOG_OBJECT_CACHE_SYNC_INTERVAL=3600):
+            self.assertEqual(object_cache.get_post(post.slug).title, post.title)
+            self.assertContains(self.client.get(url), "Changed elsewhere")
+
+    def test_local_tier_evicts_least_recently_used(self):
+        lru = object_cache.LocalLRU(2)
+        lru.set("a", [1], 60)
+        lru.set("b", [2], 60)
+        self.assertEqual(lru.get("a"), [1])
+        lru.set("c", [3], 60)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(len(lru), 2)
+        lru.set("d", [4], -1)
+        self.assertIsNone(lru.get("d"))
+
+    def test_hit_rates_are_exported(self):
+        object_cache.tag_cloud()
+        object_cache.tag_cloud()
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="127.0.0.1")
+        self.assertContains(
+            response, 'blog_object_cache_lookups_total{group="tags",tier="local"}'
+        )
+
+
+class ViewCountTests(TestCase):
+    """
+    Tests for the buffered view counts and the most read posts.
+    """
+
+    def setUp(self):
+        cache.clear()
+        view_counts.flush()
+        self.posts = [make_post(i) for i in range(4)]
+
+    def test_views_are_buffered_and_flushed_in_one_update(self):
+        url = reverse("post-detail-page", args=[self.posts[1].slug])
+        self.client.get(url)
+        # Served from the page cache: no queries, no write.
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.client.get(reverse("post-detail-page", args=[self.posts[2].slug]))
+        self.assertEqual(
+            view_counts.pending(), {self.posts[1].pk: 2, self.posts[2].pk: 1}
+        )
+
+        with self.assertNumQueries(1):
+            self.assertEqual(view_counts.flush(), 3)
+        self.assertEqual(view_counts.pending(), {})
+        counts = dict(
+            Post.objects.values_list("id", "view_count")  # pylint: disable=no-member
+        )
+        self.assertEqual(counts[self.posts[1].pk], 2)
+        self.assertEqual(counts[self.posts[2].pk], 1)
+        self.assertEqual(counts[self.posts[0].pk], 0)
+
+    def test_failed_flushes_keep_the_views(self):
+        view_counts.record(self.posts[0].pk)
+        with mock.patch.object(
+            Post.objects, "using", side_effect=DatabaseError("down")
+        ):
+            with self.assertRaises(DatabaseError):
+                view_counts.flush()
+        self.assertEqual(view_counts.pending(), {self.posts[0].pk: 1})
+        view_counts.flush()
+
+    def test_starting_page_lists_the_most_read_posts(self):
+        response = self.client.get(reverse("starting-page"))
+        self.assertNotContains(response, "Most Read")
+
+        for _ in range(3):
+            view_counts.record(self.posts[0].pk)
+        view_counts.record(self.posts[2].pk)
+        view_counts.flush()
+        # The counts change without signals; the list is refreshed once its
+        # short timeout passes.
+        object_cache.invalidate("posts")
+        response = self.client.get(reverse("starting-page"))
+        self.assertEqual(
+            [post.pk for post in object_cache.most_read(3)],
+            [self.posts[0].pk, self.posts[2].pk],
+        )
+        self.assertContains(response, "Most Read")
+        self.assertContains(response, self.posts[0].title)